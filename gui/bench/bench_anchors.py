@@ -0,0 +1,98 @@
+# Сверка и скорость AnchorIndex (toolpath.anchors) с прежним линейным поиском nearest_anchor
+# Запуск из каталога gui: python -m bench.bench_anchors [--sizes 10000,100000,1000000]
+import argparse
+import math
+import random
+import time
+
+from toolpath import AnchorIndex
+
+
+# Прежняя реализация из main.py: min по всему множеству на каждый клик
+def NearestLinear(x: int, y: int, anchors: set[tuple[int, int]]) -> tuple[int, int]:
+	return min(anchors, key=lambda a: math.hypot(a[0] - x, a[1] - y))
+
+
+def NearestValueLinear(values, v: int) -> int:
+	return min(values, key=lambda a: (abs(a - v), a))
+
+
+def Dist2(a: tuple[int, int], x: int, y: int) -> int:
+	return (a[0] - x) ** 2 + (a[1] - y) ** 2
+
+
+# Якоря: uniform - равномерно по полю, clusters - плотные группы, как концы штрихов импортированных файлов
+def MakeAnchors(rnd: random.Random, count: int, width: int, height: int, kind: str) -> set[tuple[int, int]]:
+	anchors = set()
+	if kind == 'uniform':
+		while len(anchors) < count:
+			anchors.add((rnd.randrange(width), rnd.randrange(height)))
+		return anchors
+	centers = [(rnd.randrange(width), rnd.randrange(height)) for _ in range(max(1, count // 2000))]
+	spread = max(8, int(math.sqrt(width * height / len(centers)) / 4))
+	while len(anchors) < count:
+		cx, cy = rnd.choice(centers)
+		anchors.add((min(width - 1, max(0, cx + rnd.randint(-spread, spread))), min(height - 1, max(0, cy + rnd.randint(-spread, spread)))))
+	return anchors
+
+
+def CrossCheck(anchors: set, index: AnchorIndex, queries: list) -> None:
+	xs = {a[0] for a in anchors}
+	ys = {a[1] for a in anchors}
+	for x, y in queries:
+		expected = NearestLinear(x, y, anchors)
+		actual = index.nearest(x, y)
+		# при равных расстояниях допустима любая из точек
+		assert Dist2(actual, x, y) == Dist2(expected, x, y), (x, y, actual, expected)
+		assert actual in anchors
+		assert index.nearest_x(x) == NearestValueLinear(xs, x), x
+		assert index.nearest_y(y) == NearestValueLinear(ys, y), y
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="AnchorIndex parity and speed")
+	parser.add_argument('--sizes', type=str, default='10000,100000,1000000', help="Число якорей")
+	parser.add_argument('--queries', type=int, default=2000, help="Запросов на замер. По умолчанию = 2000")
+	parser.add_argument('--linear', type=int, default=20, help="Запросов линейным поиском (он медленный)")
+	parser.add_argument('--seed', type=int, default=1)
+	args = parser.parse_args()
+
+	rnd = random.Random(args.seed)
+	for count in [int(size) for size in args.sizes.split(',') if size != '']:
+		# поле растет с числом якорей, чтобы они не слиплись в сплошную сетку: миллион точек файла не помещается в 330 x 228
+		scale = max(1, math.ceil(math.sqrt(count / (330 * 228) * 4)))
+		width, height = 330 * scale, 228 * scale
+		for kind in ('uniform', 'clusters'):
+			anchors = MakeAnchors(rnd, count, width, height, kind)
+			queries = [(rnd.randrange(-20, width + 20), rnd.randrange(-20, height + 20)) for _ in range(args.queries)]
+
+			start = time.perf_counter()
+			index = AnchorIndex(anchors)
+			build = time.perf_counter() - start
+
+			start = time.perf_counter()
+			single = AnchorIndex()
+			for anchor in list(anchors)[:10000]:
+				single.add(anchor)
+			add = (time.perf_counter() - start) / min(count, 10000)
+
+			CrossCheck(anchors, index, queries[:args.linear])
+
+			start = time.perf_counter()
+			for x, y in queries[:args.linear]:
+				NearestLinear(x, y, anchors)
+			linear = (time.perf_counter() - start) / args.linear
+
+			start = time.perf_counter()
+			for x, y in queries:
+				index.nearest(x, y)
+			nearest = (time.perf_counter() - start) / len(queries)
+
+			start = time.perf_counter()
+			for x, y in queries:
+				index.nearest_x(x)
+				index.nearest_y(y)
+			axis = (time.perf_counter() - start) / len(queries) / 2
+
+			print(f"{count:>8} {kind:<8} поле {width}x{height}:  построение {build * 1000:7.1f} мс  add {add * 1e6:5.1f} мкс  "
+				f"линейно {linear * 1000:8.2f} мс  nearest {nearest * 1e6:6.1f} мкс  x{linear / nearest:,.0f}  по оси {axis * 1e6:4.1f} мкс")
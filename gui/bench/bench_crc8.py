@@ -0,0 +1,72 @@
+# Микробенчмарк и сверка табличного CRC8 (crc8.py) с прежней побитовой реализацией и с crcmod
+# Запуск из каталога gui: python -m bench.bench_crc8
+import os
+import random
+import timeit
+
+from crc8 import Crc8, POLY, update
+
+
+# Прежняя реализация из response.py: 8 итераций на байт
+def Crc8Bitwise(data: bytes) -> int:
+	crc = 0
+	for b in data:
+		crc ^= b
+		for _ in range(8):
+			if crc & 0x80:
+				crc = ((crc << 1) ^ POLY) & 0xFF
+			else:
+				crc = (crc << 1) & 0xFF
+	return crc
+
+
+# Сверка результатов: побитовый вариант, инкрементальный режим, memoryview и crcmod (если установлен)
+def CrossCheck(rounds: int=500) -> None:
+	rnd = random.Random(0x31)
+	for _ in range(rounds):
+		data = bytes(rnd.getrandbits(8) for _ in range(rnd.randint(0, 300)))
+		expected = Crc8Bitwise(data)
+		assert Crc8(data) == expected
+
+		# Инкрементальное вычисление по случайным кускам
+		state = 0
+		pos = 0
+		while pos < len(data):
+			step = rnd.randint(1, 16)
+			state = update(state, data[pos:pos + step])
+			pos += step
+		assert state == expected
+
+		# Несколько буферов и memoryview без копирования
+		split = rnd.randint(0, len(data))
+		view = memoryview(data)
+		assert Crc8(view[:split], view[split:]) == expected
+
+	try:
+		import crcmod
+	except ImportError:
+		print("crcmod не установлен, сверка с crcmod пропущена")
+	else:
+		# Параметры PRD-3: полином 0x31 (с ведущим битом 0x131), init 0, без отражения, без xorOut
+		reference = crcmod.mkCrcFun(0x131, initCrc=0x00, rev=False, xorOut=0x00)
+		for _ in range(rounds):
+			data = os.urandom(rnd.randint(0, 300))
+			assert Crc8(data) == reference(data)
+		print(f"Сверка с crcmod: {rounds} буферов совпали")
+
+	print(f"Сверка с побитовой реализацией: {rounds} буферов совпали")
+
+
+def Bench(size: int, number: int) -> None:
+	data = os.urandom(size)
+	old = min(timeit.repeat(lambda: Crc8Bitwise(data), number=number, repeat=5)) / number
+	new = min(timeit.repeat(lambda: Crc8(data), number=number, repeat=5)) / number
+	print(f"{size:>8} байт: побитовый {old * 1e6:10.1f} мкс, табличный {new * 1e6:10.1f} мкс, ускорение x{old / new:.1f}")
+
+
+if __name__ == "__main__":
+	CrossCheck()
+	# Размер ACK-пакета, полного TX-пакета и крупного буфера
+	Bench(4, 20000)
+	Bench(254, 2000)
+	Bench(64 * 1024, 5)
@@ -0,0 +1,91 @@
+# Кредитное управление потоком (Prd3Session.SendGcode(credit=True)) против стоп-и-ожидания и окна по кольцевому буферу.
+# Запуск из каталога gui: python -m bench.bench_credit [--timeline occupancy.csv]
+# Устройство - модель ноды (simulator.py): byteCost - разбор байта основным циклом, packetCost - обработка пакета.
+# Медленный разбор копит байты в кольцевом буфере: окно считает пакеты и может его переполнить,
+# кредиты считают байты. С --timeline лента заполнения буфера (OccupancySample) кредитных прогонов пишется в CSV.
+# Кредиты без телеметрии переполнять буфер не должны: любое переполнение в них - FAIL и код возврата 1
+import argparse
+import csv
+import itertools
+import sys
+
+from response import GcodeListToStr, Prd3Session
+from simulator import SimSerial
+from bench.bench_transport import MakeGcode, ParseList
+
+# Название, окно, кредиты, телеметрия ноды
+MODES = (
+	('стоп-и-ожидание', 1, False, 'none'),
+	('окно по буферу', 0, False, 'none'),
+	('кредиты по ACK', 1, True, 'none'),
+	('кредиты + телеметрия', 1, True, 'piggyback'),
+	)
+
+
+# Прошивка без телеметрии может принять запрос телеметрии за пакет G-code - пустую строку (TELEMETRY_REQUEST).
+# Пустые строки станок пропускает, доставка сверяется без них
+def GcodeBody(data: bytes) -> list[bytes]:
+	return [line for line in data.split(b'\n') if line]
+
+
+def RunOne(lines: list[str], baudrate: int, chunkSize: int, byteCost: float, packetCost: float,
+		window: int, credit: bool, telemetry: str, seed: int) -> tuple[dict, list]:
+	sim = SimSerial(baudrate=baudrate, byteCost=byteCost, packetCost=packetCost, telemetry=telemetry, seed=seed)
+	session = Prd3Session('sim://', baudrate, ser=sim)
+	try:
+		ok = session.SendGcode(lines, chunkSize=chunkSize, window=window, credit=credit)
+	finally:
+		session.Close()
+	samples = list(session.occupancy)
+	used = [sample.used for sample in samples if sample.used is not None]
+	return {
+		'ok': ok and GcodeBody(bytes(sim.node.payload)) == GcodeBody(GcodeListToStr(lines)) and not (credit and telemetry == 'none' and sim.node.overflow),
+		'bytesPerSec': round(session.lastBytesPerSec, 1),
+		'lineEfficiency': round(session.lastBytesPerSec / (baudrate / 10), 4),
+		'overflowBytes': sim.node.overflow,
+		'retransmits': session.retransmits,
+		'polls': session.polls,
+		'maxUsed': max(used) if used else None,
+		'meanUsed': round(sum(used) / len(used), 1) if used else None,
+		'minCredit': min(sample.credit for sample in samples) if samples else None,
+		}, samples
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Credit-based flow control vs fixed windows")
+	parser.add_argument('--baudrate', type=int, default=115200)
+	parser.add_argument('--chunks', type=str, default='120,250', help="Значения chunkSize")
+	parser.add_argument('--byte-costs', type=str, default='0,0.0002', help="Разбор байта нодой, секунды")
+	parser.add_argument('--packet-costs', type=str, default='0,0.02', help="Обработка пакета нодой, секунды")
+	parser.add_argument('--bytes', type=int, default=12000, help="Объем G-code на прогон. По умолчанию = 12000")
+	parser.add_argument('--seed', type=int, default=1)
+	parser.add_argument('--timeline', type=str, default=None, help="CSV с лентой заполнения буфера")
+	args = parser.parse_args()
+
+	lines = MakeGcode(args.bytes)
+	rows = []
+	failures = 0
+	grid = itertools.product(ParseList(args.chunks, int), ParseList(args.byte_costs, float), ParseList(args.packet_costs, float))
+	for chunkSize, byteCost, packetCost in grid:
+		print(f"chunk {chunkSize}, разбор байта {byteCost * 1e6:g} мкс, обработка пакета {packetCost * 1000:g} мс:")
+		for name, window, credit, telemetry in MODES:
+			result, samples = RunOne(lines, args.baudrate, chunkSize, byteCost, packetCost, window, credit, telemetry, args.seed)
+			if credit and telemetry == 'none' and not result['ok']:
+				failures += 1
+			occupancy = f"  буфер до {result['maxUsed']} (в среднем {result['meanUsed']})" if result['maxUsed'] is not None else ''
+			print(f"  {name:<22} {'ok  ' if result['ok'] else 'FAIL'} {result['bytesPerSec']:8.1f} Б/с "
+				f"({result['lineEfficiency'] * 100:4.1f}% линии)  переполнение {result['overflowBytes']:>5} байт  "
+				f"повторов {result['retransmits']:>3}{occupancy}")
+			for sample in samples:
+				rows.append({'chunkSize': chunkSize, 'byteCost': byteCost, 'packetCost': packetCost, 'mode': name, **sample._asdict()})
+
+	if args.timeline is not None:
+		with open(args.timeline, 'w', encoding='utf-8', newline='') as file:
+			writer = csv.DictWriter(file, fieldnames=['chunkSize', 'byteCost', 'packetCost', 'mode', 'time', 'sqn', 'used', 'size', 'credit', 'inFlight'])
+			writer.writeheader()
+			writer.writerows(rows)
+		print(f"Лента заполнения буфера: {args.timeline} ({len(rows)} отсчетов)")
+
+	if failures:
+		print(f"Кредиты по ACK: {failures} прогонов с ошибкой или переполнением буфера")
+		sys.exit(1)
@@ -0,0 +1,112 @@
+# Скорость NumPy-версии get_hatch_lines (toolpath.hatch) против прежнего попиксельного обхода.
+# Совпадение результатов проверяет tests/test_hatch.py (с HatchLinesLegacy из этого файла)
+# Запуск из каталога gui: python -m bench.bench_hatch [--repeat 3]
+import argparse
+import copy
+import math
+import random
+import time
+
+from PIL import Image, ImageDraw
+
+from toolpath import get_hatch_lines
+
+
+# Прежняя реализация из main.py: каждая точка каждой линии штриховки проверяется через PixelAccess
+def HatchLinesLegacy(img, x, y, angle, distance):
+
+	def _ExtendLine(x1, y1, x2, y2, pixels):
+		dx = x2 - x1
+		dy = y2 - y1
+		length = math.hypot(dx, dy)
+		if length == 0:
+			return x1, y1, x2, y2
+		ux = dx / length
+		uy = dy / length
+		return (int(round(x1 - ux * pixels)), int(round(y1 - uy * pixels)), int(round(x2 + ux * pixels)), int(round(y2 + uy * pixels)))
+
+	img = copy.deepcopy(img.convert("L"))
+	w, h = img.size
+
+	inv = Image.eval(img, lambda p: 255 if p > 128 else 0)
+	ImageDraw.floodfill(inv, (x, y), 128)
+
+	region = inv.point(lambda p: 255 if p == 128 else 0)
+	mask = region.load()
+
+	angleRad = math.radians(angle)
+	dx, dy = math.cos(angleRad), math.sin(angleRad)
+	nx, ny = -dy, dx
+	diag = int(math.hypot(w, h)) + 2
+	cx, cy = w / 2, h / 2
+
+	segments = []
+	offset = -diag
+	while offset < diag:
+		x1 = cx + nx * offset - dx * diag
+		y1 = cy + ny * offset - dy * diag
+		x2 = cx + nx * offset + dx * diag
+		y2 = cy + ny * offset + dy * diag
+
+		steps = int(math.hypot(x2 - x1, y2 - y1))
+		inside = False
+		sx = sy = None
+		for i in range(steps + 1):
+			t = i / steps
+			xi = int(x1 + (x2 - x1) * t)
+			yi = int(y1 + (y2 - y1) * t)
+			if 0 <= xi < w and 0 <= yi < h and mask[xi, yi]:
+				if not inside:
+					sx, sy = xi, yi
+					inside = True
+			else:
+				if inside:
+					segments.append((sx, sy, xi, yi))
+					inside = False
+		if inside:
+			segments.append(_ExtendLine(sx, sy, xi, yi, 2))
+		offset += distance
+
+	return segments
+
+
+# Поле 330 x 228 со случайными контурами, как их рисует draw_img (линии толщиной 3)
+def MakeField(rnd: random.Random, shapes: int) -> Image.Image:
+	img = Image.new("RGB", (330, 228), "white")
+	draw = ImageDraw.Draw(img)
+	for _ in range(shapes):
+		kind = rnd.choice(('line', 'ellipse', 'rect'))
+		x1, y1 = rnd.randint(0, 329), rnd.randint(0, 227)
+		x2, y2 = rnd.randint(0, 329), rnd.randint(0, 227)
+		box = (min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2))
+		if kind == 'line':
+			draw.line((x1, y1, x2, y2), fill='black', width=3)
+		elif kind == 'ellipse':
+			draw.ellipse(box, outline='black', width=3)
+		else:
+			draw.rectangle(box, outline='black', width=3)
+	return img
+
+
+def Bench(img, x: int, y: int, angle: int, distance: int, repeat: int) -> tuple[float, float]:
+	start = time.perf_counter()
+	for _ in range(repeat):
+		HatchLinesLegacy(img, x, y, angle, distance)
+	legacy = (time.perf_counter() - start) / repeat
+	start = time.perf_counter()
+	for _ in range(repeat):
+		get_hatch_lines(img, x, y, angle, distance)
+	vectorised = (time.perf_counter() - start) / repeat
+	return legacy, vectorised
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="get_hatch_lines speed")
+	parser.add_argument('--repeat', type=int, default=3)
+	parser.add_argument('--seed', type=int, default=1)
+	args = parser.parse_args()
+
+	img = MakeField(random.Random(args.seed), 4)
+	for angle, distance in ((0, 10), (45, 5), (30, 2), (45, 1)):
+		legacy, vectorised = Bench(img, 165, 114, angle, distance, args.repeat)
+		print(f"угол {angle:>3}  шаг {distance:>2}:  попиксельно {legacy * 1000:8.1f} мс  NumPy {vectorised * 1000:7.1f} мс  x{legacy / vectorised:.1f}")
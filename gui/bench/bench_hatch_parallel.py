@@ -0,0 +1,67 @@
+# Масштабирование get_hatch_rows_parallel (toolpath/parallel.py) по числу процессов на полях крупнее 330 x 228
+# Запуск из каталога gui: python -m bench.bench_hatch_parallel [--scales 1,2,4,8] [--workers 1,2,4]
+# Поле - то же случайное, что в bench_hatch, увеличенное в scale раз (как при более мелком шаге сетки станка)
+import argparse
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from toolpath import get_hatch_rows, get_region_mask
+from toolpath.parallel import get_hatch_rows_parallel
+from bench.bench_hatch import MakeField
+
+
+def Best(fn, repeat: int) -> float:
+	best = None
+	for _ in range(repeat):
+		start = time.perf_counter()
+		fn()
+		elapsed = time.perf_counter() - start
+		best = elapsed if best is None else min(best, elapsed)
+	return best
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="get_hatch_rows_parallel scaling")
+	parser.add_argument('--scales', type=str, default='1,2,4,8', help="Во сколько раз поле больше 330 x 228")
+	parser.add_argument('--workers', type=str, default=None, help="Числа процессов. По умолчанию 1, 2, 4 ... до числа ядер")
+	parser.add_argument('--angle', type=int, default=30)
+	parser.add_argument('--distance', type=int, default=1)
+	parser.add_argument('--repeat', type=int, default=3)
+	parser.add_argument('--seed', type=int, default=1)
+	args = parser.parse_args()
+
+	cores = os.cpu_count() or 1
+	if args.workers is None:
+		workers = [1]
+		while workers[-1] * 2 <= cores:
+			workers.append(workers[-1] * 2)
+		if workers[-1] != cores:
+			workers.append(cores)
+	else:
+		workers = [int(item) for item in args.workers.split(',') if item != '']
+	print(f"Ядер: {cores}, процессы: {workers}")
+
+	base = MakeField(random.Random(args.seed), 6)
+	pools = {n: ProcessPoolExecutor(max_workers=n) for n in workers if n > 1}
+	try:
+		for scale in [int(item) for item in args.scales.split(',') if item != '']:
+			img = base.resize((base.width * scale, base.height * scale))
+			x, y = img.width // 2, img.height // 2
+			mask = get_region_mask(img, x, y)
+			expected = get_hatch_rows(img, x, y, args.angle, args.distance, mask)
+			serial = Best(lambda: get_hatch_rows(img, x, y, args.angle, args.distance, mask), args.repeat)
+			print(f"{img.width}x{img.height}, шаг {args.distance}: последовательно {serial * 1000:8.1f} мс")
+			for n in workers:
+				if n == 1:
+					continue
+				pool = pools[n]
+				# прогрев: процессы пула запускаются при первой задаче
+				actual = get_hatch_rows_parallel(img, x, y, args.angle, args.distance, mask, n, pool)
+				assert actual == expected, (scale, n)
+				parallel = Best(lambda: get_hatch_rows_parallel(img, x, y, args.angle, args.distance, mask, n, pool), args.repeat)
+				print(f"{'':>{len(str(img.width)) + len(str(img.height)) + 1}}  {n:>2} процессов: {parallel * 1000:8.1f} мс  x{serial / parallel:.2f}  эффективность {serial / parallel / n:.0%}")
+	finally:
+		for pool in pools.values():
+			pool.shutdown()
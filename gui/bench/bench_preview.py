@@ -0,0 +1,104 @@
+# Превью больших программ (toolpath/preview.py): разбор блоками NumPy + уровни детализации против
+# построчного разбора и отрисовки каждого отрезка вызовом ImageDraw.line
+# Запуск из каталога gui: python -m bench.bench_preview [--lines 1000000] [--scales 1,2,8]
+# Программа: штриховка (короткие отрезки G00/G01 с перекрытием), ломаные случайного блуждания и дуги
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from toolpath import FIELD_SIZE
+from toolpath.preview import ProgramPreview
+
+
+def MakeProgram(path: str, lines: int, rnd: random.Random) -> None:
+	out = []
+	w, h = FIELD_SIZE
+	while len(out) < lines:
+		kind = rnd.random()
+		if kind < 0.5:
+			# штриховка пятна: горизонтальные штрихи с шагом 1
+			x0, y0 = rnd.randint(0, w - 60), rnd.randint(0, h - 40)
+			for y in range(y0, y0 + 40):
+				a, b = x0 + rnd.randint(0, 10), x0 + rnd.randint(40, 60)
+				out.append(f"G00 X{a} Y{y}")
+				out.append(f"G01 X{b} Y{y}")
+		elif kind < 0.9:
+			# ломаная из коротких шагов
+			x, y = rnd.uniform(0, w), rnd.uniform(0, h)
+			out.append(f"G00 X{x:.2f} Y{y:.2f}")
+			for _ in range(400):
+				x = min(w, max(0, x + rnd.uniform(-1.5, 1.5)))
+				y = min(h, max(0, y + rnd.uniform(-1.5, 1.5)))
+				out.append(f"G01 X{x:.2f} Y{y:.2f}")
+		else:
+			x, y = rnd.randint(40, w - 40), rnd.randint(40, h - 40)
+			out.append(f"G00 X{x} Y{y}")
+			for _ in range(20):
+				nx, ny = rnd.randint(40, w - 40), rnd.randint(40, h - 40)
+				out.append(f"G0{rnd.choice('23')} X{nx} Y{ny} R{rnd.randint(100, 200)}")
+				x, y = nx, ny
+	with open(path, 'w') as file:
+		file.write('\n'.join(out[:lines]) + '\n')
+
+
+# Прежний путь: строка за строкой, каждый отрезок - вызов ImageDraw.line (дуги - хордой)
+def NaivePreview(path: str, scale: float) -> Image.Image:
+	img = Image.new("L", (round(FIELD_SIZE[0] * scale), round(FIELD_SIZE[1] * scale)), 255)
+	draw = ImageDraw.Draw(img)
+	x = y = 0.0
+	with open(path, 'r') as file:
+		for line in file:
+			words = {word[0]: float(word[1:]) for word in line.split()}
+			nx, ny = words.get('X', x), words.get('Y', y)
+			if words.get('G', 0) > 0:
+				draw.line(((x + 0.5) * scale, (y + 0.5) * scale, (nx + 0.5) * scale, (ny + 0.5) * scale), fill=0)
+			x, y = nx, ny
+	return img
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="LOD preview of large G-code programs")
+	parser.add_argument('--lines', type=int, default=1_000_000)
+	parser.add_argument('--scales', type=str, default='1,2,8', help="Пикселей изображения на пиксель поля")
+	parser.add_argument('--naive', action='store_true', help="Сравнить с построчной отрисовкой PIL (долго)")
+	parser.add_argument('--seed', type=int, default=1)
+	args = parser.parse_args()
+
+	path = os.path.join(tempfile.mkdtemp(), 'program.cnc')
+	MakeProgram(path, args.lines, random.Random(args.seed))
+	print(f"Программа: {args.lines} строк, {os.path.getsize(path) / 1e6:.1f} МБ")
+
+	scale = 2.0
+	width, height = round(FIELD_SIZE[0] * scale), round(FIELD_SIZE[1] * scale)
+	mask = np.zeros((height, width), dtype=bool)
+	preview = ProgramPreview(path)
+	start = time.perf_counter()
+	drawn = 0
+	firstFrame = None
+	for _ in preview.steps():
+		drawn = preview.lod.draw(mask, scale, first=drawn)
+		if firstFrame is None:
+			firstFrame = time.perf_counter() - start
+	total = time.perf_counter() - start
+	print(f"Постепенно, масштаб {scale:g}: первый кадр {firstFrame * 1000:.0f} мс, вся программа {total * 1000:.0f} мс "
+		f"(разбор и уровни {preview.seconds * 1000:.0f} мс), отрезков {preview.lod.segments}")
+	print("Уровни: " + ", ".join(f"{cell:g} пикс - {preview.lod.count(k)}" for k, cell in enumerate(preview.lod.cells)))
+	assert np.array_equal(mask, preview.lod.render(scale, width, height))
+
+	for scale in [float(item) for item in args.scales.split(',') if item != '']:
+		width, height = round(FIELD_SIZE[0] * scale), round(FIELD_SIZE[1] * scale)
+		level = preview.lod.level_for(scale)
+		start = time.perf_counter()
+		preview.lod.render(scale, width, height)
+		print(f"Отрисовка {width}x{height}: уровень {level} ({preview.lod.count(level)} отрезков) {(time.perf_counter() - start) * 1000:.0f} мс")
+
+	if args.naive:
+		start = time.perf_counter()
+		NaivePreview(path, 2.0)
+		print(f"Построчно + ImageDraw.line, масштаб 2: {(time.perf_counter() - start) * 1000:.0f} мс")
+	os.remove(path)
@@ -0,0 +1,57 @@
+# Задержка отправки одной G-code команды: порт на каждый вызов (как раньше) против долгоживущей Prd3Session
+# Запуск из каталога gui: python -m bench.bench_session --port COM5 --baudrate 9600
+# По умолчанию используется loop:// - эхо порта возвращает пакет с ACK_OK, устройство не нужно
+import argparse
+import statistics
+import time
+
+from response import Prd3Session
+
+
+def Percentile(values: list[float], p: float) -> float:
+	values = sorted(values)
+	return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def Report(name: str, samples: list[float]) -> None:
+	ms = [s * 1000 for s in samples]
+	print(f"{name:<24} p50 {Percentile(ms, 50):8.2f} мс  p99 {Percentile(ms, 99):8.2f} мс  среднее {statistics.mean(ms):8.2f} мс")
+
+
+def BenchPerCall(port: str, baudrate: int, count: int) -> list[float]:
+	samples = []
+	for i in range(count):
+		start = time.perf_counter()
+		# Прежнее поведение SendGcode: открыть порт, отправить, закрыть
+		with Prd3Session(port, baudrate) as session:
+			ok = session.SendGcode([f"G01 X{i % 330} Y{i % 228}"])
+		samples.append(time.perf_counter() - start)
+		if not ok:
+			raise RuntimeError("Команда не подтверждена")
+	return samples
+
+
+def BenchSession(port: str, baudrate: int, count: int) -> list[float]:
+	samples = []
+	with Prd3Session(port, baudrate) as session:
+		for i in range(count):
+			start = time.perf_counter()
+			ok = session.SendGcode([f"G01 X{i % 330} Y{i % 228}"])
+			samples.append(time.perf_counter() - start)
+			if not ok:
+				raise RuntimeError("Команда не подтверждена")
+	return samples
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Per-command latency of PRD-3 sends")
+	parser.add_argument('--port', type=str, default='loop://', help="Порт или URL pyserial. По умолчанию = loop://")
+	parser.add_argument('--baudrate', type=int, default=9600, help="Скорость порта. По умолчанию = 9600")
+	parser.add_argument('--count', type=int, default=50, help="Количество команд. По умолчанию = 50")
+	args = parser.parse_args()
+
+	perCall = BenchPerCall(args.port, args.baudrate, args.count)
+	session = BenchSession(args.port, args.baudrate, args.count)
+	Report("порт на каждый вызов", perCall)
+	Report("Prd3Session", session)
+	print(f"Ускорение по медиане: x{Percentile(perCall, 50) / Percentile(session, 50):.2f}")
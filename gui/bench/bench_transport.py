@@ -0,0 +1,171 @@
+# Пропускная способность SendGcode по сетке параметров: скорость порта, chunkSize, RTT, доля искаженных байтов, retries, окно.
+# Запуск из каталога gui: python -m bench.bench_transport [--out results/bench_transport]
+# По умолчанию устройство - модель ноды (simulator.py), RTT и искажения задаются ею.
+# С --port (COM5, /dev/pts/N от simulator.py --pty, loop://) сетка по RTT/искажениям не применяется - они свои у линии.
+# Результат: <out>.json (параметры запуска и все прогоны) и <out>.csv (по строке на прогон) для сравнения между версиями
+import argparse
+import csv
+import itertools
+import json
+import platform
+import time
+from datetime import datetime
+
+import serial
+
+from framing import FrameDecoder
+from response import Prd3Session, GcodeListToStr, ACK_OK
+from simulator import SimSerial
+from bench.bench_session import Percentile
+
+
+# Обертка порта: время первой отправки каждого SQN и время прихода подтверждающего его ACK.
+# Session пишет пакет одним write, поэтому SQN берется из 4-го байта записи
+class TimedSerial:
+	def __init__(self, ser):
+		self.ser = ser
+		self.decoder = FrameDecoder()
+		self.sent = {} # SQN -> время первой отправки (пакет еще не подтвержден)
+		self.order = [] # Неподтвержденные SQN в порядке отправки
+		self.latencies = [] # От первой отправки пакета до ACK на него (или на более поздний пакет), секунды
+
+	def __getattr__(self, name):
+		return getattr(self.ser, name)
+
+	@property
+	def in_waiting(self) -> int:
+		return self.ser.in_waiting
+
+	def write(self, data) -> int:
+		sqn = data[3]
+		if sqn not in self.sent:
+			self.sent[sqn] = time.perf_counter()
+			self.order.append(sqn)
+		return self.ser.write(data)
+
+	def read(self, size: int=1) -> bytes:
+		data = self.ser.read(size)
+		now = time.perf_counter()
+		for frame in self.decoder.Feed(data):
+			if not frame.crcOk or frame.ack != ACK_OK or frame.sqn not in self.sent:
+				continue
+			# ACK накопительный: закрывает все пакеты до frame.sqn включительно
+			while self.order:
+				sqn = self.order.pop(0)
+				self.latencies.append(now - self.sent.pop(sqn))
+				if sqn == frame.sqn:
+					break
+		return data
+
+	def reset_input_buffer(self) -> None:
+		self.decoder.Reset()
+		self.ser.reset_input_buffer()
+
+
+# Синтетическая программа примерно на size байт: отрезки по полю 330 x 228
+def MakeGcode(size: int) -> list[str]:
+	lines = []
+	total = 0
+	i = 0
+	while total < size:
+		line = f"G01 X{(i * 37) % 331} Y{(i * 53) % 229}"
+		lines.append(line)
+		total += len(line) + 1
+		i += 1
+	return lines
+
+
+def RunOne(lines: list[str], port: str, baudrate: int, chunkSize: int, rtt: float, corrupt: float,
+		retries: int, window: int, seed: int) -> dict:
+	sim = None
+	if port is None:
+		sim = SimSerial(baudrate=baudrate, latency=rtt / 2, corrupt=corrupt, seed=seed)
+		inner = sim
+	else:
+		inner = serial.serial_for_url(port, baudrate=baudrate, timeout=0.01)
+	timed = TimedSerial(inner)
+	session = Prd3Session(port or 'sim://', baudrate, ser=timed)
+	try:
+		ok = session.SendGcode(lines, chunkSize=chunkSize, retries=retries, window=window)
+	finally:
+		session.Close()
+
+	stats = session.Stats()
+	latencies = [s * 1000 for s in timed.latencies]
+	result = {
+		'port': port or 'sim',
+		'baudrate': baudrate,
+		'chunkSize': chunkSize,
+		'rtt': rtt,
+		'corrupt': corrupt,
+		'retries': retries,
+		'window': window,
+		'ok': ok,
+		'seconds': round(session.lastSeconds, 4),
+		'bytes': session.lastBytes,
+		'bytesPerSec': round(session.lastBytesPerSec, 1),
+		# Доля скорости линии, ушедшая на G-code (10 бит на байт)
+		'lineEfficiency': round(session.lastBytesPerSec / (baudrate / 10), 4),
+		'packets': stats['packets'],
+		'retransmits': stats['retransmits'],
+		'timeouts': stats['timeouts'],
+		'badCrc': stats['badCrc'],
+		'latencyP50Ms': round(Percentile(latencies, 50), 3) if latencies else None,
+		'latencyP99Ms': round(Percentile(latencies, 99), 3) if latencies else None,
+		'finalRtoMs': round(stats['rto'] * 1000, 3),
+		}
+	if sim is not None:
+		result['delivered'] = bytes(sim.node.payload) == GcodeListToStr(lines)[:len(sim.node.payload)]
+		result['lostBytes'] = sim.node.lost
+		result['corruptedBytes'] = sim.node.corrupted
+		result['overflowBytes'] = sim.node.overflow
+	return result
+
+
+def ParseList(text: str, kind) -> list:
+	return [kind(item) for item in text.split(',') if item != '']
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="PRD-3 transport throughput sweep")
+	parser.add_argument('--port', type=str, default=None, help="Порт или URL pyserial. По умолчанию - модель ноды")
+	parser.add_argument('--baudrates', type=str, default='9600,115200')
+	parser.add_argument('--chunks', type=str, default='64,128,250', help="Значения chunkSize")
+	parser.add_argument('--rtts', type=str, default='0,0.04', help="RTT модели, секунды")
+	parser.add_argument('--corrupt', type=str, default='0,0.0005', help="Вероятность искажения байта")
+	parser.add_argument('--retries', type=str, default='3')
+	parser.add_argument('--windows', type=str, default='1', help="Размер окна (0 - по кольцевому буферу)")
+	parser.add_argument('--bytes', type=int, default=3000, help="Объем G-code на прогон. По умолчанию = 3000")
+	parser.add_argument('--seed', type=int, default=1)
+	parser.add_argument('--out', type=str, default='bench_transport', help="Префикс файлов результата")
+	args = parser.parse_args()
+
+	lines = MakeGcode(args.bytes)
+	rtts = ParseList(args.rtts, float) if args.port is None else [0.0]
+	corrupts = ParseList(args.corrupt, float) if args.port is None else [0.0]
+	grid = itertools.product(ParseList(args.baudrates, int), ParseList(args.chunks, int), rtts, corrupts,
+		ParseList(args.retries, int), ParseList(args.windows, int))
+
+	results = []
+	for baudrate, chunkSize, rtt, corrupt, retries, window in grid:
+		result = RunOne(lines, args.port, baudrate, chunkSize, rtt, corrupt, retries, window, args.seed)
+		results.append(result)
+		print(f"{baudrate:>6} бод  chunk {chunkSize:>3}  rtt {rtt * 1000:5.1f} мс  corrupt {corrupt:<7g} "
+			f"retries {retries}  окно {window}:  {'ok  ' if result['ok'] else 'FAIL'} {result['bytesPerSec']:9.1f} Б/с  "
+			f"p50 {result['latencyP50Ms']} мс  p99 {result['latencyP99Ms']} мс  повторов {result['retransmits']}")
+
+	meta = {
+		'date': datetime.now().isoformat(timespec='seconds'),
+		'python': platform.python_version(),
+		'platform': platform.platform(),
+		'bytes': args.bytes,
+		'seed': args.seed,
+		}
+	with open(f"{args.out}.json", 'w', encoding='utf-8') as file:
+		json.dump({'meta': meta, 'results': results}, file, indent=1, ensure_ascii=False)
+	with open(f"{args.out}.csv", 'w', encoding='utf-8', newline='') as file:
+		fields = list(dict.fromkeys(key for result in results for key in result))
+		writer = csv.DictWriter(file, fieldnames=fields)
+		writer.writeheader()
+		writer.writerows(results)
+	print(f"Результаты: {args.out}.json, {args.out}.csv")
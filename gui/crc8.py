@@ -0,0 +1,46 @@
+# CRC8 протокола PRD-3 (полином 0x31, init 0x00, без отражения, без финального xor)
+# Общий модуль для транспорта (response.py) и тестера CaTE
+
+POLY = 0x31 # x^8 + x^5 + x^4 + 1
+
+
+# Таблица на 256 значений: CRC8_TABLE[x] - состояние после прогона одного байта x через 8 сдвигов
+def _MakeTable(poly: int) -> tuple[int, ...]:
+	table = []
+	for byte in range(256):
+		crc = byte
+		for _ in range(8):
+			if crc & 0x80:
+				crc = ((crc << 1) ^ poly) & 0xFF
+			else:
+				crc = (crc << 1) & 0xFF
+		table.append(crc)
+	return tuple(table)
+
+
+CRC8_TABLE = _MakeTable(POLY)
+
+
+# Инкрементальное вычисление: продолжает crc с состояния state по очередному куску данных.
+# Позволяет считать crc кадра по мере прихода байтов: state = update(state, chunk)
+def update(state: int, chunk) -> int:
+	table = CRC8_TABLE
+	crc = state & 0xFF
+	if isinstance(chunk, int):
+		return table[crc ^ chunk]
+	# memoryview с форматом отличным от 'B' приводим к байтам без копирования
+	if isinstance(chunk, memoryview) and chunk.format != 'B':
+		chunk = chunk.cast('B')
+	for b in chunk:
+		crc = table[crc ^ b]
+	return crc
+
+
+# Вычисление crc по одному или нескольким буферам (bytes, bytearray, memoryview).
+# Несколько буферов считаются как один склеенный поток, но без копирования:
+# Crc8(header, memoryview(payload)[10:]) == Crc8(header + payload[10:])
+def Crc8(*chunks) -> int:
+	crc = 0
+	for chunk in chunks:
+		crc = update(crc, chunk)
+	return crc
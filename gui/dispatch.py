@@ -0,0 +1,411 @@
+# Рассылка программ на несколько станков из одного процесса: общая очередь заданий, по потоку на порт.
+# Станок - порт и адрес ADDR в кадре PRD-3. Адресов на одном порту может быть несколько, поток порта
+# выполняет их задания по очереди (линия одна). Прошивка отвечает ACK_BAD_ADDR на чужой адрес, поэтому
+# на общей линии нужны ноды, которые молчат на чужие кадры, или шлюз.
+# Задание без станка берет первый свободный порт, задание со станком ждет свой.
+# Запуск из каталога gui: python dispatch.py --machine COM3 --machine COM4@2 prog1.cnc prog2.cnc ...
+import argparse
+import sys
+import threading
+import time
+from typing import Callable, Iterable, Optional
+
+import serial
+
+from journal import SendJournal
+from response import ADDR, PacketMetrics, Prd3Session
+
+JOB_STATES = ('queued', 'running', 'done', 'failed', 'cancelled')
+
+
+class Machine:
+	def __init__(self, port: str, baudrate: int, addr: int=ADDR, name: Optional[str]=None):
+		self.port = port # Имя порта или URL pyserial
+		self.baudrate = baudrate
+		self.addr = addr
+		self.name = name if name is not None else f"{port}@{addr}"
+
+
+# PORT[@ADDR][=ИМЯ], ADDR десятичный или 0x..
+def ParseMachine(spec: str, baudrate: int) -> Machine:
+	name = None
+	if '=' in spec:
+		spec, name = spec.split('=', 1)
+	addr = ADDR
+	port = spec
+	if '@' in spec:
+		port, text = spec.rsplit('@', 1)
+		addr = int(text, 0)
+	if not port or not 0 <= addr <= 0xFF:
+		raise ValueError(f"Неверный станок: {spec}")
+	return Machine(port, baudrate, addr, name)
+
+
+class DispatchJob:
+	def __init__(self, jobId: int, kind: str, payload, machine: Optional[str]=None, compact: bool=False, resume: bool=False):
+		self.jobId = jobId
+		self.kind = kind # file - путь к файлу, gcode - список строк
+		self.payload = payload
+		self.machine = machine # Имя станка, None - любой свободный
+		self.compact = compact
+		self.resume = resume # file: продолжить прерванную отправку по журналу
+		self.cancel = threading.Event()
+		self.state = 'queued'
+		self.assigned = None # Имя станка, который взял задание
+		self.sent = 0 # Подтвержденные байты
+		self.total = 0 # Всего байт, 0 - неизвестно
+		self.started = None
+		self.finished = None
+
+
+# Счетчики станка. Поля меняет поток порта, Summary читается из любого потока под замком диспетчера
+class MachineStats:
+	def __init__(self):
+		self.state = 'idle' # idle, busy, offline - порт не открылся
+		self.current = None # jobId выполняемого задания
+		self.jobs = 0
+		self.failed = 0
+		self.cancelled = 0
+		self.seconds = 0.0 # Время занятости станка отправками
+		self.sent = 0 # Прогресс текущего задания
+		self.total = 0
+		self.since = None # Начало текущего задания
+		self.metrics = PacketMetrics() # События пакетов всех заданий станка, из них - байты для скорости
+
+	def Summary(self, now: float) -> dict:
+		busy = now - self.since if self.since is not None else 0.0
+		seconds = self.seconds + busy
+		packets = self.metrics.Summary()
+		# Скорость по подтвержденным байтам в линии (после сжатия), а не по смещению в файле
+		sent = packets['bytes']
+		return {
+			'state': self.state,
+			'job': self.current,
+			'sent': self.sent,
+			'total': self.total,
+			'jobs': self.jobs,
+			'failed': self.failed,
+			'cancelled': self.cancelled,
+			'bytes': sent,
+			'seconds': seconds,
+			'bytesPerSec': sent / seconds if seconds > 0 else 0.0,
+			'packets': packets,
+			}
+
+
+# Открытие порта потоком диспетчера: сессии всех адресов порта делят один объект serial
+def OpenPort(port: str, baudrate: int):
+	return serial.serial_for_url(port, baudrate=baudrate, bytesize=8, parity='N', stopbits=1, timeout=0.01, do_not_open=True)
+
+
+# onProgress(job) и onFinished(job) вызываются в потоках портов.
+# serialFactory(port, baudrate) - свой объект порта (например, simulator.SimSerial), по умолчанию OpenPort
+class Dispatcher:
+	def __init__(self, machines: Iterable[Machine], chunkSize: int=250, retries: int=3, window: int=1,
+			journal: Optional[SendJournal]=None, onProgress: Optional[Callable[[DispatchJob], None]]=None,
+			onFinished: Optional[Callable[[DispatchJob], None]]=None,
+			serialFactory: Optional[Callable[[str, int], object]]=None, credit: bool=False):
+		self.machines = {}
+		self.ports = {} # Порт -> станки на нем
+		for machine in machines:
+			if machine.name in self.machines:
+				raise ValueError(f"Станок {machine.name} указан дважды")
+			onPort = self.ports.setdefault(machine.port, [])
+			if any(other.addr == machine.addr for other in onPort):
+				raise ValueError(f"Адрес {machine.addr} на порту {machine.port} указан дважды")
+			if onPort and onPort[0].baudrate != machine.baudrate:
+				raise ValueError(f"Разные скорости на порту {machine.port}")
+			onPort.append(machine)
+			self.machines[machine.name] = machine
+		if not self.machines:
+			raise ValueError("Нет станков")
+		self.chunkSize = chunkSize
+		self.retries = retries
+		self.window = window
+		self.credit = credit
+		self.journal = journal
+		self.onProgress = onProgress
+		self.onFinished = onFinished
+		self.serialFactory = serialFactory if serialFactory is not None else OpenPort
+		self.cond = threading.Condition()
+		self.jobs = {} # jobId -> DispatchJob, все задания
+		self.queue = [] # Ожидающие задания по порядку постановки
+		self.running = 0
+		self.nextId = 1
+		self.stats = {name: MachineStats() for name in self.machines}
+		self.threads = []
+		self.offline = set() # Порты, которые не удалось открыть
+		self.stopping = False
+		self.started = None # Первый старт задания и последнее завершение - для общей скорости
+		self.finished = None
+
+	def __enter__(self):
+		self.Start()
+		return self
+
+	def __exit__(self, excType, excValue, traceback):
+		self.Stop()
+
+	def Start(self) -> None:
+		if self.threads:
+			return
+		for port, machines in self.ports.items():
+			thread = threading.Thread(target=self._Run, args=(port, machines), name=f"dispatch {port}", daemon=True)
+			self.threads.append(thread)
+			thread.start()
+
+	def Submit(self, kind: str, payload, machine: Optional[str]=None, compact: bool=False, resume: bool=False) -> int:
+		if kind not in ('file', 'gcode'):
+			raise ValueError(f"Неизвестный тип задания: {kind}")
+		if machine is not None and machine not in self.machines:
+			raise ValueError(f"Неизвестный станок: {machine}")
+		with self.cond:
+			if self.stopping:
+				raise RuntimeError("Диспетчер остановлен")
+			job = DispatchJob(self.nextId, kind, payload, machine, compact, resume)
+			self.nextId += 1
+			self.jobs[job.jobId] = job
+			self.queue.append(job)
+			self.cond.notify_all()
+		return job.jobId
+
+	def SubmitFile(self, path: str, machine: Optional[str]=None, compact: bool=False, resume: bool=False) -> int:
+		return self.Submit('file', path, machine, compact, resume)
+
+	def SubmitGcode(self, gcodeLines: Iterable[str], machine: Optional[str]=None, compact: bool=False) -> int:
+		return self.Submit('gcode', list(gcodeLines), machine, compact)
+
+	# Пакет программ на весь парк: каждая уходит на первый освободившийся станок
+	def SubmitBatch(self, paths: Iterable[str], compact: bool=False, resume: bool=False) -> list[int]:
+		return [self.SubmitFile(path, None, compact, resume) for path in paths]
+
+	def Job(self, jobId: int) -> DispatchJob:
+		return self.jobs[jobId]
+
+	# jobId=None - все задания. Ожидающее снимается с очереди сразу, выполняемое - после текущего пакета
+	def Cancel(self, jobId: Optional[int]=None) -> None:
+		cancelled = []
+		with self.cond:
+			jobs = list(self.jobs.values()) if jobId is None else [self.jobs[jobId]]
+			for job in jobs:
+				job.cancel.set()
+				if job.state == 'queued':
+					self.queue.remove(job)
+					job.state = 'cancelled'
+					job.finished = time.perf_counter()
+					cancelled.append(job)
+			self.cond.notify_all()
+		for job in cancelled:
+			if self.onFinished is not None:
+				self.onFinished(job)
+
+	# Ждет, пока очередь опустеет и все задания завершатся. False - вышел таймаут
+	def Wait(self, timeout: Optional[float]=None) -> bool:
+		with self.cond:
+			return self.cond.wait_for(lambda: not self.queue and self.running == 0, timeout)
+
+	# Отменяет все задания, останавливает потоки и закрывает порты
+	def Stop(self) -> None:
+		self.Cancel()
+		with self.cond:
+			self.stopping = True
+			self.cond.notify_all()
+		for thread in self.threads:
+			thread.join()
+		self.threads = []
+
+	# Прогресс по станкам и общая скорость парка
+	def Status(self) -> dict:
+		now = time.perf_counter()
+		with self.cond:
+			machines = {name: stats.Summary(now) for name, stats in self.stats.items()}
+			counts = dict.fromkeys(JOB_STATES, 0)
+			for job in self.jobs.values():
+				counts[job.state] += 1
+			started = self.started
+			end = now if self.running or self.queue or self.finished is None else self.finished
+		sent = sum(item['bytes'] for item in machines.values())
+		seconds = end - started if started is not None else 0.0
+		return {
+			'machines': machines,
+			'jobs': counts,
+			'bytes': sent,
+			'seconds': seconds,
+			'bytesPerSec': sent / seconds if seconds > 0 else 0.0,
+			}
+
+	# Под замком: первое задание, которое может взять один из станков порта.
+	# anyMachine=False - только задания, назначенные на станки порта
+	def _Take(self, machines: list[Machine], anyMachine: bool=True) -> Optional[tuple[DispatchJob, Machine]]:
+		names = {machine.name: machine for machine in machines}
+		for job in self.queue:
+			if job.machine is None:
+				if not anyMachine:
+					continue
+				machine = machines[0]
+			elif job.machine in names:
+				machine = names[job.machine]
+			else:
+				continue
+			self.queue.remove(job)
+			return job, machine
+		return None
+
+	def _Run(self, port: str, machines: list[Machine]) -> None:
+		try:
+			ser = self.serialFactory(port, machines[0].baudrate)
+		except (serial.SerialException, ValueError):
+			self._Offline(port, machines)
+			return
+		sessions = {}
+		for machine in machines:
+			session = Prd3Session(machine.port, machine.baudrate, machine.addr, ser=ser)
+			session.AddListener(self.stats[machine.name].metrics)
+			sessions[machine.name] = session
+		try:
+			while True:
+				with self.cond:
+					taken = None
+					while not self.stopping:
+						taken = self._Take(machines)
+						if taken is not None:
+							break
+						self.cond.wait()
+					if taken is None:
+						return
+					job, machine = taken
+					stats = self.stats[machine.name]
+					job.state = 'running'
+					job.assigned = machine.name
+					job.started = time.perf_counter()
+					if self.started is None:
+						self.started = job.started
+					stats.state = 'busy'
+					stats.current = job.jobId
+					stats.sent = stats.total = 0
+					stats.since = job.started
+					self.running += 1
+
+				session = sessions[machine.name]
+				ok = self._Execute(session, job, stats)
+
+				with self.cond:
+					job.finished = time.perf_counter()
+					if ok:
+						job.state = 'done'
+					elif job.cancel.is_set():
+						job.state = 'cancelled'
+						stats.cancelled += 1
+					else:
+						job.state = 'failed'
+						stats.failed += 1
+					stats.jobs += 1
+					stats.seconds += job.finished - job.started
+					stats.state = 'idle'
+					stats.current = None
+					stats.sent = stats.total = 0
+					stats.since = None
+					self.finished = job.finished
+					self.running -= 1
+					self.cond.notify_all()
+				if self.onFinished is not None:
+					self.onFinished(job)
+		finally:
+			for session in sessions.values():
+				session.Close()
+
+	# Порт не открылся: сессии не создаются, задания его станков сразу завершаются ошибкой.
+	# Задания без станка достаются рабочим портам, а если не открылся ни один порт - тоже завершаются ошибкой
+	def _Offline(self, port: str, machines: list[Machine]) -> None:
+		with self.cond:
+			self.offline.add(port)
+			for machine in machines:
+				self.stats[machine.name].state = 'offline'
+			self.cond.notify_all()
+		while True:
+			with self.cond:
+				taken = None
+				while not self.stopping:
+					taken = self._Take(machines, len(self.offline) == len(self.ports))
+					if taken is not None:
+						break
+					self.cond.wait()
+				if taken is None:
+					return
+				job, machine = taken
+				stats = self.stats[machine.name]
+				job.state = 'failed'
+				job.assigned = machine.name
+				job.started = job.finished = time.perf_counter()
+				stats.jobs += 1
+				stats.failed += 1
+				self.cond.notify_all()
+			if self.onFinished is not None:
+				self.onFinished(job)
+
+	def _Execute(self, session: Prd3Session, job: DispatchJob, stats: MachineStats) -> bool:
+		def Progress(sent: int, total: int) -> None:
+			with self.cond:
+				job.sent = stats.sent = sent
+				job.total = stats.total = total
+			if self.onProgress is not None:
+				self.onProgress(job)
+
+		session.lastBytes = 0
+		if job.kind == 'file':
+			return session.SendGcodeFile(job.payload, self.chunkSize, self.retries, self.window, Progress, job.cancel,
+				job.compact, self.journal, job.resume, self.credit)
+		return session.SendGcode(job.payload, self.chunkSize, self.retries, self.window, Progress, 0, job.cancel, job.compact,
+			credit=self.credit)
+
+
+def PrintStatus(status: dict, out=sys.stdout) -> None:
+	for name, item in status['machines'].items():
+		done = f"{item['sent'] * 100 // item['total']}%" if item['total'] else '-'
+		out.write(f"{name}: {item['state']}, задание {item['job'] or '-'} {done}, заданий {item['jobs']} "
+			f"(ошибок {item['failed']}), {item['bytes']} байт, {item['bytesPerSec']:.0f} байт/с\n")
+	jobs = status['jobs']
+	out.write(f"Всего: {status['bytes']} байт за {status['seconds']:.1f} с, {status['bytesPerSec']:.0f} байт/с; "
+		f"в очереди {jobs['queued']}, выполняется {jobs['running']}, готово {jobs['done']}, ошибок {jobs['failed']}, "
+		f"отменено {jobs['cancelled']}\n")
+	out.flush()
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Send a batch of G-code programs to several PRD-3 machines")
+	parser.add_argument('files', nargs='+', help="Файлы G-code, каждый уходит на первый свободный станок")
+	parser.add_argument('--machine', action='append', required=True, help="PORT[@ADDR][=NAME], можно несколько раз")
+	parser.add_argument('--baudrate', type=int, default=115200)
+	parser.add_argument('--chunk', type=int, default=250)
+	parser.add_argument('--window', type=int, default=1, help="Окно пакетов, 0 - по кольцу UART ноды")
+	parser.add_argument('--credit', action='store_true', help="Кредитное управление потоком по буферу ноды")
+	parser.add_argument('--compact', action='store_true', help="Сжатие G-code без потерь")
+	parser.add_argument('--resume', action='store_true', help="Продолжать прерванные отправки по журналу")
+	parser.add_argument('--interval', type=float, default=1.0, help="Период вывода прогресса, секунды")
+	parser.add_argument('--sim', action='store_true', help="Вместо портов - симулятор ноды (simulator.py)")
+	args = parser.parse_args()
+
+	machines = [ParseMachine(spec, args.baudrate) for spec in args.machine]
+	serialFactory = None
+	if args.sim:
+		from simulator import SimSerial, WorkerNode
+		# Симулятор отвечает только своему адресу: станок на порт
+		simAddrs = {machine.port: machine.addr for machine in machines}
+		serialFactory = lambda port, baudrate: SimSerial(WorkerNode(baudrate=baudrate, addr=simAddrs[port]))
+
+	def Finished(job: DispatchJob) -> None:
+		print(f"{job.payload}: {job.state} ({job.assigned or '-'})", flush=True)
+
+	with SendJournal() as journal:
+		dispatcher = Dispatcher(machines, args.chunk, window=args.window, journal=journal, onFinished=Finished,
+			serialFactory=serialFactory, credit=args.credit)
+		try:
+			with dispatcher:
+				dispatcher.SubmitBatch(args.files, args.compact, args.resume)
+				while not dispatcher.Wait(args.interval):
+					PrintStatus(dispatcher.Status())
+		except KeyboardInterrupt:
+			print("Отмена...", flush=True)
+		status = dispatcher.Status()
+	PrintStatus(status)
+	sys.exit(0 if status['jobs']['done'] == len(args.files) else 1)
@@ -0,0 +1,99 @@
+# Инкрементальный декодер кадров PRD-3: SYNC_1 | SYNC_2 | LEN | SQN | ADDR | ACK | DATA | CRC
+# Общий для транспорта (response.py) и тестера CaTE
+import time
+from collections import deque
+from typing import NamedTuple, Optional
+from crc8 import Crc8
+
+SYNC = bytes([0xAC, 0x53]) # SYNC_1, SYNC_2
+MIN_LEN = 3 # SQN, ADDR, ACK без данных
+MAX_LEN = 253
+
+
+# Разобранный кадр. crcOk=False - кадр пришел с ошибкой CRC, поля могут быть искажены
+class Frame(NamedTuple):
+	sqn: int
+	addr: int
+	ack: int
+	data: bytes
+	crcOk: bool
+
+
+class FrameDecoder:
+	def __init__(self, minLen: int=MIN_LEN, maxLen: int=MAX_LEN):
+		self.minLen = minLen
+		self.maxLen = maxLen
+		self.buf = bytearray() # Принятые, но еще не разобранные байты
+		self.pos = 0 # Начало неразобранной части buf
+		self.frames = deque() # Готовые кадры, которые еще не забрали через ReadFrame
+		self.dropped = 0 # Байты, отброшенные при поиске синхрослова
+
+	def Reset(self) -> None:
+		self.buf.clear()
+		self.pos = 0
+		self.frames.clear()
+
+	# Сколько байт неполного кадра ждет продолжения
+	def Pending(self) -> int:
+		return len(self.buf) - self.pos
+
+	# Добавляет очередную порцию байтов и возвращает все кадры, которые в ней завершились.
+	# Неполный кадр остается в буфере до следующего вызова
+	def Feed(self, data) -> list[Frame]:
+		if data:
+			self.buf += data
+		buf = self.buf
+		view = memoryview(buf)
+		frames = []
+		try:
+			while True:
+				i = buf.find(SYNC, self.pos)
+				if i < 0:
+					# Синхрослова нет. Последний байт может оказаться началом SYNC_1 - его оставляем
+					keep = 1 if len(buf) > self.pos and buf[-1] == SYNC[0] else 0
+					self.dropped += len(buf) - self.pos - keep
+					self.pos = len(buf) - keep
+					break
+
+				self.dropped += i - self.pos
+				self.pos = i
+				if len(buf) - i < 3:
+					break
+
+				length = buf[i + 2]
+				if length < self.minLen or length > self.maxLen:
+					# Ложное синхрослово: продолжаем поиск со следующего байта
+					self.pos = i + 1
+					self.dropped += 1
+					continue
+
+				total = length + 4
+				if len(buf) - i < total:
+					break
+
+				crcOk = Crc8(view[i + 2:i + 3 + length]) == buf[i + 3 + length]
+				frames.append(Frame(buf[i + 3], buf[i + 4], buf[i + 5], bytes(view[i + 6:i + 3 + length]), crcOk))
+				# После битого кадра ищем синхрослово внутри него: SYNC мог быть ложным
+				self.pos = i + total if crcOk else i + 1
+		finally:
+			view.release()
+
+		# Уплотняем буфер, чтобы он не рос бесконечно
+		if self.pos > 4096 or self.pos * 2 > len(buf):
+			del buf[:self.pos]
+			self.pos = 0
+		return frames
+
+	# Забирает из порта все, что уже пришло (in_waiting). Если пусто - ждет один байт в пределах ser.timeout
+	def Poll(self, ser) -> list[Frame]:
+		waiting = ser.in_waiting
+		return self.Feed(ser.read(waiting if waiting > 0 else 1))
+
+	# Следующий кадр из порта или None, если за timeout секунд кадр не завершился
+	def ReadFrame(self, ser, timeout: float=0.05) -> Optional[Frame]:
+		deadline = time.monotonic() + timeout
+		while not self.frames:
+			if time.monotonic() >= deadline:
+				return None
+			self.frames.extend(self.Poll(ser))
+		return self.frames.popleft()
@@ -0,0 +1,103 @@
+# Сжатие G-code без потерь перед упаковкой в пакеты: меньше байт - меньше пакетов и ожиданий ACK.
+# Результат разбирается парсером прошивки так же, как исходный текст (strchr по букве + atof)
+import re
+from typing import Generator, Iterable
+
+WORD = re.compile(r'([A-Z])([+-]?\d*\.?\d*)')
+NUMBER = re.compile(r'([+-]?)(\d*)(?:\.(\d*))?')
+MOTION_G = ('0', '1', '2', '3')
+
+
+# Статистика сжатия одного задания
+class CompactStats:
+	def __init__(self):
+		self.lines = 0 # Строк на входе
+		self.droppedLines = 0 # Строк, от которых остались только комментарии/пробелы
+		self.rawBytes = 0 # Байт до сжатия (с '\n' на строку)
+		self.compactBytes = 0 # Байт после сжатия (с '\n' на строку)
+
+	# Доля байт, оставшихся после сжатия: 0.6 - поток стал на 40% короче
+	def Ratio(self) -> float:
+		return self.compactBytes / self.rawBytes if self.rawBytes else 1.0
+
+
+# Удаление комментариев: ';' до конца строки и '(...)'
+def StripComments(line: str) -> str:
+	line = line.split(';', 1)[0]
+	while '(' in line:
+		start = line.index('(')
+		end = line.find(')', start)
+		if end < 0:
+			return line[:start]
+		line = line[:start] + line[end + 1:]
+	return line
+
+
+# Короткая запись числа без изменения значения: 007 -> 7, 120.000 -> 120, 0.50 -> .5, -0.0 -> 0
+def TrimNumber(text: str) -> str:
+	m = NUMBER.fullmatch(text)
+	if m is None:
+		return text
+	sign, intPart, fracPart = m.group(1), m.group(2), m.group(3) or ''
+	if not intPart and not fracPart:
+		return text
+	intPart = intPart.lstrip('0')
+	fracPart = fracPart.rstrip('0')
+	if not intPart and not fracPart:
+		return '0'
+	return ('-' if sign == '-' else '') + intPart + ('.' + fracPart if fracPart else '')
+
+
+# Нужен ли пробел между числом и следующим словом, чтобы atof в прошивке не захватил букву:
+# 'X1E2' atof читает как 100, 'Y0X5' - как шестнадцатеричное 0x5
+def _NeedsSeparator(number: str, nextLetter: str) -> bool:
+	return nextLetter == 'E' or (nextLetter == 'X' and number == '0')
+
+
+# Сжатие одной строки. prevG - G-слово предыдущей строки (для dropModalG), возвращает (строка, G-слово).
+# Регистр букв не меняется: прошивка ищет слова только заглавными, и 'x10' после сжатия должно остаться
+# той же ошибкой, а не стать новым словом X
+def CompactLine(line: str, prevG: str=None, dropModalG: bool=False) -> tuple[str, str]:
+	text = ''.join(StripComments(line).split())
+	if not text:
+		return ('', prevG)
+
+	words = WORD.findall(text)
+	# Строку, которая не раскладывается на слова БУКВА+ЧИСЛО целиком, оставляем как есть (без пробелов и комментариев)
+	if sum(len(letter) + len(number) for letter, number in words) != len(text):
+		return (text, prevG)
+
+	out = []
+	currentG = prevG
+	prevNumber = None
+	for letter, number in words:
+		number = TrimNumber(number)
+		if letter == 'G':
+			# Модальное G-слово движения можно опустить, если оно совпадает с предыдущим
+			if dropModalG and number == prevG and number in MOTION_G:
+				continue
+			currentG = number
+		if prevNumber is not None and _NeedsSeparator(prevNumber, letter):
+			out.append(' ')
+		out.append(letter + number)
+		prevNumber = number
+	return (''.join(out), currentG)
+
+
+# Сжатие потока строк G-code. Пустые после сжатия строки выбрасываются.
+# dropModalG выключен по умолчанию: текущая прошивка требует G-слово в каждой команде
+def CompactGcode(gcodeLines: Iterable[str], stats: CompactStats=None, dropModalG: bool=False) -> Generator[str, None, None]:
+	prevG = None
+	for line in gcodeLines:
+		raw = line.rstrip("\r\n")
+		compact, prevG = CompactLine(raw, prevG, dropModalG)
+		if stats is not None:
+			stats.lines += 1
+			stats.rawBytes += len(raw) + 1
+		if not compact:
+			if stats is not None:
+				stats.droppedLines += 1
+			continue
+		if stats is not None:
+			stats.compactBytes += len(compact) + 1
+		yield compact
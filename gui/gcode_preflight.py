@@ -0,0 +1,263 @@
+# Проверка G-code файла до отправки: ошибки, на которые прошивка ответит ACK_BAD_PARAM, находятся сразу, с номерами строк,
+# а не через час работы. Один проход по файлу, память не зависит от его размера.
+# Правила повторяют разбор прошивки (cnc-logic.c: ParseGcode, GetGcodeArg - strchr по букве + atof, MoveTo):
+# G-слово в каждой строке, G00-G03, G90/G91, слова X/Y/I/J/R/F, поле 0..330 x 0..228
+# Запуск без GUI: python gcode_preflight.py file.cnc [--compact]
+import argparse
+import math
+import re
+import sys
+import time
+from typing import Iterable, NamedTuple
+
+from gcode_compact import CompactLine, StripComments
+from toolpath import get_arc_center
+
+FIELD_WIDTH = 330 # Границы из MoveTo прошивки, мм
+FIELD_HEIGHT = 228
+SUPPORTED_G = (0, 1, 2, 3, 90, 91)
+MOTION_WORDS = 'XYF'
+ARC_WORDS = 'XYIJRF'
+ARC_RADIUS_TOLERANCE = 0.1 # Допустимая разница расстояний от центра I/J до начала и конца дуги, мм
+EPSILON = 1e-6
+
+# Строка из слов БУКВА+ЧИСЛО (пробелы допустимы: strchr их пропускает, atof тоже)
+LINE = re.compile(r'(?:\s*[A-Z]\s*[+-]?(?:\d+\.?\d*|\.\d+))*\s*')
+WORD = re.compile(r'([A-Z])\s*([+-]?(?:\d+\.?\d*|\.\d+))')
+LOOSE_WORD = re.compile(r'([A-Za-z])\s*([+-]?\d*\.?\d*)')
+# Число, которое atof продолжит буквой следующего слова (см. gcode_compact._NeedsSeparator): 'Y0X5' - 0x5, 'X1E2' - 100
+SEPARATOR = re.compile(r'[A-Z]\s*[+-]?0X|[\d.]E')
+
+
+# Найденная ошибка: номер строки в файле (с 1), описание, текст строки.
+# warning - строка пройдет, но прошивка поймет ее не так, как написано; отправку не запрещает
+class PreflightIssue(NamedTuple):
+	line: int
+	message: str
+	text: str
+	warning: bool = False
+
+
+# Углы дуги, на которых она достигает крайних x/y: концы и пересеченные направления 0, 90, 180, 270 градусов
+def _ArcBox(cx: float, cy: float, r: float, a1: float, sweep: float, ccw: bool) -> tuple[float, float, float, float]:
+	start = a1 if ccw else a1 - sweep
+	angles = [start, start + sweep]
+	k = math.ceil(start / (math.pi / 2))
+	while k * math.pi / 2 < start + sweep:
+		angles.append(k * math.pi / 2)
+		k += 1
+	xs = [cx + r * math.cos(a) for a in angles]
+	ys = [cy + r * math.sin(a) for a in angles]
+	return (min(xs), min(ys), max(xs), max(ys))
+
+
+# Потоковая проверка: Feed по строке, состояние - позиция и режим G90/G91, как у прошивки.
+# compact - строки уйдут после CompactLine (комментарии и пробелы удалены, регистр прежний)
+class Preflight:
+	def __init__(self, x: float=0.0, y: float=0.0, absolute: bool=True, compact: bool=False,
+			maxLineLength: int=250, maxIssues: int=100):
+		self.x = x
+		self.y = y
+		self.absolute = absolute
+		self.compact = compact
+		self.maxLineLength = maxLineLength # chunkSize: строка вместе с '\n' должна помещаться в пакет
+		self.maxIssues = maxIssues
+		self.lines = 0 # Прочитано строк
+		self.commands = 0 # Строк, которые уйдут в прошивку
+		self.errors = 0 # Всего ошибок
+		self.warnings = 0 # Всего предупреждений
+		self.issues: list[PreflightIssue] = [] # Первые maxIssues ошибок и предупреждений
+		self.startTime = time.perf_counter()
+		self.seconds = 0.0
+
+	def Ok(self) -> bool:
+		return self.errors == 0
+
+	def Summary(self) -> str:
+		return f"строк {self.lines}, команд {self.commands}, ошибок {self.errors}, предупреждений {self.warnings}, {self.seconds:.2f} с"
+
+	def _Issue(self, lineNo: int, message: str, text: str, warning: bool=False) -> None:
+		if warning:
+			self.warnings += 1
+		else:
+			self.errors += 1
+		if len(self.issues) < self.maxIssues:
+			self.issues.append(PreflightIssue(lineNo, message, text, warning))
+
+	def Finish(self) -> 'Preflight':
+		self.seconds = time.perf_counter() - self.startTime
+		return self
+
+	def Feed(self, lineNo: int, raw: str) -> None:
+		self.lines += 1
+		raw = raw.rstrip("\r\n")
+		# Пустые строки не отправляются (ReadGcodeFile), после сжатия выбрасываются и строки из одних комментариев.
+		# Для проверки слов достаточно того, что CompactLine делает с ними (без комментариев и пробелов),
+		# сама CompactLine нужна только для точной длины длинной строки
+		if self.compact:
+			text = ''.join(StripComments(raw).split())
+			if len(text) + 1 > self.maxLineLength:
+				text = CompactLine(raw)[0]
+		else:
+			text = raw
+		if text == '':
+			return
+		self.commands += 1
+		if len(text) + 1 > self.maxLineLength:
+			self._Issue(lineNo, f"строка длиннее пакета: {len(text) + 1} > {self.maxLineLength} байт", raw)
+			return
+		if LINE.fullmatch(text) is None:
+			self._Issue(lineNo, self._Diagnose(text), raw)
+			return
+		pairs = WORD.findall(text)
+		words = {letter: float(number) for letter, number in pairs}
+		if len(words) != len(pairs):
+			letters = [letter for letter, number in pairs]
+			repeated = next(letter for letter in letters if letters.count(letter) > 1)
+			# strchr найдет только первое вхождение
+			self._Issue(lineNo, f"слово {repeated} повторяется, прошивка прочтет только первое", raw)
+			return
+		if not self.compact:
+			m = SEPARATOR.search(text)
+			if m is not None:
+				self._Issue(lineNo, f"atof прочтет '{m.group(0)}...' как одно число - нужен пробел", raw)
+				return
+
+		if 'G' not in words:
+			self._Issue(lineNo, "нет G-слова", raw)
+			return
+		g = words['G']
+		if g != int(g) or int(g) not in SUPPORTED_G:
+			self._Issue(lineNo, f"G{words['G']:g} не поддерживается прошивкой (G00-G03, G90, G91)", raw)
+			return
+		g = int(g)
+		if g in (90, 91):
+			# Прошивка переключает режим и не смотрит на остальные слова
+			if len(words) > 1:
+				extra = [letter for letter in words if letter != 'G']
+				self._Issue(lineNo, f"слова {', '.join(extra)} в G{g} прошивка пропустит", raw, warning=True)
+			self.absolute = g == 90
+			return
+
+		allowed = MOTION_WORDS if g in (0, 1) else ARC_WORDS
+		extra = [letter for letter in words if letter != 'G' and letter not in allowed]
+		if extra:
+			self._Issue(lineNo, f"слова {', '.join(extra)} не используются в G{g:02d}", raw)
+			return
+		if 'F' in words and words['F'] <= 0:
+			self._Issue(lineNo, "подача F должна быть больше нуля", raw)
+			return
+
+		x = words.get('X', self.x if self.absolute else 0.0)
+		y = words.get('Y', self.y if self.absolute else 0.0)
+		if not self.absolute:
+			x += self.x
+			y += self.y
+		box = (x, y, x, y)
+		if g in (2, 3):
+			box = self._ArcCheck(lineNo, raw, words, x, y, g == 3)
+			if box is None:
+				return
+		if box[0] < -EPSILON or box[1] < -EPSILON or box[2] > FIELD_WIDTH + EPSILON or box[3] > FIELD_HEIGHT + EPSILON:
+			if g in (2, 3):
+				self._Issue(lineNo, f"дуга выходит за поле 0..{FIELD_WIDTH} x 0..{FIELD_HEIGHT}", raw)
+			else:
+				self._Issue(lineNo, f"точка X{x:g} Y{y:g} вне поля 0..{FIELD_WIDTH} x 0..{FIELD_HEIGHT}", raw)
+			# MoveTo прошивки в этом случае никуда не едет
+			return
+		self.x = x
+		self.y = y
+
+	# Почему строка не разобралась на слова (медленный путь, только для ошибочных строк)
+	def _Diagnose(self, text: str) -> str:
+		if ';' in text or '(' in text:
+			return "комментарий уйдет в прошивку как текст - включите сжатие или удалите его"
+		if LOOSE_WORD.sub('', text).strip():
+			return "строка не раскладывается на слова БУКВА+ЧИСЛО"
+		for letter, number in LOOSE_WORD.findall(text):
+			if letter.islower():
+				return f"строчная буква '{letter}': прошивка ищет слова только в верхнем регистре"
+			if not any(c.isdigit() for c in number):
+				return f"у слова {letter} нет числа"
+		return "строка не раскладывается на слова БУКВА+ЧИСЛО"
+
+	# Дуга из (self.x, self.y) в (x, y): возможна ли и какую область занимает. None - ошибка уже записана
+	def _ArcCheck(self, lineNo: int, raw: str, words: dict, x: float, y: float, ccw: bool):
+		hasR = 'R' in words
+		hasIJ = 'I' in words or 'J' in words
+		if hasR and hasIJ:
+			self._Issue(lineNo, "в дуге одновременно R и I/J", raw)
+			return None
+		if not hasR and not hasIJ:
+			self._Issue(lineNo, "дуге нужен R или I/J", raw)
+			return None
+		if hasR:
+			if x == self.x and y == self.y:
+				# draw_gcode_arc в этом случае ничего не рисует
+				return (x, y, x, y)
+			# Та же геометрия, что у draw_gcode_arc (toolpath.get_arc_center)
+			arc = get_arc_center(self.x, self.y, x, y, words['R'], ccw)
+			if arc is None:
+				distance = math.hypot(x - self.x, y - self.y)
+				self._Issue(lineNo, f"дуга невозможна: расстояние {distance:g} больше диаметра {2 * abs(words['R']):g}", raw)
+				return None
+			cx, cy, a1, sweep = arc
+			return _ArcBox(cx, cy, abs(words['R']), a1, sweep, ccw)
+
+		cx = self.x + words.get('I', 0.0)
+		cy = self.y + words.get('J', 0.0)
+		r1 = math.hypot(self.x - cx, self.y - cy)
+		r2 = math.hypot(x - cx, y - cy)
+		if r1 == 0:
+			self._Issue(lineNo, "центр дуги I/J совпадает с ее началом", raw)
+			return None
+		if abs(r1 - r2) > ARC_RADIUS_TOLERANCE:
+			self._Issue(lineNo, f"дуга невозможна: центр I/J на расстоянии {r1:g} от начала и {r2:g} от конца", raw)
+			return None
+		a1 = math.atan2(self.y - cy, self.x - cx)
+		a2 = math.atan2(y - cy, x - cx)
+		sweep = (a2 - a1 if ccw else a1 - a2) % (2 * math.pi)
+		if sweep == 0:
+			sweep = 2 * math.pi # полная окружность
+		return _ArcBox(cx, cy, r1, a1, sweep, ccw)
+
+
+def PreflightLines(lines: Iterable[str], **kwargs) -> Preflight:
+	check = Preflight(**kwargs)
+	for lineNo, line in enumerate(lines, 1):
+		check.Feed(lineNo, line)
+	return check.Finish()
+
+
+# Файл читается построчно в байтах: строка не в ASCII - ошибка этой строки (SendGcodeFile отказал бы на весь файл)
+def PreflightFile(path: str, **kwargs) -> Preflight:
+	check = Preflight(**kwargs)
+	with open(path, 'rb') as file:
+		for lineNo, data in enumerate(file, 1):
+			try:
+				line = data.decode('ascii')
+			except UnicodeDecodeError:
+				check.lines += 1
+				check._Issue(lineNo, "символы не из ASCII", data.decode('ascii', 'replace').rstrip("\r\n"))
+				continue
+			check.Feed(lineNo, line)
+	return check.Finish()
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="G-code preflight check against the PRD-3 firmware parser")
+	parser.add_argument('path', type=str)
+	parser.add_argument('--compact', action='store_true', help="Проверять строки после сжатия (как при отправке со сжатием)")
+	parser.add_argument('--x', type=float, default=0.0, help="Начальная позиция X. По умолчанию = 0")
+	parser.add_argument('--y', type=float, default=0.0, help="Начальная позиция Y. По умолчанию = 0")
+	parser.add_argument('--chunk', type=int, default=250, help="chunkSize отправки. По умолчанию = 250")
+	parser.add_argument('--max-issues', type=int, default=100)
+	args = parser.parse_args()
+
+	check = PreflightFile(args.path, x=args.x, y=args.y, compact=args.compact, maxLineLength=args.chunk, maxIssues=args.max_issues)
+	for issue in check.issues:
+		print(f"{args.path}:{issue.line}: {'предупреждение: ' if issue.warning else ''}{issue.message}: {issue.text}")
+	if check.errors + check.warnings > len(check.issues):
+		print(f"... и еще {check.errors + check.warnings - len(check.issues)}")
+	print(check.Summary())
+	sys.exit(0 if check.Ok() else 1)
@@ -0,0 +1,185 @@
+# Журнал отправки файлов G-code: только дозапись, по JSON-записи в строке, fsync после каждой записи.
+# По нему отправка продолжается с последнего подтвержденного пакета - после обрыва связи или перезапуска GUI.
+# Записи:
+#   start - задание: job, станок (порт@ADDR), путь, sha256 и размер файла, смещение и SQN следующего пакета на старте,
+#           сжатие и размер пакета - продолжить можно только с теми же настройками
+#   ack - пакет подтвержден: смещение в файле, до которого строки доставлены целиком, и SQN пакета
+#   done/failed/cancelled - чем закончилось задание. Задание без такой записи оборвалось вместе с GUI
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from typing import Generator, Optional
+
+
+# Каталог данных пользователя: журнал не зависит от каталога запуска и не попадает в рабочее дерево
+def DataDir() -> str:
+	if sys.platform.startswith('win'):
+		base = os.environ.get('APPDATA') or os.path.expanduser('~')
+	else:
+		base = os.environ.get('XDG_DATA_HOME') or os.path.join(os.path.expanduser('~'), '.local', 'share')
+	return os.path.join(base, 'cnc-software')
+
+
+JOURNAL_PATH = os.path.join(DataDir(), 'send_journal.jsonl')
+JOURNAL_MAX_BYTES = 4 << 20 # Больше - при открытии журнал переписывается, остаются только незавершенные задания
+FINISH_EVENTS = ('done', 'failed', 'cancelled')
+
+
+# Станок в записях журнала: продолжать можно только на том же станке
+def JournalTarget(port: str, addr: int) -> str:
+	return f"{port}@{addr}"
+
+
+def FileSha256(path: str, blockSize: int=1 << 20) -> str:
+	digest = hashlib.sha256()
+	with open(path, 'rb') as file:
+		while True:
+			block = file.read(blockSize)
+			if not block:
+				break
+			digest.update(block)
+	return digest.hexdigest()
+
+
+class SendJournal:
+	def __init__(self, path: str=JOURNAL_PATH, maxBytes: int=JOURNAL_MAX_BYTES):
+		self.path = path
+		self.maxBytes = maxBytes
+		self.file = None
+		self.lock = threading.RLock() # Пишут потоки отправки (dispatch.py - по потоку на порт)
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, excType, excValue, traceback):
+		self.Close()
+
+	def Close(self) -> None:
+		with self.lock:
+			if self.file is not None:
+				self.file.close()
+				self.file = None
+
+	def _Open(self) -> None:
+		os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+		try:
+			size = os.path.getsize(self.path)
+		except OSError:
+			size = 0
+		if size > self.maxBytes:
+			self.Compact()
+		self.file = open(self.path, 'a+b')
+		# Запись, оборванная сбоем, остается без '\n': новую пишем с новой строки, иначе пропадут обе
+		if self.file.tell() > 0:
+			self.file.seek(-1, os.SEEK_END)
+			if self.file.read(1) != b'\n':
+				self.file.write(b'\n')
+
+	def _Append(self, record: dict) -> None:
+		with self.lock:
+			if self.file is None:
+				self._Open()
+			self.file.write((json.dumps(record, separators=(',', ':')) + '\n').encode('utf-8'))
+			self.file.flush()
+			os.fsync(self.file.fileno())
+
+	# Новое задание, возвращает его id. sqn - SQN следующего пакета
+	def Start(self, path: str, fileHash: str, size: int, offset: int, sqn: int,
+			compact: bool=False, chunkSize: int=250, resumeOf: Optional[str]=None, target: Optional[str]=None) -> str:
+		job = uuid.uuid4().hex[:12]
+		self._Append({'event': 'start', 'job': job, 'time': round(time.time(), 3), 'target': target, 'path': os.path.abspath(path),
+			'hash': fileHash, 'size': size, 'offset': offset, 'sqn': sqn, 'compact': compact,
+			'chunk': chunkSize, 'resumeOf': resumeOf})
+		return job
+
+	# Пакет с SQN sqn подтвержден, строки файла до offset доставлены целиком
+	def Ack(self, job: str, offset: int, sqn: int) -> None:
+		self._Append({'event': 'ack', 'job': job, 'offset': offset, 'sqn': sqn})
+
+	def Finish(self, job: str, status: str) -> None:
+		if status not in FINISH_EVENTS:
+			raise ValueError(f"Неизвестный итог задания: {status}")
+		self._Append({'event': status, 'job': job, 'time': round(time.time(), 3)})
+
+	# Записи по порядку. Недописанная при сбое строка пропускается
+	def Records(self) -> Generator[dict, None, None]:
+		try:
+			file = open(self.path, 'rb')
+		except FileNotFoundError:
+			return
+		with file:
+			for line in file:
+				try:
+					record = json.loads(line)
+				except ValueError:
+					continue
+				if isinstance(record, dict) and 'job' in record:
+					yield record
+
+	# Состояние заданий в порядке старта: смещение и SQN следующего пакета, status=None - итога нет
+	def Jobs(self) -> dict[str, dict]:
+		jobs = {}
+		for record in self.Records():
+			event = record.get('event')
+			if event == 'start':
+				state = {key: record.get(key) for key in ('job', 'time', 'target', 'path', 'hash', 'size', 'offset', 'sqn', 'compact', 'chunk', 'resumeOf')}
+				state['status'] = None
+				jobs[record['job']] = state
+				continue
+			state = jobs.get(record['job'])
+			if state is None:
+				continue
+			if event == 'ack':
+				state['offset'] = record['offset']
+				state['sqn'] = (record['sqn'] + 1) & 0xFF
+			elif event in FINISH_EVENTS:
+				state['status'] = event
+		return jobs
+
+	# Последнее задание с этим файлом (на этом станке, если target задан), если оно не завершилось
+	# и часть файла уже доставлена. Записи без станка (журнал прежних версий) подходят любому.
+	# Со сжатием или размером пакета, отличными от записанных, задание не продолжается: файл отправляется заново
+	def Resumable(self, fileHash: str, target: Optional[str]=None, compact: bool=False, chunkSize: int=250) -> Optional[dict]:
+		latest = None
+		for state in self.Jobs().values():
+			if state['hash'] == fileHash and (target is None or state['target'] in (None, target)):
+				latest = state
+		if latest is None or latest['status'] == 'done':
+			return None
+		if latest['compact'] != compact or latest['chunk'] != chunkSize:
+			return None
+		if not 0 < latest['offset'] < latest['size']:
+			return None
+		return latest
+
+	# Переписывает журнал: у незавершенных заданий остается одна запись start с текущим смещением и SQN
+	# (и итог, если он есть). Временный файл подменяет журнал атомарно, сбой посередине журнал не портит
+	def Compact(self) -> None:
+		with self.lock:
+			self._Compact()
+
+	def _Compact(self) -> None:
+		self.Close()
+		jobs = [state for state in self.Jobs().values() if state['status'] != 'done']
+		temp = self.path + '.tmp'
+		with open(temp, 'wb') as file:
+			for state in jobs:
+				record = {key: value for key, value in state.items() if key != 'status'}
+				record = {'event': 'start', **record}
+				file.write((json.dumps(record, separators=(',', ':')) + '\n').encode('utf-8'))
+				if state['status'] is not None:
+					file.write((json.dumps({'event': state['status'], 'job': state['job']}, separators=(',', ':')) + '\n').encode('utf-8'))
+			file.flush()
+			os.fsync(file.fileno())
+		os.replace(temp, self.path)
+		# Переименование тоже должно пережить сбой питания
+		if hasattr(os, 'O_DIRECTORY'):
+			directory = os.open(os.path.dirname(os.path.abspath(self.path)), os.O_RDONLY | os.O_DIRECTORY)
+			try:
+				os.fsync(directory)
+			finally:
+				os.close(directory)
@@ -1,174 +1,22 @@
 from PyQt5.QtWidgets import QApplication, QMainWindow, QMessageBox, QGraphicsScene, QFileDialog
 from PyQt5.QtSerialPort import QSerialPortInfo
 from PyQt5 import uic
-from PyQt5.QtCore import Qt, QObject, QEvent
-from PyQt5.QtGui import QTextCursor, QPixmap, QIcon
+from PyQt5.QtCore import Qt, QObject, QEvent, QTimer
+from PyQt5.QtGui import QTextCursor, QPixmap, QIcon, QImage
 from PIL import Image, ImageDraw
 import os
 import sys
-import copy
-import math
+import numpy as np
 #import serial.tools.list_ports as get_list
 
 SELECTED_MODE_BTN_STYLE = 'border: 3px solid black;'
 SCALE_FACTOR = 2
 
 
-# from response import *
-# dummy implementation of SendGcode and SendHex for testing GUI
-def SendGcode(port: str, gcodeLines: list[str], baudrate: int, chunkSize: int=250, retries: int=3) -> bool:
-    print(f"Sending G-codes: port={port}, baudrate={baudrate}; G-codes={gcodeLines}")
-    return True
-
-
-def SendHex(port: str, hexString: str, baudrate: int) -> bool:
-    print(f"Sending HEX packet: port={port}, baudrate={baudrate}; packet={hexString}")
-    return True
-
-
-def nearest_anchor(x: int, y: int, anchors: set[tuple[int, int]]) -> tuple[int, int]:
-    if not anchors:
-        raise ValueError("Множество anchors не должно быть пустым")
-    return min(anchors, key=lambda a: math.hypot(a[0] - x, a[1] - y))
-
-
-def get_gcode(mode: str, paint: bool, x: int, y: int, ccw: bool=False, radius:int=0) -> str:
-    if not paint:
-        return f'G00 X{x} Y{y}'
-    if mode in ('hrz', 'vrt', 'slp'):
-        return f'G01 X{x} Y{y}'
-    if mode == 'arc':
-        if ccw:
-            return f'G03 X{x} Y{y} R{radius}'
-        else:
-            return f'G02 X{x} Y{y} R{radius}'
-
-
-def get_gcodes_htc(img, mode: str, paint: bool, x: int, y: int, angle: int, distance: int, x_cur: int, y_cur: int) -> tuple[list[str], int, int]:
-    if not paint:
-        return [list(), x_cur, y_cur]
-    ret = []
-    x_last, y_last = x_cur, y_cur
-    for x1, y1, x2, y2 in get_hatch_lines(img, x, y, angle, distance):
-        ret.append(f'G00 X{x1} Y{y1}')
-        ret.append(f'G01 X{x2} Y{y2}')
-        x_last, y_last = x2, y2
-    return (ret, x_last, y_last)
-
-
-def get_hatch_lines(img, x, y, angle, distance):
-
-    def _extend_line(x1, y1, x2, y2, pixels):
-        dx = x2 - x1
-        dy = y2 - y1
-        length = math.hypot(dx, dy)
-        if length == 0:
-            return x1, y1, x2, y2
-        ux = dx / length
-        uy = dy / length
-        return (int(round(x1 - ux * pixels)), int(round(y1 - uy * pixels)), int(round(x2 + ux * pixels)), int(round(y2 + uy * pixels)))
-
-    img = copy.deepcopy(img.convert("L"))
-    w, h = img.size
-
-    inv = Image.eval(img, lambda p: 255 if p > 128 else 0)
-    ImageDraw.floodfill(inv, (x, y), 128)
-
-    region = inv.point(lambda p: 255 if p == 128 else 0)
-    mask = region.load()
-
-    angle_rad = math.radians(angle)
-    dx, dy = math.cos(angle_rad), math.sin(angle_rad)
-    nx, ny = -dy, dx
-    diag = int(math.hypot(w, h)) + 2
-    cx, cy = w / 2, h / 2
-
-    segments = []
-    offset = -diag
-    while offset < diag:
-        x1 = cx + nx * offset - dx * diag
-        y1 = cy + ny * offset - dy * diag
-        x2 = cx + nx * offset + dx * diag
-        y2 = cy + ny * offset + dy * diag
-
-        steps = int(math.hypot(x2 - x1, y2 - y1))
-        inside = False
-        sx = sy = None
-        for i in range(steps + 1):
-            t = i / steps
-            xi = int(x1 + (x2 - x1) * t)
-            yi = int(y1 + (y2 - y1) * t)
-            if 0 <= xi < w and 0 <= yi < h and mask[xi, yi]:
-                if not inside:
-                    sx, sy = xi, yi
-                    inside = True
-            else:
-                if inside:
-                    segments.append((sx, sy, xi, yi))
-                    inside = False
-        if inside:
-            segments.append(_extend_line(sx, sy, xi, yi, 2))
-        offset += distance
-
-    return segments
-
-
-def draw_gcode_arc(parent, draw, x1: int, y1: int, x2: int, y2: int, r: int, ccw: bool, steps: int=330) -> bool:
-
-    def _get_arc_angle(a1: float, a2: float, ccw: bool):
-        if ccw:
-            if a2 < a1:
-                a2 += 2 * math.pi
-            return a2 - a1
-        else:
-            if a2 > a1:
-                a2 -= 2 * math.pi
-            return a1 - a2
-
-    dx = x2 - x1
-    dy = y2 - y1
-    distance = math.hypot(dx, dy)
-
-    if distance == 0:
-        return True
-
-    R = abs(r)
-    if distance > 2 * R:
-        alert(parent, "Дуга невозможна: расстояние больше диаметра!")
-        return False
-
-    mx = (x1 + x2) / 2
-    my = (y1 + y2) / 2
-    h = math.sqrt(R * R - (distance / 2) ** 2)
-    nx = -dy / distance
-    ny = dx / distance
-    centers = [
-        (mx + nx * h, my + ny * h),
-        (mx - nx * h, my - ny * h),
-    ]
-
-    candidates = []
-    for cx, cy in centers:
-        a1 = math.atan2(y1 - cy, x1 - cx)
-        a2 = math.atan2(y2 - cy, x2 - cx)
-        sweep = _get_arc_angle(a1, a2, ccw)
-        candidates.append((sweep, cx, cy, a1, a2))
-
-    if r > 0:
-        sweep, cx, cy, a1, a2 = min(candidates, key=lambda c: c[0])
-    else:
-        sweep, cx, cy, a1, a2 = max(candidates, key=lambda c: c[0])
-
-    prev = (x1, y1)
-    for i in range(1, steps + 1):
-        t = i / steps
-        angle = a1 + (sweep * t if ccw else -sweep * t)
-        x = cx + R * math.cos(angle)
-        y = cy + R * math.sin(angle)
-        draw.line([prev, (x, y)], fill="black", width=3)
-        prev = (x, y)
-
-    return True
+from transport import FileCheckWorker, TransportWorker
+from response import ADDR, EventToJson
+from journal import JournalTarget
+from toolpath import FIELD_SIZE, AnchorIndex, ProgramPreview, RegionMaskCache, draw_command, get_gcode, get_gcodes_htc
 
 
 def confirm(parent=None, text="Точно?") -> bool:
@@ -230,6 +78,8 @@ class MainWindow(QMainWindow):
         self.btn_select_file.clicked.connect(self.clicked_btn_select_file)
         self.btn_send_file.clicked.connect(self.clicked_btn_send_file)
         self.btn_paint_add_anchor_point.clicked.connect(self.clicked_btn_paint_add_anchor_point)
+        self.btn_cancel_send.clicked.connect(self.clicked_btn_cancel_send)
+        self.btn_radio_preview_file.toggled.connect(self.load_file_preview)
 
         self.mode: str = 'hrz'  # hrz, vrt, slp, htc, arc
         self.drawing: bool = self.btn_radio_paint.isChecked()
@@ -238,50 +88,187 @@ class MainWindow(QMainWindow):
         self.goto_x: int = None
         self.goto_y: int = None
         self.draw_commands: list = []
+        self.canvas_generation: int = 0  # bumped whenever draw_commands is replaced, not appended
+        self.region_cache = RegionMaskCache()
+        self.committed_img: Image.Image = None
+        self.committed_count: int = 0
+        self.committed_generation: int = 0
+        self.canvas_item = None
         self.g_codes: list = []
-        self.anchors: set = {(0, 0),}
+        self.anchors = AnchorIndex({(0, 0),})
+        self.job_callbacks: dict = {}
+        self.paint_job: int = None
+        self.file_job: int = None
+        self.file_check: FileCheckWorker = None  # preflight of the file about to be sent
+        # preview of the selected file: a layer over the canvas at the view resolution, built block by block
+        self.file_preview: ProgramPreview = None
+        self.file_preview_steps = None
+        self.file_preview_mask: np.ndarray = None
+        self.file_preview_drawn: int = 0
+        self.file_preview_item = None
+        self.worker = TransportWorker(self)
+        self.worker.job_progress.connect(self.on_job_progress)
+        self.worker.job_finished.connect(self.on_job_finished)
+        self.worker.job_compacted.connect(self.on_job_compacted)
+        self.worker.packet_event.connect(self.on_packet_event)
+        self.worker.job_metrics.connect(self.on_job_metrics)
+        self.worker.start()
 
         self.draw_img()
 
+    def draw_command(self, draw, img, command, index: int, color: str) -> bool:
+        # one command on img; index - how many commands are already drawn on img (key of the hatch region cache)
+        mask = None
+        if command[0] == 'htc':
+            x2, y2 = command[3], command[4]
+            # the canvas under this hatch is the first `index` commands, the mask is computed once for it
+            mask = self.region_cache.get((self.canvas_generation, index, x2, y2), img, x2, y2)
+        try:
+            draw_command(draw, img, command, color, mask)
+        except ValueError as e:
+            alert(self, str(e))
+            return False
+        return True
+
+    def update_committed_img(self):
+        # committed layer: draw_commands in black, only commands added since the last redraw are drawn on it
+        if self.committed_img is None or self.committed_generation != self.canvas_generation or self.committed_count > len(self.draw_commands):
+            self.committed_img = Image.new("RGB", (330, 228), "white")
+            self.committed_count = 0
+            self.committed_generation = self.canvas_generation
+        draw = ImageDraw.Draw(self.committed_img)
+        while self.committed_count < len(self.draw_commands):
+            self.draw_command(draw, self.committed_img, self.draw_commands[self.committed_count], self.committed_count, 'black')
+            self.committed_count += 1
+
     def draw_img(self, pre=None) -> bool:
-        self.img = Image.new("RGB", (330, 228), "white")
+        self.update_committed_img()
+        # preview and current position go on a copy of the committed layer
+        self.img = self.committed_img.copy()
         draw = ImageDraw.Draw(self.img)
-        local_commands = copy.deepcopy(self.draw_commands)
         if pre is not None:
-            local_commands.append(pre)
-        # all commands
-        while len(local_commands) > 0:
-            command = local_commands.pop(0)
-            if len(local_commands) != 0 or pre is None:
-                color = 'black'
-            else:
-                if self.btn_radio_paint.isChecked():
-                    color = 'green'
-                else:
-                    color = 'orange'
-            if command[0] in ('hrz', 'vrt', 'slp'):
-                x1, y1, x2, y2, r, ccw, angle, distance = command[1:]
-                draw.line((x1, y1, x2, y2), fill=color, width=3)
-            if command[0] == 'arc':
-                x1, y1, x2, y2, r, ccw, angle, distance = command[1:]
-                if not draw_gcode_arc(self, draw, x1, y1, x2, y2, r, ccw):
-                    return False
-            if command[0] == 'htc':
-                x1, y1, x2, y2, r, ccw, angle, distance = command[1:]
-                hatch_lines = get_hatch_lines(self.img, x2, y2, angle, distance)
-                for line in hatch_lines:
-                    xi1, yi1, xi2, yi2 = line
-                    draw.line((xi1, yi1, xi2, yi2), fill=color, width=3)
-            pass
+            color = 'green' if self.btn_radio_paint.isChecked() else 'orange'
+            if not self.draw_command(draw, self.img, pre, len(self.draw_commands), color):
+                return False
         # current position
         if self.current_x is not None and self.current_y is not None:
             r = 3
             draw.ellipse((self.current_x - r, self.current_y - r, self.current_x + r, self.current_y + r), fill="red")
-        self.img.save(f".field_img.png")
-        pixmap = QPixmap(".field_img.png")
-        self.scene.addPixmap(pixmap)
+        self.show_img()
         return True
 
+    def show_img(self):
+        # PIL -> QImage in memory, the scene keeps a single pixmap item
+        qimage = QImage(self.img.tobytes(), self.img.width, self.img.height, self.img.width * 3, QImage.Format_RGB888).copy()
+        pixmap = QPixmap.fromImage(qimage)
+        if self.canvas_item is None:
+            self.canvas_item = self.scene.addPixmap(pixmap)
+        else:
+            self.canvas_item.setPixmap(pixmap)
+
+    def load_file_preview(self):
+        # (re)starts the preview of the selected file; the old one, if still loading, is dropped
+        self.file_preview = None
+        self.file_preview_steps = None
+        if self.file_preview_item is not None:
+            self.file_preview_item.setVisible(False)
+        if not self.file_gcodes or not self.btn_radio_preview_file.isChecked():
+            return
+        try:
+            self.file_preview = ProgramPreview(self.file_gcodes, self.current_x, self.current_y)
+        except OSError as e:
+            alert(self, f"Не удалось прочитать файл: {e}")
+            return
+        self.file_preview_steps = self.file_preview.steps()
+        self.file_preview_mask = np.zeros((FIELD_SIZE[1] * SCALE_FACTOR, FIELD_SIZE[0] * SCALE_FACTOR), dtype=bool)
+        self.file_preview_drawn = 0
+        steps = self.file_preview_steps
+        QTimer.singleShot(0, lambda: self.step_file_preview(steps))
+
+    def step_file_preview(self, steps):
+        # one block per timer tick, so the window stays responsive while a large program loads
+        if steps is not self.file_preview_steps:
+            return
+        preview = self.file_preview
+        try:
+            next(steps, None)
+        except (OSError, ValueError) as e:
+            self.file_preview_steps = None
+            alert(self, f"Не удалось построить превью файла: {e}")
+            return
+        self.file_preview_drawn = preview.lod.draw(self.file_preview_mask, SCALE_FACTOR, first=self.file_preview_drawn)
+        self.show_file_preview()
+        if not preview.done:
+            QTimer.singleShot(0, lambda: self.step_file_preview(steps))
+            return
+        self.file_preview_steps = None
+        level = preview.lod.level_for(SCALE_FACTOR)
+        self.Append(f"<<<< Превью файла: {preview.lines} строк, {preview.lod.segments} отрезков "
+            f"(на экране {preview.lod.count(level)}), {preview.seconds:.2f} с >>>>\n")
+
+    def show_file_preview(self):
+        rgba = np.zeros(self.file_preview_mask.shape + (4,), dtype=np.uint8)
+        rgba[self.file_preview_mask] = (0, 80, 255, 255)
+        h, w = self.file_preview_mask.shape
+        pixmap = QPixmap.fromImage(QImage(rgba.tobytes(), w, h, w * 4, QImage.Format_RGBA8888).copy())
+        if self.file_preview_item is None:
+            self.file_preview_item = self.scene.addPixmap(pixmap)
+            # drawn at the view resolution, over the canvas
+            self.file_preview_item.setScale(1 / SCALE_FACTOR)
+            self.file_preview_item.setZValue(1)
+        else:
+            self.file_preview_item.setPixmap(pixmap)
+        self.file_preview_item.setVisible(True)
+
+    def enqueue_gcode(self, g_codes: list[str], on_done) -> int:
+        job_id = self.worker.enqueue_gcode(self.portsComboBox.currentText(), int(self.baudRateLineEdit.text()), g_codes, self.btn_radio_compact.isChecked())
+        self.job_callbacks[job_id] = on_done
+        return job_id
+
+    def on_job_finished(self, job_id: int, ok: bool, cancelled: bool):
+        callback = self.job_callbacks.pop(job_id, None)
+        if cancelled and not ok:
+            if job_id == self.paint_job:
+                self.paint_job = None
+                self.draw_img()
+            if job_id == self.file_job:
+                self.file_job = None
+            return
+        if callback is not None:
+            callback(ok)
+
+    def on_job_progress(self, job_id: int, sent: int, total: int):
+        if job_id == self.file_job and total > 0:
+            self.progress_send_file.setValue(min(100, sent * 100 // total))
+
+    def on_job_compacted(self, job_id: int, raw_bytes: int, compact_bytes: int):
+        if raw_bytes > 0:
+            self.Append(f'<<<< Сжатие G-кода: {raw_bytes} -> {compact_bytes} байт ({compact_bytes * 100 // raw_bytes}%) >>>>\n')
+
+    def on_packet_event(self, job_id: int, event):
+        # the same JSON lines as response.JsonLinesWriter writes, so console output can be saved and parsed
+        if self.btn_radio_packet_log.isChecked():
+            self.Append(EventToJson(event) + '\n')
+
+    def on_job_metrics(self, job_id: int, summary: dict):
+        # summary for file jobs, and for any job that had to retransmit
+        if job_id != self.file_job and summary['retransmits'] == 0 and summary['errors'] == 0 and not self.btn_radio_packet_log.isChecked():
+            return
+        text = f"<<<< Пакетов: {summary['sent']}, повторов: {summary['retransmits']}, таймаутов: {summary['timeouts']}"
+        if summary['rttP50'] is not None:
+            text += f", RTT p50 {summary['rttP50'] * 1000:.1f} мс, p99 {summary['rttP99'] * 1000:.1f} мс"
+        self.Append(text + ' >>>>\n')
+
+    def clicked_btn_cancel_send(self):
+        self.worker.cancel()
+        self.Append('<<<< Отправка отменена >>>>\n')
+
+    def closeEvent(self, event):
+        if self.file_check is not None:
+            self.file_check.wait()
+        self.worker.stop()
+        super().closeEvent(event)
+
     def GetCOMPorts(self):
         self.getPorts = QSerialPortInfo()
         ports = list(self.getPorts.availablePorts())
@@ -309,15 +296,13 @@ class MainWindow(QMainWindow):
         if self.mode == 'hrz':
             goto_y = self.current_y
             if self.btn_radio_snapping.isChecked():
-                nearest_x, nearest_y = nearest_anchor(x, y, self.anchors)
-                goto_x = nearest_x
+                goto_x = self.anchors.nearest_x(x)
         if self.mode == 'vrt':
             goto_x = self.current_x
             if self.btn_radio_snapping.isChecked():
-                nearest_x, nearest_y = nearest_anchor(x, y, self.anchors)
-                goto_y = nearest_y
+                goto_y = self.anchors.nearest_y(y)
         if self.mode in ('slp', 'arc') and self.btn_radio_snapping.isChecked():
-            goto_x, goto_y = nearest_anchor(goto_x, goto_y, self.anchors)
+            goto_x, goto_y = self.anchors.nearest(goto_x, goto_y)
         if self.mode == 'htc' and not self.btn_radio_paint.isChecked():
             alert(self, "Штриховка без режима рисования не имеет смысла!")
             return
@@ -329,39 +314,40 @@ class MainWindow(QMainWindow):
             self.draw_img()
             return
         # sending
+        if self.paint_job is not None:
+            alert(self, "Дождитесь завершения отправки предыдущей команды!")
+            self.draw_img()
+            return
+        paint = self.btn_radio_paint.isChecked()
+        command = (self.mode, self.current_x, self.current_y, goto_x, goto_y, int(self.spinbox_paint_radius.text()), self.btn_radio_paint_ccw.isChecked(), int(self.spinbox_paint_hatch_angle.text()), int(self.spinbox_paint_hatch_distance.text()))
         if self.mode == 'htc':
             self.draw_img()
-            g_codes, goto_htc_x, goto_htc_y = get_gcodes_htc(self.img, self.mode, self.btn_radio_paint.isChecked(), goto_x, goto_y, int(self.spinbox_paint_hatch_angle.text()), int(self.spinbox_paint_hatch_distance.text()), self.current_x, self.current_y)
-            if not SendGcode(self.portsComboBox.currentText(), g_codes, int(self.baudRateLineEdit.text())):
-                alert(self, "Ошибка отправки! Проверьте подключение!")
-                self.draw_img()
-                return
+            travel = {}
+            g_codes, goto_x, goto_y = get_gcodes_htc(self.img, self.mode, paint, goto_x, goto_y, int(self.spinbox_paint_hatch_angle.text()), int(self.spinbox_paint_hatch_distance.text()), self.current_x, self.current_y, stats=travel)
+            if travel:
+                self.Append(f"<<<< Холостой ход штриховки: {travel['travel_before']:.0f} -> {travel['travel_after']:.0f} мм >>>>\n")
         else:
-            if not SendGcode(self.portsComboBox.currentText(), [get_gcode(self.mode, self.btn_radio_paint.isChecked(), goto_x, goto_y, self.btn_radio_paint_ccw.isChecked(), int(self.spinbox_paint_radius.text())),], int(self.baudRateLineEdit.text())):
+            g_codes = [get_gcode(self.mode, paint, goto_x, goto_y, self.btn_radio_paint_ccw.isChecked(), int(self.spinbox_paint_radius.text())),]
+
+        # draw if sent succesfully
+        def on_sent(ok: bool):
+            self.paint_job = None
+            if not ok:
                 alert(self, "Ошибка отправки! Проверьте подключение!")
                 self.draw_img()
                 return
-        # draw if sent succesfully
-        if self.mode == 'htc':
             self.g_codes.extend(g_codes)
-        else:
-            self.g_codes.append(get_gcode(self.mode, self.btn_radio_paint.isChecked(), goto_x, goto_y, self.btn_radio_paint_ccw.isChecked(), int(self.spinbox_paint_radius.text())))
-        if self.btn_radio_paint.isChecked():
-            self.draw_commands.append((self.mode, self.current_x, self.current_y, goto_x, goto_y, int(self.spinbox_paint_radius.text()), self.btn_radio_paint_ccw.isChecked(), int(self.spinbox_paint_hatch_angle.text()), int(self.spinbox_paint_hatch_distance.text())))
-            # add anchor
-            self.anchors.add((self.current_x, self.current_y))
-            if self.mode != 'htc':
-                self.anchors.add((goto_x, goto_y))
-        if self.mode == 'htc':
-            if self.btn_radio_paint.isChecked():
-                goto_x = goto_htc_x
-                goto_y = goto_htc_y
-            else:
-                goto_x = self.current_x
-                goto_y = self.current_y
-        self.current_x = goto_x
-        self.current_y = goto_y
-        self.draw_img()
+            if paint:
+                self.draw_commands.append(command)
+                # add anchor
+                self.anchors.add((command[1], command[2]))
+                if command[0] != 'htc':
+                    self.anchors.add((command[3], command[4]))
+            self.current_x = goto_x
+            self.current_y = goto_y
+            self.draw_img()
+
+        self.paint_job = self.enqueue_gcode(g_codes, on_sent)
 
     def clicked_btn_dump_codes(self):
         if os.path.exists('g_codes_dump.cnc'):
@@ -377,17 +363,23 @@ class MainWindow(QMainWindow):
             return
         self.current_x: int = 0
         self.current_y: int = 0
-        if not SendGcode(self.portsComboBox.currentText(), ["G00 X0 Y0",], int(self.baudRateLineEdit.text())):
-            alert(self, "Ошибка отправки! Проверьте подключение!")
-            return
-        self.Append("<<<< ЧПУ отклабирован >>>>\n")
-        self.g_codes.append('G00 X0 Y0')
-        self.draw_img()
+
+        def on_sent(ok: bool):
+            if not ok:
+                alert(self, "Ошибка отправки! Проверьте подключение!")
+                return
+            self.Append("<<<< ЧПУ отклабирован >>>>\n")
+            self.g_codes.append('G00 X0 Y0')
+            self.draw_img()
+
+        self.enqueue_gcode(["G00 X0 Y0",], on_sent)
 
     def clicked_btn_clear_img(self):
         if not confirm(self, "Вы уверены, что хотите очистить картинку?"):
             return
         self.draw_commands = []
+        self.canvas_generation += 1
+        self.region_cache.clear()
         self.g_codes = []
         print("Image cleared")
         self.Append("<<<< Изображение очищено >>>>\n")
@@ -432,41 +424,92 @@ class MainWindow(QMainWindow):
     def clicked_btn_select_file(self):
         self.file_gcodes, _ = QFileDialog.getOpenFileName(self, "Выберите файл", "", "Все файлы (*.*)")
         self.label_filename.setText(f"Выбранный файл: {self.file_gcodes}")
+        self.load_file_preview()
 
     def clicked_btn_send_file(self):
+        if self.file_check is not None:
+            alert(self, "Файл еще проверяется перед отправкой!")
+            return
         if not confirm(self, f"Вы уверены, что хотите отправить файл {self.file_gcodes}?"):
             return
-        self.file_gcodes_content = []
-        with open(self.file_gcodes, 'r') as file:
-            file_gcodes_content = file.readlines()
-            for line in file_gcodes_content:
-                line: str = line.replace('\n', '')
-                if line != '':
-                    self.file_gcodes_content.append(line)
-        if not SendGcode(self.portsComboBox.currentText(), self.file_gcodes_content, int(self.baudRateLineEdit.text())):
-            alert(self, "Ошибка отправки! Проверьте подключение!")
+        # preflight: everything the firmware would answer with ACK_BAD_PARAM, before the first packet goes out.
+        # It reads the whole file (and so does the sha256 lookup of an interrupted send), so both run in FileCheckWorker
+        # and the send continues in on_file_checked
+        self.file_check = FileCheckWorker(self.file_gcodes, self.current_x, self.current_y, self.btn_radio_compact.isChecked(),
+            self.worker.journal, JournalTarget(self.portsComboBox.currentText(), ADDR), self)
+        self.file_check.checked.connect(self.on_file_checked)
+        self.file_check.failed.connect(self.on_file_check_failed)
+        self.file_check.finished.connect(self.file_check.deleteLater)
+        self.Append(f"<<<< Проверка файла {self.file_gcodes}... >>>>\n")
+        self.file_check.start()
+
+    def on_file_check_failed(self, error: str):
+        self.file_check = None
+        alert(self, f"Не удалось прочитать файл: {error}")
+
+    def on_file_checked(self, check, state):
+        file_gcodes = self.file_check.path
+        compact = self.file_check.compact
+        self.file_check = None
+        # warnings do not block the send, they are only listed in the console
+        for issue in check.issues:
+            warning = 'предупреждение: ' if issue.warning else ''
+            self.Append(f"{file_gcodes}:{issue.line}: {warning}{issue.message}: {issue.text}\n")
+        self.Append(f"<<<< Проверка файла: {check.Summary()} >>>>\n")
+        if not check.Ok():
+            first = next((issue.line for issue in check.issues if not issue.warning), None)
+            where = f", первая в строке {first}" if first is not None else ""
+            alert(self, f"Файл не прошел проверку: ошибок {check.errors}{where}. Подробности в консоли.")
             return
-        self.Append(f'<<<< Успешно отправлен файл с G-кодами: {self.file_gcodes} >>>>\n')
-        alert(self, "Отправлено успешно!")
+        # an interrupted send of this very file (same sha256) continues from the last acked packet
+        resume = False
+        if state is not None:
+            resume = confirm(self, f"Отправка этого файла была прервана: доставлено {state['offset']} из {state['size']} байт "
+                f"({state['offset'] * 100 // state['size']}%). Продолжить с места остановки? Нет - отправить файл заново.")
+
+        def on_sent(ok: bool):
+            self.file_job = None
+            if not ok:
+                alert(self, "Ошибка отправки! Проверьте подключение! Отправку файла можно будет продолжить с места остановки.")
+                return
+            self.progress_send_file.setValue(100)
+            self.Append(f'<<<< Успешно отправлен файл с G-кодами: {file_gcodes} >>>>\n')
+            alert(self, "Отправлено успешно!")
+
+        self.progress_send_file.setValue(0)
+        if resume:
+            self.Append(f"<<<< Продолжение отправки с байта {state['offset']} >>>>\n")
+        self.file_job = self.worker.enqueue_file(self.portsComboBox.currentText(), int(self.baudRateLineEdit.text()), file_gcodes, compact, resume)
+        self.job_callbacks[self.file_job] = on_sent
 
     def clicked_btn_send_gcode(self):
         if not confirm(self, "Вы уверены, что хотите отправить этот G-код?"):
             return
-        if not SendGcode(self.portsComboBox.currentText(), [self.lineEdit_pro_gcode.text(),], int(self.baudRateLineEdit.text())):
-            alert(self, "Ошибка отправки! Проверьте подключение!")
-            return
-        self.Append(f'<<<< Успешно отправлен G-код: {self.lineEdit_pro_gcode.text()} >>>>\n')
-        alert(self, "Отправлено успешно!")
+        g_code = self.lineEdit_pro_gcode.text()
+
+        def on_sent(ok: bool):
+            if not ok:
+                alert(self, "Ошибка отправки! Проверьте подключение!")
+                return
+            self.Append(f'<<<< Успешно отправлен G-код: {g_code} >>>>\n')
+            alert(self, "Отправлено успешно!")
+
+        self.enqueue_gcode([g_code,], on_sent)
 
     def clicked_btn_send_hex(self):
         if not confirm(self, "Вы уверены, что хотите отправить этот HEX пакет?"):
             return
-        if not SendHex(self.portsComboBox.currentText(), self.lineEdit_pro_hex.text(), int(self.baudRateLineEdit.text())):
-            alert(self, "Ошибка отправки! Проверьте подключение!")
-            return
-        self.Append(f'<<<< Успешно отправлен пакет: {self.lineEdit_pro_hex.text()} >>>>\n')
-        alert(self, "Отправлено успешно!")
+        hex_string = self.lineEdit_pro_hex.text()
+
+        def on_sent(ok: bool):
+            if not ok:
+                alert(self, "Ошибка отправки! Проверьте подключение!")
+                return
+            self.Append(f'<<<< Успешно отправлен пакет: {hex_string} >>>>\n')
+            alert(self, "Отправлено успешно!")
 
+        job_id = self.worker.enqueue_hex(self.portsComboBox.currentText(), int(self.baudRateLineEdit.text()), hex_string)
+        self.job_callbacks[job_id] = on_sent
 
 if __name__ == "__main__":
     if sys.platform.startswith('win'):
@@ -1,7 +1,17 @@
 # Формат протокола
 import serial
 import time
-from typing import Generator, Optional
+from collections import deque
+import os
+import json
+import struct
+import threading
+from typing import Callable, Generator, Iterable, NamedTuple, Optional, TextIO, Union
+from crc8 import Crc8, POLY # Табличный CRC8, общий с тестером CaTE
+from framing import FrameDecoder
+from rtt import RttEstimator
+from gcode_compact import CompactGcode, CompactStats
+from journal import FileSha256, JournalTarget, SendJournal
 
 # Протокол
 
@@ -11,7 +21,6 @@ ADDR возможно также как и SQN, по идее передаетс
 Нужна какая то логика обработки ACK_BAD_PARAM и может быть ACK_BAD_ADDR
 '''
 
-POLY = 0x31 # x^8 + x^5 + x^4 + 1
 SYNC_1 = 0xAC # Синхрослово
 SYNC_2 = 0x53 # Синхрослово
 ADDR = 0x01 # В документе такой, мб другой будет на практике
@@ -19,6 +28,17 @@ ACK_OK = 0x01 # Команда принята и декодирована
 ACK_BAD_ADDR = 0x02 # Неверный адрес
 ACK_BAD_CRC = 0x03 # Ошибка в crc
 ACK_BAD_PARAM = 0x04 # Ошибка в параметрах
+UART_RING_SIZE = 512 # Кольцевой буфер UART на стороне прошивки
+PACKET_OVERHEAD = 7 # SYNC_1, SYNC_2, LEN, SQN, ADDR, ACK, CRC
+PARSER_TIMEOUT = 0.025 # Через столько секунд тишины парсер прошивки сбрасывает недопринятый кадр
+CMD_GCODE = 0x01 # Флаг пакета с G-code: в кадре хоста он стоит на месте ACK (docs/uart_packet_parser.adoc)
+CMD_TELEMETRY = 0x02 # Флаг запроса телеметрии
+# DATA запроса телеметрии: нода по docs/worker_node_prd3.adoc отбрасывает кадры с LEN < 4, пустой запрос до нее не дойдет.
+# Прошивка без телеметрии, принявшая запрос за пакет G-code, получит пустую строку
+TELEMETRY_REQUEST = b'\n'
+TELEMETRY_SIZE = 6 # USED, SIZE, AFTER - uint16 little-endian
+TELEMETRY_POLL = 0.01 # Пауза между запросами телеметрии, пока ноде некуда принимать
+OCCUPANCY_SAMPLES = 4096 # Сколько последних отсчетов заполнения буфера ноды хранит сессия
 
 # Разбиение на куски по 250 байт, ибо данных может быть больше, чем 250 байт, они же тогда будут отправляться не в одном пакете, а в нескольких
 def ChunkBytes(data: bytes, chunkSize: int=250):
@@ -26,17 +46,94 @@ def ChunkBytes(data: bytes, chunkSize: int=250):
 		yield data[i:i + chunkSize]
 
 
-# Вычисление crc
-def Crc8(data: bytes) -> int:
-	crc = 0
-	for b in data:
-		crc ^= b
-		for _ in range(8):
-			if crc & 0x80:
-				crc = ((crc << 1) ^ POLY) & 0xFF
-			else:
-				crc = (crc << 1) & 0xFF
-	return crc
+# Потоковая версия ChunkBytes: склеивает куски байтов в пакеты по chunkSize, не собирая весь поток в памяти
+def ChunkStream(pieces: Iterable[bytes], chunkSize: int=250) -> Generator[bytes, None, None]:
+	buf = bytearray()
+	for piece in pieces:
+		buf += piece
+		if len(buf) >= chunkSize:
+			view = memoryview(buf)
+			full = len(buf) - len(buf) % chunkSize
+			for i in range(0, full, chunkSize):
+				yield bytes(view[i:i + chunkSize])
+			view.release()
+			del buf[:full]
+	if buf:
+		yield bytes(buf)
+
+
+# Статистика упаковки строк в пакеты
+class PackStats:
+	def __init__(self, chunkSize: int=250):
+		self.chunkSize = chunkSize
+		self.packets = 0
+		self.lines = 0
+		self.payloadBytes = 0
+		self.splitLines = 0 # Строки длиннее chunkSize, разрезанные на несколько пакетов
+
+	# Средняя заполненность пакета: 1.0 - все пакеты по chunkSize байт
+	def Utilisation(self) -> float:
+		return self.payloadBytes / (self.packets * self.chunkSize) if self.packets else 0.0
+
+
+# Упаковка целых строк в пакеты до chunkSize байт: строка не разрывается между двумя SQN.
+# Строки идут по порядку, пакет закрывается, когда следующая строка в него не помещается.
+# Строка длиннее chunkSize: overlong='split' - отдельными пакетами по chunkSize байт,
+# overlong='error' - ValueError до отправки этой строки
+def PackLines(lines: Iterable[bytes], chunkSize: int=250, overlong: str='split',
+		stats: Optional[PackStats]=None) -> Generator[bytes, None, None]:
+	if overlong not in ('split', 'error'):
+		raise ValueError(f"overlong: {overlong}")
+	if stats is None:
+		stats = PackStats(chunkSize)
+	buf = bytearray()
+	for line in lines:
+		stats.lines += 1
+		if len(buf) + len(line) > chunkSize and buf:
+			stats.packets += 1
+			stats.payloadBytes += len(buf)
+			yield bytes(buf)
+			buf.clear()
+		if len(line) <= chunkSize:
+			buf += line
+			continue
+
+		if overlong == 'error':
+			raise ValueError(f"Строка G-code длиннее пакета ({len(line)} > {chunkSize} байт)")
+		stats.splitLines += 1
+		full = len(line) - len(line) % chunkSize
+		for i in range(0, full, chunkSize):
+			stats.packets += 1
+			stats.payloadBytes += chunkSize
+			yield bytes(line[i:i + chunkSize])
+		buf += line[full:]
+	if buf:
+		stats.packets += 1
+		stats.payloadBytes += len(buf)
+		yield bytes(buf)
+
+
+# Ленивое чтение G-code из файла: по одной строке, без '\r\n' и без пустых строк
+def ReadGcodeFile(path: str) -> Generator[str, None, None]:
+	for line, end in ReadGcodeFileFrom(path):
+		yield line
+
+
+# То же с произвольного смещения: (строка, смещение в файле сразу после нее)
+def ReadGcodeFileFrom(path: str, offset: int=0) -> Generator[tuple[str, int], None, None]:
+	with open(path, 'rb') as file:
+		file.seek(offset)
+		for data in file:
+			offset += len(data)
+			line = data.rstrip(b"\r\n").decode('ascii')
+			if line != '':
+				yield line, offset
+
+
+# Потоковая версия GcodeListToStr: каждая строка отдельно, с '\n' в конце
+def GcodeLinesToBytes(gcodeLines: Iterable[str]) -> Generator[bytes, None, None]:
+	for line in gcodeLines:
+		yield (line.rstrip("\r\n") + "\n").encode("ascii")
 
 
 # Преобразует список строк G-code в байтовый поток. Каждая строка заканчивается '\n'
@@ -71,123 +168,882 @@ def MakeResponse(sqn: int, data: bytes, addr: int=ADDR, ack: int=ACK_OK) -> byte
 	return packet
 
 
-# Чтение ответного пакета и определение поля ACK
-def ReadAckPacket(ser: serial.Serial, timeout: float = 0.05) -> Optional[int]:
-	start = time.time()
+# Телеметрия в DATA ответа ноды - на запрос CMD_TELEMETRY или довеском к ACK пакета с G-code:
+# used - занято байт в кольцевом буфере UART, size - его размер,
+# after - сколько из занятых байт пришло после подтверждаемого кадра (их хост уже считает отправленными)
+class Telemetry(NamedTuple):
+	used: int
+	size: int
+	after: int
 
-	# Пока за 50мс не вышел, читаем первые 2 байта, если они равны нашим синхрословам, то выходим из while
-	while time.time() - start < timeout:
-		b = ser.read(1)
-		if not b:
-			continue
-		if b[0] == SYNC_1 and ser.read(1) == bytes([SYNC_2]):
-			break
-	else: 
-		return None
 
-	# Получили поле LEN
-	lenByte = ser.read(1)
-	if not lenByte:
+def MakeTelemetry(used: int, size: int, after: int) -> bytes:
+	return struct.pack('<HHH', used, size, after)
+
+
+# None - в ответе нет телеметрии (прошивка без нее)
+def ParseTelemetry(data: bytes) -> Optional[Telemetry]:
+	if len(data) < TELEMETRY_SIZE:
 		return None
+	return Telemetry(*struct.unpack_from('<HHH', data))
+
 
-	#Читаем тело(SQN, ADDR, ACK, DATA) и crc
-	length = lenByte[0]
-	body = ser.read(length)
-	crcRx = ser.read(1)
+# Чтение ответного пакета: возвращает (SQN, ACK) или None при таймауте.
+# decoder хранит байты между вызовами: хвост после ACK не теряется, если передавать один и тот же декодер
+def ReadAckFrame(ser: serial.Serial, timeout: float = 0.05, decoder: Optional[FrameDecoder] = None) -> Optional[tuple[int, int]]:
+	if decoder is None:
+		decoder = FrameDecoder()
 
-	if len(body) != length or not crcRx:
+	frame = decoder.ReadFrame(ser, timeout)
+	if frame is None:
 		return None
 
 	# Если ошибка в CRC, возвращаем ACK_BAD_CRC
-	if Crc8(lenByte + body) != crcRx[0]:
-		return ACK_BAD_CRC
+	if not frame.crcOk:
+		return (frame.sqn, ACK_BAD_CRC)
 
-	# Возвращается поле ACK
-	return body[2]
+	# Возвращаются поля SQN и ACK
+	return (frame.sqn, frame.ack)
 
 
-# Отправка уже готовой из ГУИ hex строки с G-code и со всеми заполненными полями
-def SendHex(port: str, hexString: str, baudrate: int) -> bool:
-	try:
-		# Не знаю в каком конкретно будет формате hex строка(с пробелами или без), 
-		# поэтому для корректности убираем лишние пробелы и переводы строк
-		hexString = hexString.strip()
-
-		# Если количество hex символов нечетное, то потенциально может быть ошибка
-		# Ну и ошибка может быть, если в строке есть не hex символ, что вряд ли
-		data = bytes.fromhex(hexString)
-
-		# Открываем UART
-		ser = serial.Serial(
-			port=port,
-			baudrate=baudrate,
-			bytesize=8,
-			parity='N',
-			stopbits=1,
-			timeout=0.01
-		)
-
-		# Отправляем как есть
-		ser.write(data)
-		ser.flush()
-		time.sleep(0.01)
-
-		ser.close()
-		return True
+# Чтение ответного пакета и определение поля ACK
+def ReadAckPacket(ser: serial.Serial, timeout: float = 0.05, decoder: Optional[FrameDecoder] = None) -> Optional[int]:
+	frame = ReadAckFrame(ser, timeout, decoder)
+	if frame is None:
+		return None
+	return frame[1]
+
+
+# Событие отправителя G-code. kind: 'send' - пакет записан в порт, 'ack' - пришел ответ,
+# 'timeout' - ответа не дождались, 'error' - ошибка порта (сессия переподключается)
+class PacketEvent(NamedTuple):
+	time: float # time.time() в момент события
+	kind: str
+	sqn: int
+	attempt: int # 0 - первая отправка пакета
+	size: int # Байт G-code в пакете (ACK в режиме окна - во всех подтвержденных им пакетах)
+	ack: Optional[int] = None
+	rtt: Optional[float] = None # От последней записи пакета до ответа, секунды
+	write: Optional[float] = None # Длительность записи в порт, секунды
+
+
+# Отсчет заполнения буфера ноды при кредитной отправке (по ответу с SQN sqn). used=None - нода без телеметрии,
+# занятость выведена из ACK. credit - сколько байт можно отправить, inFlight - байты после подтвержденного кадра
+class OccupancySample(NamedTuple):
+	time: float
+	sqn: int
+	used: Optional[int]
+	size: int
+	credit: int
+	inFlight: int
+
+
+RTT_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000)
+
+
+# Счетчики и гистограмма RTT по потоку PacketEvent, подключается через Prd3Session.AddListener.
+# Гистограмма копится с Reset, перцентили - по последним window ответам.
+# Summary можно вызывать из другого потока (ГУИ), пока идет отправка
+class PacketMetrics:
+	def __init__(self, window: int=256, buckets: tuple=RTT_BUCKETS_MS):
+		self.window = window
+		self.buckets = buckets # Верхние границы корзин, мс. Последняя корзина - все, что больше
+		self.lock = threading.Lock()
+		self.Reset()
+
+	def Reset(self) -> None:
+		self.sent = 0
+		self.retransmits = 0
+		self.acks = {} # Код ACK -> количество
+		self.timeouts = 0
+		self.errors = 0
+		self.bytes = 0 # Подтвержденные байты G-code
+		self.writeSeconds = 0.0 # Суммарное время записи в порт
+		self.maxWrite = 0.0
+		self.histogram = [0] * (len(self.buckets) + 1)
+		self.recent = deque(maxlen=self.window)
+
+	def __call__(self, event: PacketEvent) -> None:
+		with self.lock:
+			if event.kind == 'send':
+				self.sent += 1
+				if event.attempt > 0:
+					self.retransmits += 1
+				if event.write is not None:
+					self.writeSeconds += event.write
+					self.maxWrite = max(self.maxWrite, event.write)
+			elif event.kind == 'ack':
+				self.acks[event.ack] = self.acks.get(event.ack, 0) + 1
+				if event.ack == ACK_OK:
+					self.bytes += event.size
+				if event.rtt is not None:
+					ms = event.rtt * 1000
+					i = 0
+					while i < len(self.buckets) and ms > self.buckets[i]:
+						i += 1
+					self.histogram[i] += 1
+					self.recent.append(event.rtt)
+			elif event.kind == 'timeout':
+				self.timeouts += 1
+			elif event.kind == 'error':
+				self.errors += 1
+
+	# Перцентиль RTT по последним ответам, секунды
+	def Percentile(self, p: float) -> Optional[float]:
+		with self.lock:
+			values = sorted(self.recent)
+		if not values:
+			return None
+		return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+	def Summary(self) -> dict:
+		p50 = self.Percentile(50)
+		p99 = self.Percentile(99)
+		with self.lock:
+			return {
+				'sent': self.sent,
+				'retransmits': self.retransmits,
+				'timeouts': self.timeouts,
+				'errors': self.errors,
+				'acks': dict(self.acks),
+				'bytes': self.bytes,
+				'writeSeconds': self.writeSeconds,
+				'maxWrite': self.maxWrite,
+				'rttP50': p50,
+				'rttP99': p99,
+				'histogram': dict(zip([f"<={b}ms" for b in self.buckets] + [f">{self.buckets[-1]}ms"], self.histogram)),
+				}
+
+
+# Событие одной строкой JSON Lines: так его пишет JsonLinesWriter и выводит консоль ГУИ
+def EventToJson(event: PacketEvent) -> str:
+	return json.dumps(event._asdict(), separators=(',', ':'))
+
+
+def EventFromJson(line: str) -> PacketEvent:
+	return PacketEvent(**json.loads(line))
+
+
+# Экспорт событий в файл JSON Lines (listener для Prd3Session.AddListener)
+class JsonLinesWriter:
+	def __init__(self, target: Union[str, TextIO]):
+		self.own = isinstance(target, str)
+		self.file = open(target, 'a', encoding='utf-8') if self.own else target
+
+	def __call__(self, event: PacketEvent) -> None:
+		self.file.write(EventToJson(event) + '\n')
+
+	def Close(self) -> None:
+		if self.own:
+			self.file.close()
+		else:
+			self.file.flush()
+
+
+# Чтение журнала JSON Lines для офлайн-разбора
+def ReadJsonLines(path: str) -> Generator[PacketEvent, None, None]:
+	with open(path, 'r', encoding='utf-8') as file:
+		for line in file:
+			if line.strip():
+				yield EventFromJson(line)
+
+
+# Размер окна (пакетов в полете), при котором все неподтвержденные пакеты помещаются в кольцевой буфер прошивки
+def WindowForRing(chunkSize: int=250, ringSize: int=UART_RING_SIZE) -> int:
+	return max(1, ringSize // (chunkSize + PACKET_OVERHEAD))
+
+
+# Долгоживущая сессия PRD-3: порт держится открытым между вызовами, SQN продолжается от пакета к пакету,
+# при обрыве порта (например, пропал HC-06) сессия переоткрывает его и повторяет попытку.
+# ser - готовый объект порта вместо serial_for_url (например, simulator.SimSerial)
+class Prd3Session:
+	def __init__(self, port: str, baudrate: int, addr: int=ADDR, timeout: float=0.01, ser=None):
+		self.port = port # Имя порта или URL pyserial (например, loop://)
+		self.baudrate = baudrate
+		self.addr = addr
+		self.timeout = timeout
+		self.sqn = 0 # SQN следующего пакета
+		self.reconnects = 0 # Сколько раз порт переоткрывался
+		self.rtt = RttEstimator() # RTT/RTO, живет вместе с сессией
+		self.packets = 0 # Подтвержденные пакеты за время жизни сессии
+		self.retransmits = 0 # Повторные передачи
+		self.timeouts = 0 # Ожидания ACK, закончившиеся таймаутом
+		self.badCrc = 0 # Ответы ACK_BAD_CRC (включая битые ACK)
+		self.progress = None # Колбэк прогресса текущей отправки
+		self.cancel = None # Событие отмены текущей отправки
+		self.progressTotal = 0
+		self.onAck = None # Колбэк подтверждения пакета (SQN), для журнала отправки
+		self.lastBytes = 0 # Подтвержденные байты G-code последней отправки
+		self.lastSeconds = 0.0
+		self.lastBytesPerSec = 0.0
+		self.lastCompact = None # CompactStats последней отправки со сжатием
+		self.lastPack = None # PackStats последней отправки
+		self.decoder = FrameDecoder() # Принятые байты между чтениями ACK
+		self.listeners = [] # Подписчики на PacketEvent, вызываются в потоке отправки
+		self.ringSize = UART_RING_SIZE # Буфер ноды: из телеметрии, пока ее не было - по документации прошивки
+		self.telemetry = None # Отвечает ли нода на CMD_TELEMETRY, None - еще не проверяли
+		self.polls = 0 # Запросы телеметрии
+		self.occupancy = deque(maxlen=OCCUPANCY_SAMPLES) # OccupancySample кредитных отправок, для настройки
+		self.external = ser
+		self.ser = None
+
+	def __enter__(self):
+		self.Open()
+		return self
+
+	def __exit__(self, excType, excValue, traceback):
+		self.Close()
+
+	def IsOpen(self) -> bool:
+		return self.ser is not None and self.ser.is_open
+
+	# Открываем UART, если он еще не открыт
+	def Open(self) -> None:
+		if self.IsOpen():
+			return
+		if self.external is not None:
+			# Порт может быть общим у сессий разных адресов (dispatch.py)
+			if not self.external.is_open:
+				self.external.open()
+			self.ser = self.external
+			return
+		self.ser = serial.serial_for_url(
+			self.port,
+			baudrate = self.baudrate,
+			bytesize = 8,
+			parity = 'N',
+			stopbits = 1,
+			timeout = self.timeout
+			)
+
+	def Close(self) -> None:
+		self.decoder.Reset()
+		if self.ser is not None:
+			try:
+				self.ser.close()
+			except Exception:
+				pass
+		self.ser = None
+
+	# Закрываем и заново открываем порт после ошибки ввода-вывода
+	def Reconnect(self) -> None:
+		self.Close()
+		self.reconnects += 1
+		self.Open()
+
+	def AddListener(self, listener: Callable[[PacketEvent], None]) -> None:
+		self.listeners.append(listener)
+
+	def RemoveListener(self, listener: Callable[[PacketEvent], None]) -> None:
+		if listener in self.listeners:
+			self.listeners.remove(listener)
+
+	def _Emit(self, kind: str, sqn: int, attempt: int, size: int, ack: Optional[int]=None,
+			rtt: Optional[float]=None, write: Optional[float]=None) -> None:
+		if self.listeners:
+			event = PacketEvent(time.time(), kind, sqn, attempt, size, ack, rtt, write)
+			for listener in self.listeners:
+				listener(event)
+
+	# Отправка пакета и чтение ACK на него в пределах timeout. Запоздавшие ACK с чужим SQN пропускаются.
+	# Возвращает (ACK, RTT в секундах) или (None, None) при таймауте.
+	# При обрыве порта переподключаемся, попытка считается неудачной
+	def _Transact(self, packet: bytes, sqn: int, timeout: float, attempt: int=0,
+			size: int=0) -> tuple[Optional[int], Optional[float]]:
+		try:
+			self.Open()
+			start = time.monotonic()
+			self.ser.write(packet)
+			self.ser.flush()
+			sentAt = time.monotonic()
+			self._Emit('send', sqn, attempt, size, write=sentAt - start)
+			deadline = sentAt + timeout
+			while True:
+				frame = ReadAckFrame(self.ser, max(0.0, deadline - time.monotonic()), self.decoder)
+				if frame is None:
+					self._Emit('timeout', sqn, attempt, size)
+					return (None, None)
+				if frame[0] == sqn or frame[1] == ACK_BAD_CRC:
+					rtt = time.monotonic() - sentAt
+					self._Emit('ack', sqn, attempt, size, frame[1], rtt)
+					return (frame[1], rtt)
+		except serial.SerialException:
+			self._Emit('error', sqn, attempt, size)
+			try:
+				self.Reconnect()
+			except serial.SerialException:
+				pass
+			return (None, None)
+
+	# Текущий таймаут и счетчики повторов для вызывающего кода (ГУИ, бенчмарки)
+	def Stats(self) -> dict:
+		return {
+			'rto': self.rtt.rto,
+			'srtt': self.rtt.srtt,
+			'rttvar': self.rtt.rttvar,
+			'packets': self.packets,
+			'retransmits': self.retransmits,
+			'timeouts': self.timeouts,
+			'badCrc': self.badCrc,
+			'reconnects': self.reconnects,
+			'packUtilisation': self.lastPack.Utilisation() if self.lastPack is not None else None,
+			}
 
-	except Exception:
+	# Отправка уже готовой из ГУИ hex строки с G-code и со всеми заполненными полями
+	def SendHex(self, hexString: str) -> bool:
+		# Не знаю в каком конкретно будет формате hex строка(с пробелами или без),
+		# поэтому для корректности убираем лишние пробелы и переводы строк.
+		# Если количество hex символов нечетное или есть не hex символ, то будет ValueError
 		try:
-			ser.close()
-		except Exception:
-			pass
+			data = bytes.fromhex(hexString.strip())
+		except ValueError:
+			return False
+
+		for attempt in range(2):
+			try:
+				self.Open()
+				# Отправляем как есть
+				self.ser.write(data)
+				self.ser.flush()
+				return True
+			except serial.SerialException:
+				if attempt == 0:
+					try:
+						self.Reconnect()
+					except serial.SerialException:
+						return False
 		return False
 
+	# Отправка G-code пакетами по chunkSize байт. gcodeLines может быть любым итератором строк:
+	# строки кодируются и нарезаются на пакеты по мере отправки, весь поток в памяти не собирается.
+	# window=1 - stop-and-wait: ждем ACK на каждый пакет.
+	# window>1 - Go-Back-N: в полете до window пакетов, окно урезается до размера кольцевого буфера прошивки.
+	# window=0 - окно максимального размера, помещающегося в кольцевой буфер.
+	# progress(отправлено_байт, всего_байт) вызывается после каждого подтвержденного пакета, total=0 - объем неизвестен.
+	# cancel - событие отмены из другого потока: новые пакеты после него не отправляются, возвращается False.
+	# compact=True - строки проходят сжатие без потерь (gcode_compact), степень сжатия задания в lastCompact.
+	# Строки пакуются целиком (PackLines), overlong - что делать со строкой длиннее пакета, статистика в lastPack.
+	# credit=True - вместо окна кредиты по свободному месту в буфере ноды (_SendCredit)
+	def SendGcode(self, gcodeLines: Iterable[str], chunkSize: int=250, retries: int=3, window: int=1,
+			progress: Optional[Callable[[int, int], None]]=None, total: int=0,
+			cancel: Optional[threading.Event]=None, compact: bool=False, overlong: str='split', credit: bool=False) -> bool:
+		try:
+			self.Open()
+			# Порт живет между вызовами: выбрасываем хвосты от прошлых обменов (запоздавшие ACK и т.п.)
+			self.ser.reset_input_buffer()
+			self.decoder.Reset()
+		except serial.SerialException:
+			return False
+
+		self.lastCompact = None
+		if compact:
+			self.lastCompact = CompactStats()
+			gcodeLines = CompactGcode(gcodeLines, self.lastCompact)
+		self.lastPack = PackStats(chunkSize)
+		chunks = PackLines(GcodeLinesToBytes(gcodeLines), chunkSize, overlong, self.lastPack)
+
+		maxWindow = WindowForRing(chunkSize)
+		window = maxWindow if window <= 0 else min(window, maxWindow)
+
+		self.lastBytes = 0
+		self.progress = progress
+		self.progressTotal = total
+		self.cancel = cancel
+		start = time.perf_counter()
+		try:
+			if credit:
+				ok = self._SendCredit(chunks, retries)
+			elif window == 1:
+				ok = self._SendStopAndWait(chunks, retries)
+			else:
+				ok = self._SendWindowed(chunks, retries, window)
+		except ValueError:
+			# overlong='error': отправленное до длинной строки уже подтверждено, остальное не уходит
+			ok = False
+		finally:
+			self.progress = None
+			self.cancel = None
+		self.lastSeconds = time.perf_counter() - start
+		# Эффективная скорость по подтвержденным байтам G-code
+		self.lastBytesPerSec = self.lastBytes / self.lastSeconds if self.lastSeconds > 0 else 0.0
+		return ok
+
+	# Потоковая отправка файла: память не зависит от размера файла, первый пакет уходит сразу.
+	# В progress всего_байт - размер файла (оценка сверху: пустые строки и '\r' не отправляются).
+	# journal - журнал отправки (journal.SendJournal): каждый подтвержденный пакет записывается в него,
+	# resume=True - продолжить прерванную отправку этого же файла (по sha256) с последнего подтвержденного пакета
+	def SendGcodeFile(self, path: str, chunkSize: int=250, retries: int=3, window: int=1,
+			progress: Optional[Callable[[int, int], None]]=None, cancel: Optional[threading.Event]=None,
+			compact: bool=False, journal: Optional[SendJournal]=None, resume: bool=False, credit: bool=False) -> bool:
+		try:
+			total = os.path.getsize(path)
+			if journal is not None:
+				return self._SendJournaled(path, total, journal, resume, chunkSize, retries, window, progress, cancel, compact, credit)
+			return self.SendGcode(ReadGcodeFile(path), chunkSize, retries, window, progress, total, cancel, compact, credit=credit)
+		except (OSError, UnicodeDecodeError):
+			return False
+
+	def _SendJournaled(self, path: str, total: int, journal: SendJournal, resume: bool, chunkSize: int, retries: int,
+			window: int, progress: Optional[Callable[[int, int], None]], cancel: Optional[threading.Event], compact: bool,
+			credit: bool=False) -> bool:
+		fileHash = FileSha256(path)
+		target = JournalTarget(self.port, self.addr)
+		state = journal.Resumable(fileHash, target, compact, chunkSize) if resume else None
+		offset = 0
+		if state is not None:
+			offset = state['offset']
+			# После перезапуска GUI сессия новая: SQN, которого ждет прошивка, есть только в журнале.
+			# В живой сессии (обрыв связи) SQN уже продолжает подтвержденные пакеты, в том числе отправленные после задания
+			if self.packets == 0:
+				self.sqn = state['sqn']
+		job = journal.Start(path, fileHash, total, offset, self.sqn, compact, chunkSize, state['job'] if state else None, target)
+
+		# Пакеты собираются из целых строк, поэтому подтвержденные байты данных переводятся в смещение в файле:
+		# по строке (байт данных после нее, смещение в файле после нее). Очередь не длиннее окна
+		marks = deque()
+		delivered = offset
+		compactStats = CompactStats() if compact else None
 
-# Для инициализации отправки пакета можно вызывать эту функцию в ГУИ напрямую, передав параметры порта, пути до файла с g-code и baudrate
-def SendGcode(port: str, gcodeLines: list[str], baudrate: int, chunkSize: int=250, retries: int=3) -> bool:
-	# Инициализация UART
-	ser = serial.Serial(
-		port = port, # Получить из ГУИ
-		baudrate = baudrate, # Получить из ГУИ
-		bytesize = 8,
-		parity = 'N',
-		stopbits = 1,
-		timeout = 0.01
-		)
-
-	# Чтение файла с g-code
-	gcodeBytes = GcodeListToStr(gcodeLines)
-
-	# Отправляем пакеты и проверяем ответ, а именно, чему равно поле ACK
-	sqn = 0
-	for chunk in ChunkBytes(gcodeBytes, chunkSize):
-		success = False
-		for _ in range(retries):
-			packet = MakeResponse(sqn=sqn, data=chunk)
-			ser.write(packet)
-			ser.flush()
-
-			ack = ReadAckPacket(ser)
-
-			if ack == ACK_OK:
-				success = True
-				break
-
-			if ack == ACK_BAD_CRC or ack is None:
-				time.sleep(0.02)
-				continue
-
-			elif ack in (ACK_BAD_ADDR, ACK_BAD_PARAM):
-				ser.close()
+		def Lines():
+			sent = 0
+			for line, end in ReadGcodeFileFrom(path, offset):
+				if compact:
+					line = next(CompactGcode((line,), compactStats), '')
+				if line:
+					sent += len(line) + 1
+				marks.append((sent, end))
+				if line:
+					yield line
+
+		def OnAck(sqn: int) -> None:
+			nonlocal delivered
+			while marks and marks[0][0] <= self.lastBytes:
+				delivered = marks.popleft()[1]
+			journal.Ack(job, delivered, sqn)
+
+		def Progress(sent: int, total: int) -> None:
+			progress(offset + sent, total)
+
+		ok = False
+		self.onAck = OnAck
+		try:
+			ok = self.SendGcode(Lines(), chunkSize, retries, window, Progress if progress else None, total, cancel, credit=credit)
+		finally:
+			self.onAck = None
+			self.lastCompact = compactStats
+			status = 'done' if ok else 'cancelled' if cancel is not None and cancel.is_set() else 'failed'
+			journal.Finish(job, status)
+		return ok
+
+	# Учет подтвержденных байтов и уведомление о прогрессе
+	def _Acked(self, size: int, sqn: int) -> None:
+		self.lastBytes += size
+		if self.onAck is not None:
+			self.onAck(sqn)
+		if self.progress is not None:
+			self.progress(self.lastBytes, self.progressTotal)
+
+	# Таймаут ожидания ACK. Пока RTT не измерен, к RTO добавляем время передачи пакетов и ACK по линии:
+	# на 9600 бод пакет в 250 байт идет ~270 мс, и начальный RTO давал ложные повторы
+	def _AckTimeout(self, size: int) -> float:
+		if self.rtt.samples > 0:
+			return self.rtt.rto
+		return self.rtt.rto + (size + PACKET_OVERHEAD) * 10 / self.baudrate
+
+	def _Cancelled(self) -> bool:
+		return self.cancel is not None and self.cancel.is_set()
+
+	# Ожидание ACK - адаптивный RTO: после таймаута он удваивается, после чистого подтверждения пересчитывается по RTT
+	def _SendStopAndWait(self, chunks, retries: int) -> bool:
+		# Отправляем пакеты и проверяем ответ, а именно, чему равно поле ACK
+		for chunk in chunks:
+			if self._Cancelled():
 				return False
+			success = False
+			for attempt in range(retries):
+				if attempt > 0:
+					self.retransmits += 1
+				packet = MakeResponse(sqn=self.sqn, data=chunk, addr=self.addr)
+				ack, rtt = self._Transact(packet, self.sqn, self._AckTimeout(len(packet)), attempt, len(chunk))
+
+				if ack == ACK_OK:
+					# Правило Карна: RTT повторно переданного пакета неоднозначен и не учитывается
+					if attempt == 0:
+						self.rtt.Sample(rtt)
+					success = True
+					break
+
+				if ack is None:
+					# Пакет или ACK потерян: ждем дольше и даем парсеру прошивки сбросить недопринятый кадр
+					self.timeouts += 1
+					self.rtt.Backoff()
+					time.sleep(PARSER_TIMEOUT)
+					continue
+
+				if ack == ACK_BAD_CRC:
+					# Устройство ответило - канал жив, повторяем сразу
+					self.badCrc += 1
+					continue
+
+				elif ack in (ACK_BAD_ADDR, ACK_BAD_PARAM):
+					return False
+
+			if not success:
+				return False
+
+			# SQN растет только после принятого пакета и сохраняется между вызовами
+			self.sqn = (self.sqn + 1) & 0xFF
+			self.packets += 1
+			self._Acked(len(chunk), (self.sqn - 1) & 0xFF)
 
-		if not success:
-			ser.close()
+		return True
+
+	# Go-Back-N: ACK_OK на пакет с SQN подтверждает его и все более ранние пакеты окна.
+	# Таймаут (RTO от отправки самого старого пакета) или ACK_BAD_CRC - повторная отправка всех
+	# неподтвержденных пакетов начиная с самого старого
+	def _SendWindowed(self, chunks, retries: int, window: int) -> bool:
+		inFlight = deque() # [SQN, пакет, размер данных, время отправки, номер попытки]
+		nextSqn = self.sqn
+		exhausted = False
+		rejected = False # PackLines отказался паковать строку (overlong='error')
+		failures = 0
+
+		try:
+			while True:
+				# Дозаполняем окно новыми пакетами
+				fresh = []
+				while len(inFlight) < window and not exhausted:
+					if self._Cancelled():
+						return False
+					try:
+						chunk = next(chunks, None)
+					except ValueError:
+						# Уже отправленные пакеты окна доводим до подтверждения, дальше не идем
+						chunk = None
+						rejected = True
+					if chunk is None:
+						exhausted = True
+						break
+					packet = MakeResponse(sqn=nextSqn, data=chunk, addr=self.addr)
+					start = time.monotonic()
+					self.ser.write(packet)
+					self._Emit('send', nextSqn, 0, len(chunk), write=time.monotonic() - start)
+					entry = [nextSqn, packet, len(chunk), 0.0, 0]
+					inFlight.append(entry)
+					fresh.append(entry)
+					nextSqn = (nextSqn + 1) & 0xFF
+				self.ser.flush()
+				now = time.monotonic()
+				for entry in fresh:
+					entry[3] = now
+
+				if not inFlight:
+					return not rejected
+
+				timeout = max(0.0, inFlight[0][3] + self._AckTimeout(sum(len(entry[1]) for entry in inFlight)) - time.monotonic())
+				frame = ReadAckFrame(self.ser, timeout, self.decoder)
+				if frame is not None and frame[1] in (ACK_BAD_ADDR, ACK_BAD_PARAM):
+					return False
+
+				if frame is not None and frame[1] == ACK_OK:
+					# Сколько пакетов окна закрывает этот ACK. Запоздавшие ACK на уже подтвержденные пакеты игнорируем
+					acked = ((frame[0] - inFlight[0][0]) & 0xFF) + 1
+					if acked <= len(inFlight):
+						total = 0
+						for _ in range(acked):
+							sqn, packet, size, sentAt, attempt = inFlight.popleft()
+							self.packets += 1
+							total += size
+							self._Acked(size, sqn)
+						rtt = time.monotonic() - sentAt
+						self._Emit('ack', sqn, attempt, total, ACK_OK, rtt)
+						# Правило Карна: RTT берем только у пакета, который не передавался повторно
+						if attempt == 0:
+							self.rtt.Sample(rtt)
+						self.sqn = (sqn + 1) & 0xFF
+						failures = 0
+					continue
+
+				# Таймаут или ACK_BAD_CRC: возвращаемся к самому старому неподтвержденному пакету
+				failures += 1
+				oldest = inFlight[0]
+				if frame is None:
+					self.timeouts += 1
+					self.rtt.Backoff()
+					self._Emit('timeout', oldest[0], oldest[4], oldest[2])
+				else:
+					self.badCrc += 1
+					self._Emit('ack', frame[0], oldest[4], 0, frame[1], time.monotonic() - oldest[3])
+				if failures >= retries:
+					return False
+				if frame is None:
+					time.sleep(PARSER_TIMEOUT)
+				self.ser.reset_input_buffer()
+				self.decoder.Reset()
+				for entry in inFlight:
+					start = time.monotonic()
+					self.ser.write(entry[1])
+					entry[4] += 1
+					self.retransmits += 1
+					self._Emit('send', entry[0], entry[4], entry[2], write=time.monotonic() - start)
+				self.ser.flush()
+				now = time.monotonic()
+				for entry in inFlight:
+					entry[3] = now
+		except serial.SerialException:
+			self._Emit('error', inFlight[0][0] if inFlight else nextSqn, inFlight[0][4] if inFlight else 0, 0)
+			try:
+				self.Reconnect()
+			except serial.SerialException:
+				pass
+			return False
+
+	# Запрос телеметрии. SQN - последнего подтвержденного пакета: прошивка без телеметрии примет запрос за повтор.
+	# Возвращает (конец запроса в потоке written, время отправки, SQN запроса)
+	def _PollTelemetry(self, written: int) -> tuple[int, float, int]:
+		packet = MakeResponse(sqn=(self.sqn - 1) & 0xFF, data=TELEMETRY_REQUEST, addr=self.addr, ack=CMD_TELEMETRY)
+		self.ser.write(packet)
+		self.ser.flush()
+		self.polls += 1
+		return written + len(packet), time.monotonic(), (self.sqn - 1) & 0xFF
+
+	# Граница потока, до которой можно писать, по ответу на кадр, кончившийся в потоке на байте mark.
+	# С телеметрией: свободное место плюс уже пришедшие после кадра байты (они есть в written).
+	# Без нее: ответ уходит после разбора кадра, буфер FIFO - все до конца кадра из него вычитано.
+	# Граница тогда только растет (limit - прежняя), budget - сколько буфера занимать, не больше ringSize
+	def _CreditLimit(self, mark: int, written: int, sqn: int, report: Optional[Telemetry], limit: int, budget: int) -> int:
+		if report is not None:
+			self.ringSize = report.size
+			limit = mark + report.size - report.used + report.after
+		else:
+			limit = max(limit, mark + budget)
+		self.occupancy.append(OccupancySample(time.time(), sqn, report.used if report is not None else None,
+			self.ringSize, limit - written, written - mark))
+		return limit
+
+	# Кредитное управление потоком: кадр уходит, только если весь поместится в кольцевой буфер ноды.
+	# Кредиты обновляет каждый ACK (телеметрия довеском или вывод из самого ACK), пока кредитов нет и
+	# подтверждать нечего - запрос телеметрии раз в TELEMETRY_POLL. Фиксированных пауз между пакетами нет.
+	# Повторы - Go-Back-N, как в _SendWindowed, но тоже по кредитам: после ложного таймаута старые копии
+	# пакетов еще могут лежать в буфере. Их запоздавшие ACK засчитываются, а не выбрасываются, а кредиты
+	# по ним считаются от конца первой копии - неизвестно, какую из копий подтвердила нода.
+	# Без телеметрии кредиты дают только ответы ноды: каждый ответ (и повторный ACK на отброшенный кадр) - еще
+	# хотя бы один разобранный кадр. Тишина ничего не доказывает: медленная нода молчит и с полным буфером.
+	# Если кредитов нет и после RTO - один пакет уходит пробой сверх кредитов, и занимаемая часть буфера вдвое меньше
+	def _SendCredit(self, chunks, retries: int) -> bool:
+		inFlight = deque() # [SQN, пакет, размер данных, начало ожидания ACK, номер попытки, конец первой копии в потоке]
+		onWire = 0 # Пакеты inFlight[:onWire] переданы в текущем круге, остальные ждут повтора
+		nextSqn = self.sqn
+		written = 0 # Байты, записанные в порт этой отправкой, включая повторы и запросы телеметрии
+		lineFree = 0.0 # Когда линия хост -> нода освободится от записанных кадров (оценка по скорости порта).
+		# Время отправки кадра - начало его передачи: кадр за кадром в очереди линии не вызывает ложный таймаут
+		pending = None # (пакет, размер данных) нового пакета, которому не хватило кредитов
+		poll = None # (конец запроса в потоке, время отправки, SQN) запроса телеметрии без ответа
+		exhausted = False
+		rejected = False # PackLines отказался паковать строку (overlong='error')
+		failures = 0
+		ends = deque() # Концы кадров в потоке, на которые еще не было ответа (без телеметрии)
+		budget = self.ringSize # Сколько буфера ноды занимать без телеметрии, после пробы меньше
+		probe = False # Таймаут без телеметрии: один пакет можно отправить сверх кредитов
+
+		try:
+			# Первый запрос - проверка, есть ли у ноды телеметрия. Нода без нее больше не опрашивается
+			limit = self.ringSize
+			if self.telemetry is not False:
+				poll = self._PollTelemetry(written)
+				written = poll[0]
+				ends.append(written)
+			while True:
+				# Пока ждем ответ на запрос телеметрии, кредиты не тратим
+				while poll is None:
+					if onWire < len(inFlight):
+						entry = inFlight[onWire]
+						packet = entry[1]
+					else:
+						if exhausted:
+							break
+						if pending is None:
+							if self._Cancelled():
+								return False
+							try:
+								chunk = next(chunks, None)
+							except ValueError:
+								# Уже отправленные пакеты доводим до подтверждения, дальше не идем
+								chunk = None
+								rejected = True
+							if chunk is None:
+								exhausted = True
+								break
+							pending = (MakeResponse(sqn=nextSqn, data=chunk, addr=self.addr, ack=CMD_GCODE), len(chunk))
+						entry = None
+						packet = pending[0]
+					if written + len(packet) > limit:
+						if not probe:
+							break
+						budget = max(len(packet), budget // 2)
+					probe = False
+					start = time.monotonic()
+					self.ser.write(packet)
+					written += len(packet)
+					ends.append(written)
+					if entry is None:
+						entry = [nextSqn, packet, pending[1], 0.0, 0, 0]
+						inFlight.append(entry)
+						pending = None
+						nextSqn = (nextSqn + 1) & 0xFF
+					else:
+						entry[4] += 1
+						self.retransmits += 1
+					self._Emit('send', entry[0], entry[4], entry[2], write=time.monotonic() - start)
+					entry[3] = start = max(start, lineFree)
+					if entry[4] == 0:
+						entry[5] = written
+					lineFree = start + len(packet) * 10 / self.baudrate
+					onWire += 1
+				self.ser.flush()
+
+				if not inFlight and poll is None:
+					if exhausted:
+						return not rejected
+					if self.telemetry:
+						# Нода занята, а подтверждать нечего: спрашиваем, освободилось ли место
+						time.sleep(TELEMETRY_POLL)
+						poll = self._PollTelemetry(written)
+						written = poll[0]
+						ends.append(written)
+						continue
+					# Без телеметрии кредиты вернут ответы на старые копии, а если их нет - проба после RTO
+
+				if inFlight:
+					timeout = inFlight[0][3] + self._AckTimeout(sum(len(entry[1]) for entry in inFlight))
+				elif poll is not None:
+					timeout = poll[1] + self._AckTimeout(PACKET_OVERHEAD)
+				else:
+					timeout = time.monotonic() + self._AckTimeout(PACKET_OVERHEAD)
+				frame = self.decoder.ReadFrame(self.ser, max(0.0, timeout - time.monotonic()))
+				ack = None if frame is None else frame.ack if frame.crcOk else ACK_BAD_CRC
+
+				if frame is not None and not self.telemetry and ends:
+					# Ответ ноды: разобран еще хотя бы один кадр. Новый ACK сам сдвигает границу до конца подтвержденного кадра
+					acked = ((frame.sqn - inFlight[0][0]) & 0xFF) + 1 if ack == ACK_OK and inFlight else 0
+					if not 0 < acked <= len(inFlight):
+						limit = self._CreditLimit(ends.popleft(), written, frame.sqn, None, limit, budget)
+
+				if poll is not None and frame is not None and frame.crcOk and frame.sqn == poll[2]:
+					# Ответ на запрос телеметрии. На первый запрос ACK без данных или отказ - у ноды ее нет.
+					# Без данных с тем же SQN бывает и повторный ACK на отброшенный нодой пакет - его пропускаем
+					report = ParseTelemetry(frame.data) if ack == ACK_OK else None
+					if report is not None or self.telemetry is None:
+						self.telemetry = report is not None
+						limit = self._CreditLimit(poll[0], written, frame.sqn, report, limit, budget)
+						poll = None
+						if not inFlight:
+							failures = 0
+						continue
+
+				if ack in (ACK_BAD_ADDR, ACK_BAD_PARAM):
+					return False
+
+				if ack == ACK_OK:
+					# Сколько пакетов закрывает этот ACK. Запоздавшие ACK на уже подтвержденные пакеты игнорируем
+					acked = ((frame.sqn - inFlight[0][0]) & 0xFF) + 1 if inFlight else 0
+					if 0 < acked <= len(inFlight):
+						total = 0
+						for _ in range(acked):
+							sqn, packet, size, sentAt, attempt, mark = inFlight.popleft()
+							self.packets += 1
+							total += size
+							self._Acked(size, sqn)
+						onWire = max(0, onWire - acked)
+						now = time.monotonic()
+						rtt = now - sentAt
+						self._Emit('ack', sqn, attempt, total, ACK_OK, rtt)
+						if attempt == 0:
+							self.rtt.Sample(rtt)
+						self.sqn = (sqn + 1) & 0xFF
+						limit = self._CreditLimit(mark, written, sqn, ParseTelemetry(frame.data), limit, budget)
+						while ends and ends[0] <= mark:
+							ends.popleft()
+						budget = min(self.ringSize, budget + total)
+						failures = 0
+						# Следующий кадр нода начинает разбирать только теперь: его таймаут - от этого ACK,
+						# а не от передачи, иначе очередь в буфере медленной ноды дает ложные таймауты
+						if inFlight and onWire > 0:
+							inFlight[0][3] = max(inFlight[0][3], now)
+					continue
+
+				if frame is not None and not inFlight:
+					continue
+
+				if frame is None and not inFlight and poll is None:
+					# Без телеметрии все подтверждено, а кредитов нет и ответов больше не будет
+					probe = True
+					continue
+
+				if frame is None and not inFlight:
+					# Запрос телеметрии остался без ответа. На первый не отвечает прошивка, которая не знает CMD_TELEMETRY.
+					# Сам запрос может еще лежать в буфере: граница остается ringSize от начала отправки
+					if self.telemetry is None:
+						self.telemetry = False
+					else:
+						failures += 1
+						self.timeouts += 1
+						self.rtt.Backoff()
+						if failures >= retries:
+							return False
+					poll = None
+					continue
+
+				# Таймаут или ACK_BAD_CRC: возвращаемся к самому старому неподтвержденному пакету
+				failures += 1
+				oldest = inFlight[0]
+				if frame is None:
+					self.timeouts += 1
+					self.rtt.Backoff()
+					self._Emit('timeout', oldest[0], oldest[4], oldest[2])
+				else:
+					self.badCrc += 1
+					self._Emit('ack', frame.sqn, oldest[4], 0, ack, time.monotonic() - oldest[3])
+				if failures >= retries:
+					return False
+				if frame is None:
+					poll = None
+					if self.telemetry:
+						# Сколько места на самом деле: пакеты могли не потеряться, а ждать в буфере медленной ноды
+						poll = self._PollTelemetry(written)
+						written = poll[0]
+					else:
+						probe = True
+					time.sleep(PARSER_TIMEOUT)
+				onWire = 0
+				now = time.monotonic()
+				for entry in inFlight:
+					entry[3] = now
+		except serial.SerialException:
+			self._Emit('error', inFlight[0][0] if inFlight else nextSqn, inFlight[0][4] if inFlight else 0, 0)
+			try:
+				self.Reconnect()
+			except serial.SerialException:
+				pass
 			return False
 
-		# При каждой неудачной попытке увеличивается SQN
-		sqn = (sqn + 1) & 0xFF
-		time.sleep(0.005)
 
-	ser.close()
-	return True
\ No newline at end of file
+# Отправка hex строки через одноразовую сессию (порт открывается и закрывается на каждый вызов)
+def SendHex(port: str, hexString: str, baudrate: int) -> bool:
+	try:
+		with Prd3Session(port, baudrate) as session:
+			ok = session.SendHex(hexString)
+			# Даем байтам уйти из порта до его закрытия
+			time.sleep(0.01)
+			return ok
+	except serial.SerialException:
+		return False
+
+
+# Одноразовая отправка G-code: для серии команд лучше держать открытым Prd3Session
+def SendGcode(port: str, gcodeLines: Iterable[str], baudrate: int, chunkSize: int=250, retries: int=3) -> bool:
+	session = Prd3Session(port, baudrate)
+	try:
+		return session.SendGcode(gcodeLines, chunkSize, retries)
+	finally:
+		session.Close()
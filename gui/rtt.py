@@ -0,0 +1,44 @@
+# Оценка времени ответа (RTT) и таймаута повторной передачи (RTO) по схеме RFC 6298:
+# SRTT/RTTVAR по подтвержденным пакетам, экспоненциальный backoff при таймаутах.
+# Правило Карна соблюдает отправитель: RTT пакета, который передавался повторно, в Sample не попадает
+
+
+class RttEstimator:
+	def __init__(self, initialRto: float=0.05, minRto: float=0.01, maxRto: float=2.0, granularity: float=0.001):
+		self.initialRto = initialRto # Таймаут до первого измерения (прежний фиксированный таймаут ReadAckPacket)
+		self.minRto = minRto
+		self.maxRto = maxRto
+		self.granularity = granularity # Разрешение часов G
+		self.alpha = 1 / 8
+		self.beta = 1 / 4
+		self.k = 4
+		self.Reset()
+
+	def Reset(self) -> None:
+		self.srtt = None # Сглаженное RTT, секунды
+		self.rttvar = None # Разброс RTT, секунды
+		self.lastRtt = None # Последнее измерение
+		self.samples = 0
+		self.backoffs = 0 # Удвоения RTO подряд с последнего измерения
+		self.rto = self.initialRto
+
+	def _Clamp(self, rto: float) -> float:
+		return min(self.maxRto, max(self.minRto, rto))
+
+	# Новое измерение RTT по пакету, подтвержденному с первой попытки
+	def Sample(self, rtt: float) -> None:
+		if self.srtt is None:
+			self.srtt = rtt
+			self.rttvar = rtt / 2
+		else:
+			self.rttvar = (1 - self.beta) * self.rttvar + self.beta * abs(self.srtt - rtt)
+			self.srtt = (1 - self.alpha) * self.srtt + self.alpha * rtt
+		self.lastRtt = rtt
+		self.samples += 1
+		self.backoffs = 0
+		self.rto = self._Clamp(self.srtt + max(self.granularity, self.k * self.rttvar))
+
+	# Таймаут ожидания ACK: следующий ждем вдвое дольше
+	def Backoff(self) -> None:
+		self.backoffs += 1
+		self.rto = self._Clamp(self.rto * 2)
@@ -0,0 +1,404 @@
+# Программная модель worker-ноды PRD-3: транспорт (response.py) и тестер CaTE можно гонять без STM32 и HC-06.
+# Кадр - как его формирует хост (framing.py): SYNC_1 | SYNC_2 | LEN | SQN | ADDR | CMD | DATA | CRC8 (0x31).
+# Модель: UART 8N1 (10 бит на байт) с заданной скоростью, задержка и джиттер канала, потеря и искажение байтов,
+# кольцевой буфер приема на 512 байт (при переполнении байты теряются, как в HAL_UART_RxCpltCallback),
+# сброс парсера после 25 мс тишины, ответ ACK с SQN принятого пакета.
+# telemetry: 'poll' - нода отвечает на CMD_TELEMETRY заполнением буфера (response.Telemetry),
+# 'piggyback' - еще и прикладывает его к каждому ACK принятого пакета, 'none' - как прошивка без телеметрии.
+# Тестер CaTE считает в LEN и байт CRC, а SQN ведет по модулю 255 - для него lenExtra=1, sqnModulo=255 (--cate).
+# Время модели - time.monotonic(): все события считаются в момент записи, чтение лишь ждет их наступления.
+#
+# Режимы:
+#	SimSerial - объект с интерфейсом pyserial внутри процесса: Prd3Session(port, baudrate, ser=SimSerial(...))
+#	псевдотерминал: python simulator.py --pty [--cate], затем в ГУИ/CaTE указать напечатанный порт /dev/pts/N
+# loop:// pyserial умеет только эхо, поэтому вместо него - SimSerial
+import argparse
+import os
+import random
+import select
+import time
+from collections import deque
+from typing import Optional
+
+import serial
+
+from crc8 import Crc8
+from framing import SYNC
+from response import (MakeResponse, MakeTelemetry, ADDR, ACK_OK, ACK_BAD_ADDR, ACK_BAD_CRC, ACK_BAD_PARAM,
+	CMD_TELEMETRY, TELEMETRY_REQUEST, UART_RING_SIZE, PARSER_TIMEOUT)
+
+# Состояния парсера (как fsm_state прошивки)
+WAIT_SYNC1 = 0
+WAIT_SYNC2 = 1
+WAIT_LEN = 2
+WAIT_BODY = 3
+WAIT_CRC = 4
+
+# Допустимый LEN кадра хост -> нода по docs/worker_node_prd3.adoc, остальное парсер отбрасывает.
+# framing.MIN_LEN мягче (3) - им хост разбирает ACK без данных
+NODE_MIN_LEN = 4
+NODE_MAX_LEN = 253
+
+ACKS_HOST = (ACK_OK, ACK_BAD_ADDR, ACK_BAD_CRC, ACK_BAD_PARAM) # Коды из response.py
+ACKS_DOC = (0, 1, 2, 3) # Коды из docs/worker_node_prd3.adoc (их ждет CaTE)
+
+
+class WorkerNode:
+	def __init__(self, baudrate: int=9600, latency: float=0.0, jitter: float=0.0, loss: float=0.0,
+			corrupt: float=0.0, ringSize: int=UART_RING_SIZE, parserTimeout: float=PARSER_TIMEOUT,
+			byteCost: float=0.0, packetCost: float=0.0, addr: int=ADDR, acks: tuple=ACKS_HOST,
+			validCmds: Optional[tuple]=None, inOrder: bool=True, resyncIdle: float=0.5, lenExtra: int=0,
+			sqnModulo: int=256, telemetry: str='none', seed: Optional[int]=None):
+		self.byteTime = 10 / baudrate # Старт + 8 бит + стоп
+		self.latency = latency # Задержка канала в одну сторону, секунды
+		self.jitter = jitter # Добавка к задержке, равномерно от 0 до jitter
+		self.loss = loss # Вероятность потери байта
+		self.corrupt = corrupt # Вероятность искажения байта (один случайный бит)
+		self.ringSize = ringSize
+		self.parserTimeout = parserTimeout
+		self.byteCost = byteCost # Время разбора одного байта основным циклом
+		self.packetCost = packetCost # Время обработки принятого пакета (printf, разбор G-code)
+		self.addr = addr
+		self.ackOk, self.ackBadAddr, self.ackBadCrc, self.ackBadParam = acks
+		self.validCmds = validCmds # Допустимые CMD (None - проверка выключена, как в прошивке)
+		self.inOrder = inOrder # Прием только по порядку SQN (приемник Go-Back-N)
+		self.resyncIdle = resyncIdle # После такой паузы принимаем любой SQN: хост мог начать новую сессию с SQN=0
+		self.lenExtra = lenExtra # LEN = длина тела + lenExtra
+		self.sqnModulo = sqnModulo
+		self.telemetry = telemetry
+		self.random = random.Random(seed)
+
+		self.txFree = 0.0 # Когда освободится линия хост -> нода
+		self.rxFree = 0.0 # Когда освободится линия нода -> хост
+		self.ring = deque() # Моменты, когда байты кольцевого буфера будут вычитаны парсером
+		self.history = deque() # (приход, разбор) байтов, которые еще могут попасть в отсчет телеметрии
+		self.arrived = 0.0 # Приход последнего принятого байта
+		self.responses = deque() # (время, SQN, ACK, конец кадра или None) - ответы, ждущие отправки (с телеметрией)
+		self.parserFree = 0.0
+		self.toHost = deque() # (время прихода на хост, байт)
+		self.payload = bytearray() # Данные принятых по порядку пакетов (G-code)
+		self.ResetParser()
+		self.lastByteTime = 0.0
+		self.expected = None # Следующий ожидаемый SQN, None - примем любой
+		self.lastSqn = None # SQN последнего принятого пакета
+		self.lastPacketTime = 0.0
+
+		self.bytesIn = 0
+		self.lost = 0
+		self.corrupted = 0
+		self.overflow = 0 # Байты, не поместившиеся в кольцевой буфер
+		self.parserTimeouts = 0
+		self.packets = 0 # Принятые пакеты
+		self.badCrc = 0
+		self.badAddr = 0
+		self.badParam = 0
+		self.discarded = 0 # Пакеты вне порядка и повторы
+		self.acks = 0
+		self.telemetryRequests = 0
+		self.maxUsed = 0 # Наибольшее заполнение буфера в ответах с телеметрией
+
+	def ResetParser(self) -> None:
+		self.state = WAIT_SYNC1
+		self.length = 0
+		self.body = bytearray()
+
+	def _Delay(self) -> float:
+		return self.latency + (self.random.uniform(0, self.jitter) if self.jitter > 0 else 0.0)
+
+	# Байт на линии: None - потерян, иначе (возможно, искаженный) байт
+	def _Line(self, b: int) -> Optional[int]:
+		if self.loss > 0 and self.random.random() < self.loss:
+			self.lost += 1
+			return None
+		if self.corrupt > 0 and self.random.random() < self.corrupt:
+			self.corrupted += 1
+			return b ^ (1 << self.random.randrange(8))
+		return b
+
+	# Байты от хоста, записанные в порт в момент now
+	def Write(self, data: bytes, now: float) -> None:
+		start = max(now + self._Delay(), self.txFree)
+		for i, b in enumerate(data):
+			b = self._Line(b)
+			if b is not None:
+				self._Receive(b, start + (i + 1) * self.byteTime)
+		self.txFree = start + len(data) * self.byteTime
+
+	# Прием байта прерыванием UART в момент arrived и его разбор основным циклом
+	def _Receive(self, b: int, arrived: float) -> None:
+		self.bytesIn += 1
+		ring = self.ring
+		while ring and ring[0] <= arrived:
+			ring.popleft()
+		if len(ring) >= self.ringSize:
+			self.overflow += 1
+			return
+		parsed = max(arrived, self.parserFree) + self.byteCost
+		ring.append(parsed)
+		if self.telemetry != 'none':
+			# Ответы в очереди не раньше responses[0], будущие - не раньше parserFree
+			bound = self.responses[0][0] if self.responses else self.parserFree
+			history = self.history
+			while history and history[0][1] <= bound:
+				history.popleft()
+			history.append((arrived, parsed))
+		self.arrived = arrived
+		self.parserFree = parsed
+
+		if self.state != WAIT_SYNC1 and parsed - self.lastByteTime > self.parserTimeout:
+			self.parserTimeouts += 1
+			self.ResetParser()
+		self.lastByteTime = parsed
+		self._Parse(b, parsed)
+
+	def _Parse(self, b: int, now: float) -> None:
+		state = self.state
+		if state == WAIT_SYNC1:
+			if b == SYNC[0]:
+				self.state = WAIT_SYNC2
+		elif state == WAIT_SYNC2:
+			self.state = WAIT_LEN if b == SYNC[1] else WAIT_SYNC1
+		elif state == WAIT_LEN:
+			if NODE_MIN_LEN <= b <= NODE_MAX_LEN:
+				self.length = b
+				self.body.clear()
+				self.state = WAIT_BODY
+			else:
+				self.state = WAIT_SYNC1
+		elif state == WAIT_BODY:
+			self.body.append(b)
+			if len(self.body) == self.length - self.lenExtra:
+				self.state = WAIT_CRC
+		else:
+			body = bytes(self.body)
+			crcOk = Crc8(self.length, body) == b
+			self.ResetParser()
+			self.parserFree += self.packetCost
+			self._Packet(body, crcOk, self.parserFree, self.arrived)
+
+	# Заполнение буфера в момент now; after - байты, пришедшие позже конца кадра frameEnd.
+	# Считается, когда хост читает порт (_Release): к этому времени модель приняла все байты, пришедшие до now
+	def _Telemetry(self, now: float, frameEnd: float) -> bytes:
+		used = after = 0
+		for arrived, parsed in self.history:
+			if arrived <= now < parsed:
+				used += 1
+				if arrived > frameEnd:
+					after += 1
+		self.maxUsed = max(self.maxUsed, used)
+		return MakeTelemetry(used, self.ringSize, after)
+
+	# Обработка принятого пакета и ответ хосту. frameEnd - приход последнего байта кадра
+	def _Packet(self, body: bytes, crcOk: bool, now: float, frameEnd: float) -> None:
+		sqn, addr, cmd = body[0], body[1], body[2]
+		if not crcOk:
+			self.badCrc += 1
+			self._Respond(sqn, self.ackBadCrc, now)
+			return
+		if addr != self.addr:
+			self.badAddr += 1
+			self._Respond(sqn, self.ackBadAddr, now)
+			return
+		if cmd == CMD_TELEMETRY and body[3:] == TELEMETRY_REQUEST and self.telemetry != 'none':
+			# Запрос телеметрии SQN приема не трогает, ответ - с SQN запроса
+			self.telemetryRequests += 1
+			self._Respond(sqn, self.ackOk, now, frameEnd)
+			return
+		if self.validCmds is not None and cmd not in self.validCmds:
+			self.badParam += 1
+			self._Respond(sqn, self.ackBadParam, now)
+			return
+
+		if now - self.lastPacketTime > self.resyncIdle:
+			self.expected = None
+		self.lastPacketTime = now
+		if self.inOrder and self.expected is not None and sqn != self.expected:
+			# Повтор или пакет после потерянного: данные отбрасываем, подтверждаем последний принятый
+			self.discarded += 1
+			if self.lastSqn is not None:
+				self._Respond(self.lastSqn, self.ackOk, now)
+			return
+		self.packets += 1
+		self.payload += body[3:]
+		self.lastSqn = sqn
+		self.expected = (sqn + 1) % self.sqnModulo
+		self._Respond(sqn, self.ackOk, now, frameEnd if self.telemetry == 'piggyback' else None)
+
+	# frameEnd - ответ с телеметрией по кадру, кончившемуся в этот момент. С телеметрией ответы ждут чтения хостом,
+	# иначе в отсчет не попадут байты, которые хост запишет до момента ответа
+	def _Respond(self, sqn: int, ack: int, now: float, frameEnd: Optional[float]=None) -> None:
+		self.acks += 1
+		if self.telemetry == 'none':
+			self._Send(sqn, ack, now, b'')
+		else:
+			self.responses.append((now, sqn, ack, frameEnd))
+
+	def _Release(self, now: float) -> None:
+		responses = self.responses
+		while responses and responses[0][0] <= now:
+			at, sqn, ack, frameEnd = responses.popleft()
+			self._Send(sqn, ack, at, self._Telemetry(at, frameEnd) if frameEnd is not None else b'')
+
+	def _Send(self, sqn: int, ack: int, now: float, data: bytes) -> None:
+		frame = MakeResponse(sqn=sqn, data=data, addr=self.addr, ack=ack)
+		start = max(now + self._Delay(), self.rxFree)
+		for i, b in enumerate(frame):
+			b = self._Line(b)
+			if b is not None:
+				self.toHost.append((start + (i + 1) * self.byteTime, b))
+		self.rxFree = start + len(frame) * self.byteTime
+
+	# Байты, дошедшие до хоста к моменту now
+	def Pop(self, now: float) -> bytes:
+		self._Release(now)
+		out = bytearray()
+		toHost = self.toHost
+		while toHost and toHost[0][0] <= now:
+			out.append(toHost.popleft()[1])
+		return bytes(out)
+
+	# Момент прихода следующего байта на хост (None - ответов в пути нет)
+	def NextTime(self) -> Optional[float]:
+		if self.responses:
+			return min(self.toHost[0][0], self.responses[0][0]) if self.toHost else self.responses[0][0]
+		return self.toHost[0][0] if self.toHost else None
+
+	def Stats(self) -> dict:
+		return {
+			'bytesIn': self.bytesIn,
+			'lost': self.lost,
+			'corrupted': self.corrupted,
+			'overflow': self.overflow,
+			'parserTimeouts': self.parserTimeouts,
+			'packets': self.packets,
+			'badCrc': self.badCrc,
+			'badAddr': self.badAddr,
+			'badParam': self.badParam,
+			'discarded': self.discarded,
+			'acks': self.acks,
+			'telemetryRequests': self.telemetryRequests,
+			'maxUsed': self.maxUsed,
+			}
+
+
+# Порт pyserial, на другом конце которого WorkerNode. Подходит везде, где ждут результат serial_for_url
+class SimSerial:
+	def __init__(self, node: Optional[WorkerNode]=None, timeout: Optional[float]=0.01, **nodeArgs):
+		self.node = node if node is not None else WorkerNode(**nodeArgs)
+		self.timeout = timeout
+		self.port = 'sim://'
+		self.is_open = True
+		self.rx = bytearray()
+
+	def _Check(self) -> None:
+		if not self.is_open:
+			raise serial.PortNotOpenError()
+
+	def _Pull(self) -> None:
+		self.rx += self.node.Pop(time.monotonic())
+
+	@property
+	def in_waiting(self) -> int:
+		self._Check()
+		self._Pull()
+		return len(self.rx)
+
+	def read(self, size: int=1) -> bytes:
+		self._Check()
+		deadline = None if self.timeout is None else time.monotonic() + self.timeout
+		while True:
+			self._Pull()
+			if len(self.rx) >= size:
+				break
+			now = time.monotonic()
+			if deadline is not None and now >= deadline:
+				break
+			wake = self.node.NextTime()
+			if wake is None:
+				wake = deadline if deadline is not None else now + 0.01
+			elif deadline is not None:
+				wake = min(wake, deadline)
+			time.sleep(max(0.0, wake - now))
+		data = bytes(self.rx[:size])
+		del self.rx[:size]
+		return data
+
+	def write(self, data) -> int:
+		self._Check()
+		self.node.Write(bytes(data), time.monotonic())
+		return len(data)
+
+	def flush(self) -> None:
+		self._Check()
+
+	def reset_input_buffer(self) -> None:
+		self._Check()
+		self._Pull()
+		self.rx.clear()
+
+	def reset_output_buffer(self) -> None:
+		self._Check()
+
+	def open(self) -> None:
+		self.is_open = True
+
+	def close(self) -> None:
+		self.is_open = False
+
+
+# Нода на псевдотерминале: обслуживает master-конец, пока не прервут (Ctrl+C)
+def RunPty(node: WorkerNode, verbose: bool=False) -> None:
+	import tty
+	master, slave = os.openpty()
+	tty.setraw(slave)
+	print(f"Worker node: {os.ttyname(slave)}", flush=True)
+	packets = 0
+	try:
+		while True:
+			wake = node.NextTime()
+			wait = 0.05 if wake is None else max(0.0, wake - time.monotonic())
+			readable, _, _ = select.select([master], [], [], wait)
+			if readable:
+				node.Write(os.read(master, 4096), time.monotonic())
+			out = node.Pop(time.monotonic())
+			if out:
+				os.write(master, out)
+			if verbose and node.packets != packets:
+				packets = node.packets
+				print(node.Stats(), flush=True)
+	except KeyboardInterrupt:
+		pass
+	finally:
+		os.close(master)
+		os.close(slave)
+		print(node.Stats())
+
+
+def GetArgs():
+	parser = argparse.ArgumentParser(description='Модель worker-ноды PRD-3 на псевдотерминале')
+	parser.add_argument('--pty', action='store_true', help='открыть псевдотерминал и обслуживать его')
+	parser.add_argument('-br', '--baudrate', type=int, default=9600, help='скорость UART, бод')
+	parser.add_argument('--latency', type=float, default=0.0, help='задержка канала в одну сторону, с')
+	parser.add_argument('--jitter', type=float, default=0.0, help='случайная добавка к задержке, с')
+	parser.add_argument('--loss', type=float, default=0.0, help='вероятность потери байта')
+	parser.add_argument('--corrupt', type=float, default=0.0, help='вероятность искажения байта')
+	parser.add_argument('--packet-cost', type=float, default=0.0, help='время обработки пакета нодой, с')
+	parser.add_argument('--telemetry', choices=('none', 'poll', 'piggyback'), default='none', help='ответы с заполнением буфера')
+	parser.add_argument('--doc-acks', action='store_true', help='коды ACK 0..3 из описания ноды')
+	parser.add_argument('--cate', action='store_true', help='кадры тестера CaTE: коды ACK 0..3, LEN с CRC, SQN по модулю 255')
+	parser.add_argument('--seed', type=int, default=None)
+	parser.add_argument('-v', '--verbose', action='store_true')
+	return parser.parse_args()
+
+
+if __name__ == "__main__":
+	args = GetArgs()
+	node = WorkerNode(args.baudrate, args.latency, args.jitter, args.loss, args.corrupt,
+		packetCost=args.packet_cost, acks=ACKS_DOC if args.doc_acks or args.cate else ACKS_HOST,
+		lenExtra=1 if args.cate else 0, sqnModulo=255 if args.cate else 256, telemetry=args.telemetry, seed=args.seed)
+	if not args.pty:
+		print("Укажите --pty (SimSerial используется из кода напрямую)")
+	elif os.name != 'posix':
+		print("Псевдотерминал доступен только в POSIX")
+	else:
+		RunPty(node, args.verbose)
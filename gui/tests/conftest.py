@@ -0,0 +1,6 @@
+# Tests import the GUI modules the way the GUI does: from the gui directory.
+# Run from the repository root or from gui: python -m pytest gui/tests
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,48 @@
+# Табличный CRC8 (crc8.py) против crcmod с параметрами PRD-3: полином 0x31, init 0, без отражения, без xorOut
+import random
+
+import pytest
+
+from crc8 import Crc8, update
+
+crcmod = pytest.importorskip('crcmod')
+Reference = crcmod.mkCrcFun(0x131, initCrc=0x00, rev=False, xorOut=0x00)
+
+
+def RandomBuffers(seed: int, count: int=300, maxSize: int=300) -> list[bytes]:
+	rnd = random.Random(seed)
+	return [bytes(rnd.getrandbits(8) for _ in range(rnd.randint(0, maxSize))) for _ in range(count)]
+
+
+def test_crc8_matches_crcmod():
+	for data in RandomBuffers(0x31):
+		assert Crc8(data) == Reference(data)
+
+
+def test_crc8_known_values():
+	assert Crc8(b'') == 0
+	assert Crc8(b'123456789') == Reference(b'123456789') == 0xA2
+
+
+def test_update_by_chunks_matches_crcmod():
+	rnd = random.Random(1)
+	for data in RandomBuffers(2):
+		state = 0
+		pos = 0
+		while pos < len(data):
+			step = rnd.randint(1, 16)
+			state = update(state, data[pos:pos + step])
+			pos += step
+		assert state == Reference(data)
+
+
+def test_crc8_of_chunks_equals_crc8_of_joined():
+	rnd = random.Random(3)
+	for data in RandomBuffers(4):
+		cuts = sorted(rnd.randint(0, len(data)) for _ in range(rnd.randint(0, 5)))
+		chunks = [data[a:b] for a, b in zip([0] + cuts, cuts + [len(data)])]
+		assert Crc8(*chunks) == Crc8(b''.join(chunks)) == Reference(data)
+		# memoryview и bytearray без копирования
+		view = memoryview(data)
+		assert Crc8(*(view[a:b] for a, b in zip([0] + cuts, cuts + [len(data)]))) == Reference(data)
+		assert Crc8(bytearray(data)) == Reference(data)
@@ -0,0 +1,61 @@
+# Vectorised hatching (toolpath.hatch) against the per-pixel implementation it replaced (bench/bench_hatch.py)
+import random
+
+import pytest
+from PIL import Image
+
+from bench.bench_hatch import HatchLinesLegacy, MakeField
+from toolpath import get_gcodes_htc, get_hatch_line_coords, get_region_mask, sample_hatch_lines
+
+ANGLES = (0, 45, 90, 135, 180, 270, 33, -20)
+DISTANCES = (1, 3, 7)
+
+
+def random_cases(seed: int = 1, count: int = 12):
+    rnd = random.Random(seed)
+    cases = []
+    for _ in range(count):
+        img = MakeField(rnd, rnd.randint(0, 8))
+        cases.append((img, rnd.randint(0, 329), rnd.randint(0, 227), rnd.randint(-180, 360), rnd.randint(1, 30)))
+    return cases
+
+
+def hatch_lines(img, x, y, angle, distance):
+    mask = get_region_mask(img, x, y)
+    h, w = mask.shape
+    return [segment for row in sample_hatch_lines(mask, get_hatch_line_coords(w, h, angle, distance)) for segment in row]
+
+
+def reference_gcodes(img, x, y, angle, distance, x_cur, y_cur):
+    ret = []
+    x_last, y_last = x_cur, y_cur
+    for x1, y1, x2, y2 in HatchLinesLegacy(img, x, y, angle, distance):
+        ret.append(f'G00 X{x1} Y{y1}')
+        ret.append(f'G01 X{x2} Y{y2}')
+        x_last, y_last = x2, y2
+    return (ret, x_last, y_last)
+
+
+@pytest.mark.parametrize('angle', ANGLES)
+@pytest.mark.parametrize('distance', DISTANCES)
+def test_sample_hatch_lines_empty_field(angle, distance):
+    img = Image.new("RGB", (330, 228), "white")
+    assert hatch_lines(img, 10, 10, angle, distance) == HatchLinesLegacy(img, 10, 10, angle, distance)
+
+
+@pytest.mark.parametrize('case', range(12))
+def test_sample_hatch_lines_random_regions(case):
+    img, x, y, angle, distance = random_cases()[case]
+    assert hatch_lines(img, x, y, angle, distance) == HatchLinesLegacy(img, x, y, angle, distance)
+
+
+@pytest.mark.parametrize('case', range(0, 12, 3))
+def test_get_gcodes_htc_matches_reference(case):
+    img, x, y, angle, distance = random_cases()[case]
+    expected = reference_gcodes(img, x, y, angle, distance, 0, 0)
+    assert tuple(get_gcodes_htc(img, 'htc', True, x, y, angle, distance, 0, 0, order='none')) == expected
+
+
+def test_get_gcodes_htc_not_painting():
+    img = Image.new("RGB", (330, 228), "white")
+    assert get_gcodes_htc(img, 'htc', False, 10, 10, 45, 5, 7, 8) == [[], 7, 8]
@@ -0,0 +1,10 @@
+# Qt-free toolpath generation: paint field commands and images -> G-code.
+# Used by the GUI (main.py) and by the batch CLI: python -m toolpath --help
+from .arc import ARC_TOLERANCE, get_arc_center, get_arc_centers, tessellate_arc, tessellate_arcs
+from .hatch import RegionMaskCache, fill_region, get_region_mask, get_hatch_lines, get_hatch_rows, get_hatch_line_coords, sample_hatch_lines
+from .parallel import get_hatch_rows_parallel
+from .gcode import get_gcode, get_gcodes_htc, order_hatch_segments, travel_distance
+from .canvas import FIELD_SIZE, MODES, Canvas, draw_command, draw_gcode_arc
+from .batch import load_commands, gcodes_from_commands, gcodes_from_image, process_file, run_batch
+from .anchors import AnchorIndex
+from .preview import ProgramPreview, ToolpathLOD, gcode_block_segments, parse_gcode_block, rasterize_segments
@@ -0,0 +1,57 @@
+# Batch G-code generation without the GUI: drawing-command files (.json) and images -> .cnc programs
+# Run from the gui directory: python -m toolpath jobs/ logo.png --out cnc --jobs 4
+import argparse
+import os
+import sys
+import time
+
+from .batch import COMMAND_EXTENSIONS, IMAGE_EXTENSIONS, run_batch
+
+
+def collect_inputs(items: list[str]) -> list[str]:
+    # files as given, directories expanded to the supported files inside them (not recursive)
+    paths = []
+    for item in items:
+        if os.path.isdir(item):
+            for name in sorted(os.listdir(item)):
+                if os.path.splitext(name)[1].lower() in COMMAND_EXTENSIONS + IMAGE_EXTENSIONS:
+                    paths.append(os.path.join(item, name))
+        else:
+            paths.append(item)
+    return paths
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog='python -m toolpath', description="Drawing-command files and images -> .cnc programs")
+    parser.add_argument('inputs', nargs='+', help="Файлы команд (.json), изображения или каталоги с ними")
+    parser.add_argument('--out', type=str, default='.', help="Каталог для .cnc. По умолчанию - текущий")
+    parser.add_argument('--jobs', type=int, default=None, help="Число процессов. По умолчанию - по числу ядер, 1 - без пула")
+    parser.add_argument('--angle', type=int, default=45, help="Угол штриховки изображений. По умолчанию = 45")
+    parser.add_argument('--distance', type=int, default=10, help="Шаг штриховки изображений. По умолчанию = 10")
+    parser.add_argument('--order', type=str, default='auto', choices=('none', 'serpentine', 'nearest', 'auto'), help="Порядок штрихов")
+    args = parser.parse_args()
+
+    paths = collect_inputs(args.inputs)
+    if not paths:
+        print("Нет входных файлов", file=sys.stderr)
+        return 2
+
+    def report(result):
+        if result['error'] is None:
+            print(f"{result['input']} -> {result['output']}: {result['lines']} строк, {result['bytes']} Б, {result['seconds'] * 1000:.0f} мс")
+        else:
+            print(f"{result['input']}: ошибка: {result['error']}", file=sys.stderr)
+
+    start = time.perf_counter()
+    try:
+        results = run_batch(paths, args.out, {'angle': args.angle, 'distance': args.distance, 'order': args.order}, args.jobs, report)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+    failed = sum(result['error'] is not None for result in results)
+    print(f"Готово: {len(results) - failed} из {len(results)} за {time.perf_counter() - start:.2f} с")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
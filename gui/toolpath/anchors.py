@@ -0,0 +1,137 @@
+# Snapping anchors of the paint field: nearest anchor to a click and per-axis nearest coordinates.
+# Pure Python, no Qt - used by the GUI (main.py) and bench/bench_anchors.py
+import bisect
+import heapq
+import math
+
+
+class AnchorIndex:
+    # snapping anchors: grid pyramid (implicit quadtree) - level 0 keeps the points of cell x cell buckets,
+    # level k marks the occupied cells 4^k times coarser; nearest() walks it best-first from the top level.
+    # Sorted distinct coordinates serve the axis-constrained snapping of hrz/vrt
+    def __init__(self, anchors=(), cell: int = 8, levels: int = 6):
+        self.sizes = [cell * 4 ** k for k in range(levels)]
+        self.points: set = set()
+        self.cells: dict = {}  # level 0: (i, j) -> points
+        self.levels: list[set] = [set() for _ in range(levels)]  # occupied (i, j) per level
+        self.xs: list = []
+        self.ys: list = []
+        self.update(anchors)
+
+    def __len__(self) -> int:
+        return len(self.points)
+
+    def __contains__(self, point) -> bool:
+        return point in self.points
+
+    def __iter__(self):
+        return iter(self.points)
+
+    def _insert(self, point: tuple[int, int]):
+        x, y = point
+        self.cells.setdefault((x // self.sizes[0], y // self.sizes[0]), []).append(point)
+        for size, occupied in zip(self.sizes, self.levels):
+            occupied.add((x // size, y // size))
+
+    def add(self, point: tuple[int, int]):
+        if point in self.points:
+            return
+        self.points.add(point)
+        self._insert(point)
+        x, y = point
+        i = bisect.bisect_left(self.xs, x)
+        if i == len(self.xs) or self.xs[i] != x:
+            self.xs.insert(i, x)
+        i = bisect.bisect_left(self.ys, y)
+        if i == len(self.ys) or self.ys[i] != y:
+            self.ys.insert(i, y)
+
+    def update(self, anchors):
+        # bulk insert: one sort instead of an insort per point
+        new = set(anchors) - self.points
+        if not new:
+            return
+        self.points |= new
+        size = self.sizes[0]
+        for point in new:
+            self.cells.setdefault((point[0] // size, point[1] // size), []).append(point)
+        # every level is the previous one with 4x coarser cells
+        keys = set(self.cells)
+        for occupied in self.levels:
+            occupied.update(keys)
+            keys = {(i // 4, j // 4) for i, j in keys}
+        self.xs = sorted(set(self.xs).union(p[0] for p in new))
+        self.ys = sorted(set(self.ys).union(p[1] for p in new))
+
+    def clear(self):
+        self.points.clear()
+        self.cells.clear()
+        for occupied in self.levels:
+            occupied.clear()
+        self.xs.clear()
+        self.ys.clear()
+
+    def nearest(self, x: int, y: int) -> tuple[int, int]:
+        if not self.points:
+            raise ValueError("Множество anchors не должно быть пустым")
+
+        def _gap(level: int, i: int, j: int) -> float:
+            # squared distance from (x, y) to the cell, a lower bound for every point inside it
+            size = self.sizes[level]
+            dx = max(i * size - x, 0, x - (i + 1) * size)
+            dy = max(j * size - y, 0, y - (j + 1) * size)
+            return dx * dx + dy * dy
+
+        def _scan(points, best):
+            for point in points:
+                d = ((point[0] - x) ** 2 + (point[1] - y) ** 2, point)
+                if d < best:
+                    best = d
+            return best
+
+        # the click is usually next to an anchor: its 3 x 3 cells give a bound that prunes most of the walk
+        best = (math.inf, None)
+        i0, j0 = x // self.sizes[0], y // self.sizes[0]
+        for i in (i0 - 1, i0, i0 + 1):
+            for j in (j0 - 1, j0, j0 + 1):
+                best = _scan(self.cells.get((i, j), ()), best)
+        # anything outside those cells is at least one cell away
+        if best[0] <= self.sizes[0] ** 2:
+            return best[1]
+
+        top = len(self.sizes) - 1
+        heap = [(_gap(top, i, j), top, i, j) for i, j in self.levels[top]]
+        heapq.heapify(heap)
+        while heap:
+            gap, level, i, j = heapq.heappop(heap)
+            if gap >= best[0]:
+                break
+            if level == 0:
+                best = _scan(self.cells[(i, j)], best)
+                continue
+            occupied = self.levels[level - 1]
+            for ci in range(4 * i, 4 * i + 4):
+                for cj in range(4 * j, 4 * j + 4):
+                    if (ci, cj) in occupied:
+                        gap = _gap(level - 1, ci, cj)
+                        if gap < best[0]:
+                            heapq.heappush(heap, (gap, level - 1, ci, cj))
+        return best[1]
+
+    def nearest_x(self, x: int) -> int:
+        # anchor x closest to x (snapping of hrz: the segment stays on the current y)
+        return self._nearest_value(self.xs, x)
+
+    def nearest_y(self, y: int) -> int:
+        # anchor y closest to y (snapping of vrt: the segment stays on the current x)
+        return self._nearest_value(self.ys, y)
+
+    def _nearest_value(self, values: list, v: int) -> int:
+        if not values:
+            raise ValueError("Множество anchors не должно быть пустым")
+        i = bisect.bisect_left(values, v)
+        if i == 0:
+            return values[0]
+        if i == len(values):
+            return values[-1]
+        return values[i - 1] if v - values[i - 1] <= values[i] - v else values[i]
@@ -0,0 +1,121 @@
+import math
+
+import numpy as np
+
+ARC_TOLERANCE = 0.25  # max distance between an arc and its polyline chords, px
+
+
+def get_arc_center(x1: int, y1: int, x2: int, y2: int, r: int, ccw: bool) -> tuple[float, float, float, float]:
+    # center, start angle and sweep of a G02/G03 R arc, None if the endpoints are farther apart than 2R
+    # r > 0 - the shorter of the two arcs, r < 0 - the longer one
+
+    def _get_arc_angle(a1: float, a2: float, ccw: bool):
+        if ccw:
+            if a2 < a1:
+                a2 += 2 * math.pi
+            return a2 - a1
+        else:
+            if a2 > a1:
+                a2 -= 2 * math.pi
+            return a1 - a2
+
+    dx = x2 - x1
+    dy = y2 - y1
+    distance = math.hypot(dx, dy)
+
+    R = abs(r)
+    if distance == 0 or distance > 2 * R:
+        return None
+
+    mx = (x1 + x2) / 2
+    my = (y1 + y2) / 2
+    h = math.sqrt(R * R - (distance / 2) ** 2)
+    nx = -dy / distance
+    ny = dx / distance
+    centers = [
+        (mx + nx * h, my + ny * h),
+        (mx - nx * h, my - ny * h),
+    ]
+
+    candidates = []
+    for cx, cy in centers:
+        a1 = math.atan2(y1 - cy, x1 - cx)
+        a2 = math.atan2(y2 - cy, x2 - cx)
+        sweep = _get_arc_angle(a1, a2, ccw)
+        candidates.append((sweep, cx, cy, a1))
+
+    if r > 0:
+        sweep, cx, cy, a1 = min(candidates, key=lambda c: c[0])
+    else:
+        sweep, cx, cy, a1 = max(candidates, key=lambda c: c[0])
+    return cx, cy, a1, sweep
+
+
+def tessellate_arc(x1: int, y1: int, x2: int, y2: int, r: int, ccw: bool, tolerance: float = ARC_TOLERANCE) -> np.ndarray:
+    # polyline (n x 2) of a G02/G03 R arc, None if the arc is impossible
+    # the segment count follows radius and sweep: every chord stays within `tolerance` px of the arc
+    if x1 == x2 and y1 == y2:
+        return np.array([(x1, y1)], dtype=float)
+    arc = get_arc_center(x1, y1, x2, y2, r, ccw)
+    if arc is None:
+        return None
+    cx, cy, a1, sweep = arc
+    R = abs(r)
+    # sagitta of a chord spanning angle `step` is R * (1 - cos(step / 2))
+    step = 2 * math.acos(max(-1.0, 1 - tolerance / R))
+    n = max(1, math.ceil(sweep / step))
+    angles = a1 + np.linspace(0, sweep if ccw else -sweep, n + 1)
+    points = np.column_stack((cx + R * np.cos(angles), cy + R * np.sin(angles)))
+    # exact endpoints, so consecutive commands join without a gap
+    points[0] = (x1, y1)
+    points[-1] = (x2, y2)
+    return points
+
+
+def get_arc_centers(x1, y1, x2, y2, r, ccw) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    # get_arc_center over arrays of R arcs: cx, cy, a1, sweep, nan where the arc is impossible
+    x1, y1, x2, y2, r = (np.asarray(v, dtype=float) for v in (x1, y1, x2, y2, r))
+    ccw = np.asarray(ccw, dtype=bool)
+    dx = x2 - x1
+    dy = y2 - y1
+    distance = np.hypot(dx, dy)
+    R = np.abs(r)
+    valid = (distance > 0) & (distance <= 2 * R)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        h = np.sqrt(np.maximum(R * R - (distance / 2) ** 2, 0.0))
+        nx = -dy / distance
+        ny = dx / distance
+    mx = (x1 + x2) / 2
+    my = (y1 + y2) / 2
+    candidates = []
+    for sign in (1, -1):
+        cx = mx + sign * nx * h
+        cy = my + sign * ny * h
+        a1 = np.arctan2(y1 - cy, x1 - cx)
+        a2 = np.arctan2(y2 - cy, x2 - cx)
+        sweep = np.where(ccw, a2 - a1, a1 - a2) % (2 * math.pi)
+        candidates.append((cx, cy, a1, sweep))
+    # the shorter arc for r > 0, the longer one for r < 0; ties go to the first center, as in get_arc_center
+    first = np.where(r > 0, candidates[0][3] <= candidates[1][3], candidates[0][3] >= candidates[1][3])
+    return tuple(np.where(first & valid, c0, np.where(valid, c1, np.nan)) for c0, c1 in zip(*candidates))
+
+
+def tessellate_arcs(x1, y1, x2, y2, cx, cy, a1, sweep, ccw, tolerance: float = ARC_TOLERANCE) -> tuple[np.ndarray, np.ndarray]:
+    # tessellate_arc over arrays of arcs given by center, start angle and sweep: points (m x 2) of all arcs
+    # one after another and the point count of every arc. Endpoints are exact, arcs must be valid
+    x1, y1, x2, y2, cx, cy, a1, sweep = (np.asarray(v, dtype=float) for v in (x1, y1, x2, y2, cx, cy, a1, sweep))
+    if len(x1) == 0:
+        return np.empty((0, 2)), np.empty(0, dtype=np.int64)
+    R = np.hypot(x1 - cx, y1 - cy)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        step = 2 * np.arccos(np.clip(1 - tolerance / R, -1.0, 1.0))
+        n = np.maximum(1, np.ceil(np.nan_to_num(sweep / step))).astype(np.int64)
+    counts = n + 1
+    starts = np.cumsum(counts) - counts
+    arc = np.repeat(np.arange(len(n)), counts)
+    t = (np.arange(len(arc)) - starts[arc]) / n[arc]
+    angles = a1[arc] + np.where(np.asarray(ccw, dtype=bool), sweep, -sweep)[arc] * t
+    points = np.column_stack((cx[arc] + R[arc] * np.cos(angles), cy[arc] + R[arc] * np.sin(angles)))
+    points[starts] = np.column_stack((x1, y1))
+    points[starts + counts - 1] = np.column_stack((x2, y2))
+    return points, counts
@@ -0,0 +1,108 @@
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+from PIL import Image
+
+from .canvas import FIELD_SIZE, Canvas
+from .gcode import get_gcodes_htc
+
+COMMAND_EXTENSIONS = ('.json',)
+IMAGE_EXTENSIONS = ('.png', '.bmp', '.jpg', '.jpeg', '.gif', '.tif', '.tiff')
+DEFAULT_OPTIONS = {'angle': 45, 'distance': 10, 'order': 'auto'}
+
+
+def load_commands(path: str) -> list[dict]:
+    # drawing-command file: JSON list (or {"commands": [...]}) of paint field clicks, e.g.
+    # {"mode": "slp", "x": 20, "y": 150}, {"mode": "arc", "x": 60, "y": 60, "radius": 60, "ccw": true},
+    # {"mode": "htc", "x": 60, "y": 60, "angle": 30, "distance": 3}, {"mode": "hrz", "x": 5, "paint": false}, {"mode": "home"}
+    with open(path, 'r', encoding='utf-8') as file:
+        data = json.load(file)
+    if isinstance(data, dict):
+        data = data.get('commands')
+    if not isinstance(data, list) or not all(isinstance(command, dict) and 'mode' in command for command in data):
+        raise ValueError(f"{path}: expected a list of commands with a 'mode'")
+    return data
+
+
+def gcodes_from_commands(commands: list[dict], img=None, order: str = 'auto') -> list[str]:
+    canvas = Canvas(img, order)
+    for number, command in enumerate(commands, 1):
+        args = dict(command)
+        mode = args.pop('mode')
+        try:
+            if mode == 'home':
+                canvas.home()
+                continue
+            # hrz keeps the current y and vrt the current x, so either may be left out
+            args.setdefault('x', canvas.x)
+            args.setdefault('y', canvas.y)
+            canvas.apply(mode, **args)
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"command {number} ({mode}): {e}") from e
+    return canvas.g_codes
+
+
+def gcodes_from_image(img, angle: int = 45, distance: int = 10, order: str = 'auto') -> list[str]:
+    # engraving: dark pixels (the same > 128 split as the hatch region search) are hatched,
+    # images larger than the paint field are scaled down to fit it
+    img = img.convert("L")
+    if img.width > FIELD_SIZE[0] or img.height > FIELD_SIZE[1]:
+        img.thumbnail(FIELD_SIZE)
+    dark = np.asarray(img) <= 128
+    g_codes, x, y = get_gcodes_htc(img, 'htc', True, 0, 0, angle, distance, 0, 0, order, mask=dark)
+    return g_codes
+
+
+def output_path(path: str, out_dir: str) -> str:
+    return os.path.join(out_dir, os.path.splitext(os.path.basename(path))[0] + '.cnc')
+
+
+def process_file(path: str, out_dir: str, options: dict = None) -> dict:
+    # one input -> <out_dir>/<name>.cnc; runs in a pool worker, so errors are returned rather than raised
+    options = {**DEFAULT_OPTIONS, **(options or {})}
+    result = {'input': path, 'output': output_path(path, out_dir), 'lines': 0, 'bytes': 0, 'seconds': 0.0, 'error': None}
+    start = time.perf_counter()
+    try:
+        ext = os.path.splitext(path)[1].lower()
+        if ext in COMMAND_EXTENSIONS:
+            g_codes = gcodes_from_commands(load_commands(path), order=options['order'])
+        elif ext in IMAGE_EXTENSIONS:
+            with Image.open(path) as img:
+                g_codes = gcodes_from_image(img, options['angle'], options['distance'], options['order'])
+        else:
+            raise ValueError(f"unsupported input: {ext}")
+        text = '\n'.join(g_codes)
+        with open(result['output'], 'w') as file:
+            file.write(text)
+        result['lines'] = len(g_codes)
+        result['bytes'] = len(text)
+    except (OSError, ValueError) as e:
+        result['error'] = str(e)
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+
+def run_batch(paths: list[str], out_dir: str, options: dict = None, workers: int = None, on_result=None) -> list[dict]:
+    # results in input order; workers=1 runs in this process, otherwise a process pool (None - one per core)
+    outputs = [output_path(path, out_dir) for path in paths]
+    duplicates = {output for output in outputs if outputs.count(output) > 1}
+    if duplicates:
+        raise ValueError(f"inputs would overwrite each other: {', '.join(sorted(duplicates))}")
+    os.makedirs(out_dir, exist_ok=True)
+    results = [None] * len(paths)
+    if workers == 1:
+        for i, path in enumerate(paths):
+            results[i] = process_file(path, out_dir, options)
+            if on_result is not None:
+                on_result(results[i])
+        return results
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(process_file, path, out_dir, options): i for i, path in enumerate(paths)}
+        for future in as_completed(futures):
+            results[futures[future]] = future.result()
+            if on_result is not None:
+                on_result(results[futures[future]])
+    return results
@@ -0,0 +1,74 @@
+from PIL import Image, ImageDraw
+
+from .arc import ARC_TOLERANCE, tessellate_arc
+from .gcode import get_gcode, get_gcodes_htc
+from .hatch import get_hatch_lines
+
+FIELD_SIZE = (330, 228)  # paint field, px = mm
+MODES = ('hrz', 'vrt', 'slp', 'htc', 'arc')
+
+
+def draw_gcode_arc(draw, x1: int, y1: int, x2: int, y2: int, r: int, ccw: bool, fill: str = "black", tolerance: float = ARC_TOLERANCE):
+    points = tessellate_arc(x1, y1, x2, y2, r, ccw, tolerance)
+    if points is None:
+        raise ValueError("Дуга невозможна: расстояние больше диаметра!")
+    if len(points) > 1:
+        draw.line(points.ravel().tolist(), fill=fill, width=3)
+
+
+def draw_command(draw, img, command, color: str, mask=None):
+    # one drawing command (mode, x1, y1, x2, y2, r, ccw, angle, distance) on img,
+    # mask - precomputed hatch region of an htc command. ValueError for an impossible arc
+    mode, x1, y1, x2, y2, r, ccw, angle, distance = command
+    if mode in ('hrz', 'vrt', 'slp'):
+        draw.line((x1, y1, x2, y2), fill=color, width=3)
+    if mode == 'arc':
+        draw_gcode_arc(draw, x1, y1, x2, y2, r, ccw, color)
+    if mode == 'htc':
+        for xi1, yi1, xi2, yi2 in get_hatch_lines(img, x2, y2, angle, distance, mask):
+            draw.line((xi1, yi1, xi2, yi2), fill=color, width=3)
+
+
+class Canvas:
+    # headless paint field: replays clicks of the paint tab (mode + click point) the way MainWindow does
+    # and collects the G-codes it would send, without snapping and confirmations
+    def __init__(self, img=None, order: str = 'auto'):
+        self.img = img.convert("RGB") if img is not None else Image.new("RGB", FIELD_SIZE, "white")
+        self.order = order
+        self.x: int = 0
+        self.y: int = 0
+        self.draw_commands: list = []
+        self.g_codes: list = []
+
+    def apply(self, mode: str, x: int, y: int, paint: bool = True, radius: int = 0, ccw: bool = False, angle: int = 45, distance: int = 10) -> list[str]:
+        if mode not in MODES:
+            raise ValueError(f"unknown mode: {mode}")
+        if mode == 'hrz':
+            y = self.y
+        if mode == 'vrt':
+            x = self.x
+        if mode == 'htc' and not paint:
+            raise ValueError("Штриховка без режима рисования не имеет смысла!")
+        command = (mode, self.x, self.y, x, y, radius, ccw, angle, distance)
+        if mode == 'arc' and tessellate_arc(self.x, self.y, x, y, radius, ccw) is None:
+            raise ValueError("Дуга невозможна: расстояние больше диаметра!")
+        if mode == 'htc':
+            # the field as MainWindow shows it: strokes are found with the current position marker on it
+            view = self.img.copy()
+            r = 3
+            ImageDraw.Draw(view).ellipse((self.x - r, self.y - r, self.x + r, self.y + r), fill="red")
+            g_codes, x, y = get_gcodes_htc(view, mode, paint, x, y, angle, distance, self.x, self.y, self.order)
+        else:
+            g_codes = [get_gcode(mode, paint, x, y, ccw, radius),]
+        if paint:
+            draw_command(ImageDraw.Draw(self.img), self.img, command, 'black')
+            self.draw_commands.append(command)
+        self.x, self.y = x, y
+        self.g_codes.extend(g_codes)
+        return g_codes
+
+    def home(self) -> list[str]:
+        # calibration: the carriage returns to the origin
+        self.x, self.y = 0, 0
+        self.g_codes.append('G00 X0 Y0')
+        return ['G00 X0 Y0']
@@ -0,0 +1,95 @@
+import math
+
+import numpy as np
+
+from .hatch import get_hatch_rows
+from .parallel import get_hatch_rows_parallel
+
+
+def get_gcode(mode: str, paint: bool, x: int, y: int, ccw: bool=False, radius:int=0) -> str:
+    if not paint:
+        return f'G00 X{x} Y{y}'
+    if mode in ('hrz', 'vrt', 'slp'):
+        return f'G01 X{x} Y{y}'
+    if mode == 'arc':
+        if ccw:
+            return f'G03 X{x} Y{y} R{radius}'
+        else:
+            return f'G02 X{x} Y{y} R{radius}'
+
+
+def get_gcodes_htc(img, mode: str, paint: bool, x: int, y: int, angle: int, distance: int, x_cur: int, y_cur: int, order: str = 'auto', stats: dict = None, mask=None, workers: int = 1) -> tuple[list[str], int, int]:
+    # mask - region to hatch instead of the one under (x, y), e.g. the dark pixels of an image;
+    # workers != 1 - hatch lines in a process pool (None - one per core), worth it on large fields only
+    if not paint:
+        return [list(), x_cur, y_cur]
+    if workers == 1:
+        rows = get_hatch_rows(img, x, y, angle, distance, mask)
+    else:
+        rows = get_hatch_rows_parallel(img, x, y, angle, distance, mask, workers)
+    segments = order_hatch_segments(rows, x_cur, y_cur, order)
+    if stats is not None:
+        stats['travel_before'] = travel_distance([segment for row in rows for segment in row], x_cur, y_cur)
+        stats['travel_after'] = travel_distance(segments, x_cur, y_cur)
+    ret = []
+    x_last, y_last = x_cur, y_cur
+    for x1, y1, x2, y2 in segments:
+        ret.append(f'G00 X{x1} Y{y1}')
+        ret.append(f'G01 X{x2} Y{y2}')
+        x_last, y_last = x2, y2
+    return (ret, x_last, y_last)
+
+
+def travel_distance(segments, x: int, y: int) -> float:
+    # G00 length: from (x, y) to the first stroke and between the strokes
+    total = 0.0
+    for x1, y1, x2, y2 in segments:
+        total += math.hypot(x1 - x, y1 - y)
+        x, y = x2, y2
+    return total
+
+
+def order_hatch_segments(rows: list, x: int, y: int, order: str = 'auto') -> list:
+    # order and direction of hatch strokes, rows as returned by get_hatch_rows:
+    # none - as generated, serpentine - every other hatch line backwards,
+    # nearest - greedy nearest stroke end from the current point (disjoint regions), auto - the shorter of the two
+    if order == 'none':
+        return [segment for row in rows for segment in row]
+    if order == 'serpentine':
+        segments = []
+        backwards = False
+        for row in rows:
+            if not row:
+                continue
+            if backwards:
+                segments.extend((x2, y2, x1, y1) for x1, y1, x2, y2 in reversed(row))
+            else:
+                segments.extend(row)
+            backwards = not backwards
+        return segments
+    if order == 'nearest':
+        flat = [segment for row in rows for segment in row]
+        if not flat:
+            return []
+        points = np.array(flat, dtype=float)
+        left = np.ones(len(flat), dtype=bool)
+        segments = []
+        for _ in range(len(flat)):
+            to_start = np.where(left, (points[:, 0] - x) ** 2 + (points[:, 1] - y) ** 2, np.inf)
+            to_end = np.where(left, (points[:, 2] - x) ** 2 + (points[:, 3] - y) ** 2, np.inf)
+            i = int(np.argmin(to_start))
+            j = int(np.argmin(to_end))
+            if to_start[i] <= to_end[j]:
+                x1, y1, x2, y2 = flat[i]
+            else:
+                i = j
+                x2, y2, x1, y1 = flat[i]
+            left[i] = False
+            segments.append((x1, y1, x2, y2))
+            x, y = x2, y2
+        return segments
+    if order == 'auto':
+        serpentine = order_hatch_segments(rows, x, y, 'serpentine')
+        nearest = order_hatch_segments(rows, x, y, 'nearest')
+        return nearest if travel_distance(nearest, x, y) < travel_distance(serpentine, x, y) else serpentine
+    raise ValueError(f'unknown hatch order: {order}')
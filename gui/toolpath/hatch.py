@@ -0,0 +1,163 @@
+import bisect
+import math
+from collections import OrderedDict
+
+import numpy as np
+
+HATCH_BATCH_SAMPLES = 1 << 21  # samples per NumPy batch in sample_hatch_lines, about 80 MB of temporaries
+
+
+def fill_region(same: np.ndarray, x: int, y: int) -> np.ndarray:
+    # 4-connected component of same[y, x] in the boolean array: flood fill over horizontal runs instead of pixels
+    h, w = same.shape
+    padded = np.zeros((h, w + 2), dtype=np.int8)
+    padded[:, 1:-1] = same
+    edges = np.diff(padded, axis=1)
+    run_rows, run_starts = np.nonzero(edges == 1)
+    run_ends = np.nonzero(edges == -1)[1]  # exclusive
+
+    rows = [[] for _ in range(h)]  # row -> [(start, end)] sorted by start
+    for row, start, end in zip(run_rows.tolist(), run_starts.tolist(), run_ends.tolist()):
+        rows[row].append((start, end))
+    starts = [[run[0] for run in runs] for runs in rows]
+
+    seed_row = rows[y]
+    first = seed_row[bisect.bisect_right(starts[y], x) - 1]
+    visited = {(y, first[0])}
+    stack = [(y, first[0], first[1])]
+    mask = np.zeros((h, w), dtype=bool)
+    while stack:
+        row, start, end = stack.pop()
+        mask[row, start:end] = True
+        for near in (row - 1, row + 1):
+            if not 0 <= near < h:
+                continue
+            runs = rows[near]
+            # runs of the neighbouring row overlapping [start, end)
+            i = max(0, bisect.bisect_right(starts[near], start) - 1)
+            while i < len(runs) and runs[i][0] < end:
+                run_start, run_end = runs[i]
+                if run_end > start and (near, run_start) not in visited:
+                    visited.add((near, run_start))
+                    stack.append((near, run_start, run_end))
+                i += 1
+    return mask
+
+
+class RegionMaskCache:
+    # bounded LRU of hatch region masks, key = (canvas generation, commands drawn before the hatch, x, y):
+    # commands are only appended, so the canvas under a stored hatch never changes within a generation
+    def __init__(self, maxsize: int = 64):
+        self.maxsize = maxsize
+        self.masks = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, img, x: int, y: int) -> np.ndarray:
+        mask = self.masks.get(key)
+        if mask is not None:
+            self.masks.move_to_end(key)
+            self.hits += 1
+            return mask
+        self.misses += 1
+        mask = get_region_mask(img, x, y)
+        mask.flags.writeable = False
+        self.masks[key] = mask
+        if len(self.masks) > self.maxsize:
+            self.masks.popitem(last=False)
+        return mask
+
+    def clear(self):
+        self.masks.clear()
+
+
+def get_region_mask(img, x, y) -> np.ndarray:
+    # region under the click: 4-connected pixels of the same brightness class (> 128 or not), as ImageDraw.floodfill finds it
+    light = np.asarray(img.convert("L")) > 128  # [y, x]
+    h, w = light.shape
+    if 0 <= x < w and 0 <= y < h:
+        return fill_region(light == light[y, x], x, y)
+    return np.zeros((h, w), dtype=bool)
+
+
+def get_hatch_lines(img, x, y, angle, distance, mask=None):
+    return [segment for row in get_hatch_rows(img, x, y, angle, distance, mask) for segment in row]
+
+
+def get_hatch_rows(img, x, y, angle, distance, mask=None) -> list[list[tuple[int, int, int, int]]]:
+    # hatch segments grouped by hatch line, lines in offset order. mask - precomputed get_region_mask(img, x, y)
+    if mask is None:
+        mask = get_region_mask(img, x, y)
+    h, w = mask.shape
+    return sample_hatch_lines(mask, get_hatch_line_coords(w, h, angle, distance))
+
+
+def get_hatch_line_coords(w: int, h: int, angle, distance) -> list[tuple[float, float, float, float, int]]:
+    # (x1, y1, x2, y2, samples - 1) of every hatch line across a w x h field, in offset order;
+    # the same float arithmetic as the former per-pixel walk, so the segments are identical
+    angle_rad = math.radians(angle)
+    dx, dy = math.cos(angle_rad), math.sin(angle_rad)
+    nx, ny = -dy, dx
+    diag = int(math.hypot(w, h)) + 2
+    cx, cy = w / 2, h / 2
+
+    lines = []
+    offset = -diag
+    while offset < diag:
+        x1 = cx + nx * offset - dx * diag
+        y1 = cy + ny * offset - dy * diag
+        x2 = cx + nx * offset + dx * diag
+        y2 = cy + ny * offset + dy * diag
+        lines.append((x1, y1, x2, y2, int(math.hypot(x2 - x1, y2 - y1))))
+        offset += distance
+    return lines
+
+
+def _extend_line(x1, y1, x2, y2, pixels):
+    dx = x2 - x1
+    dy = y2 - y1
+    length = math.hypot(dx, dy)
+    if length == 0:
+        return x1, y1, x2, y2
+    ux = dx / length
+    uy = dy / length
+    return (int(round(x1 - ux * pixels)), int(round(y1 - uy * pixels)), int(round(x2 + ux * pixels)), int(round(y2 + uy * pixels)))
+
+
+def sample_hatch_lines(mask: np.ndarray, lines: list) -> list[list[tuple[int, int, int, int]]]:
+    # segments of every line (as from get_hatch_line_coords) that lie inside mask, one list per line;
+    # lines are independent, so any subset gives the same segments as the whole set
+    h, w = mask.shape
+
+    # lines with the same sample count are sampled together: one 2d array, row = line, column = sample,
+    # at most HATCH_BATCH_SAMPLES samples per array so large fields do not need gigabytes at once
+    by_steps = {}
+    for index, line in enumerate(lines):
+        by_steps.setdefault(line[4], []).append(index)
+
+    line_segments = [[] for _ in lines]
+    for steps, group in by_steps.items():
+        batch = max(1, HATCH_BATCH_SAMPLES // (steps + 1))
+        for first in range(0, len(group), batch):
+            indices = group[first:first + batch]
+            x1, y1, x2, y2 = (np.array([lines[i][k] for i in indices])[:, None] for k in range(4))
+            t = np.arange(steps + 1) / steps
+            xi = np.trunc(x1 + (x2 - x1) * t).astype(np.int64)
+            yi = np.trunc(y1 + (y2 - y1) * t).astype(np.int64)
+            valid = (xi >= 0) & (xi < w) & (yi >= 0) & (yi < h)
+            inside = np.zeros(xi.shape, dtype=np.int8)
+            inside[valid] = mask[yi[valid], xi[valid]]
+
+            # run starts (0 -> 1) and ends (1 -> 0, the first sample outside) along every line
+            edges = np.diff(inside, axis=1, prepend=0, append=0)
+            start_rows, start_cols = np.nonzero(edges == 1)
+            end_cols = np.nonzero(edges == -1)[1]
+            for row, a, b in zip(start_rows.tolist(), start_cols.tolist(), end_cols.tolist()):
+                sx, sy = int(xi[row, a]), int(yi[row, a])
+                if b <= steps:
+                    line_segments[indices[row]].append((sx, sy, int(xi[row, b]), int(yi[row, b])))
+                else:
+                    # the run reaches the end of the line
+                    line_segments[indices[row]].append(_extend_line(sx, sy, int(xi[row, steps]), int(yi[row, steps]), 2))
+
+    return line_segments
@@ -0,0 +1,61 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from .hatch import get_hatch_line_coords, get_region_mask, sample_hatch_lines
+
+PARALLEL_MIN_SAMPLES = 1 << 21  # below this many line samples a pool costs more than it saves
+CHUNKS_PER_WORKER = 4  # lines through the middle of the region are longer: smaller chunks balance the load
+
+
+def _hatch_chunk(name: str, shape: tuple[int, int], first: int, lines: list) -> tuple[int, list]:
+    # pool task: segments of a contiguous run of hatch lines, the mask is read from shared memory without a copy
+    # pool processes share the parent's resource tracker, which unlinks the block only if the parent dies
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        mask = np.ndarray(shape, dtype=np.bool_, buffer=shm.buf)
+        segments = sample_hatch_lines(mask, lines)
+        del mask
+    finally:
+        shm.close()
+    return first, segments
+
+
+def get_hatch_rows_parallel(img, x, y, angle, distance, mask=None, workers: int = None, pool: ProcessPoolExecutor = None) -> list[list[tuple[int, int, int, int]]]:
+    # get_hatch_rows split by offset range: contiguous runs of hatch lines go to a process pool,
+    # the mask is shared with it once through shared_memory. Runs are merged by line index,
+    # so the result equals get_hatch_rows whatever the number of workers.
+    # pool - executor to reuse between calls (starting one costs tens of ms), otherwise one is started for the call
+    if mask is None:
+        mask = get_region_mask(img, x, y)
+    h, w = mask.shape
+    lines = get_hatch_line_coords(w, h, angle, distance)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    samples = sum(line[4] + 1 for line in lines)
+    if workers <= 1 or len(lines) < 2 or samples < PARALLEL_MIN_SAMPLES:
+        return sample_hatch_lines(mask, lines)
+
+    chunk = max(1, -(-len(lines) // (workers * CHUNKS_PER_WORKER)))
+    shm = shared_memory.SharedMemory(create=True, size=mask.size)
+    try:
+        shared = np.ndarray(mask.shape, dtype=np.bool_, buffer=shm.buf)
+        shared[:] = mask
+        del shared
+        executor = pool if pool is not None else ProcessPoolExecutor(max_workers=workers)
+        try:
+            futures = [executor.submit(_hatch_chunk, shm.name, mask.shape, first, lines[first:first + chunk])
+                for first in range(0, len(lines), chunk)]
+            rows = [None] * len(lines)
+            for future in futures:
+                first, segments = future.result()
+                rows[first:first + len(segments)] = segments
+        finally:
+            if pool is None:
+                executor.shutdown()
+    finally:
+        shm.close()
+        shm.unlink()
+    return rows
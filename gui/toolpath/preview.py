@@ -0,0 +1,350 @@
+# Preview of G-code programs of any size: the file is streamed in blocks, every block is parsed and
+# tessellated with NumPy and decimated into per-zoom levels, so rendering never touches every segment.
+# Without the GUI: python -m toolpath.render program.cnc --out program.png --scale 4
+import math
+import os
+import time
+from typing import Iterator
+
+import numpy as np
+
+from .arc import get_arc_centers, tessellate_arcs
+
+PREVIEW_BLOCK_BYTES = 1 << 20  # the file is read and parsed in blocks of about this size, one block per step
+PREVIEW_BASE_CELL = 0.25  # cell of the finest level, canvas pixels; also the arc tessellation tolerance
+PREVIEW_LEVELS = 6  # cells 0.25, 0.5, ... 8 canvas pixels
+RASTER_BATCH_SAMPLES = 1 << 22  # pixels per NumPy batch in rasterize_segments
+
+WORD_LETTERS = b'GXYIJR'  # columns of parse_gcode_block
+_PACK_BIAS = 1 << 15  # snapped coordinates are packed as 16 bits each, a segment - one uint64
+
+# byte classes for parse_gcode_block, looked up for the whole block at once
+_DIGIT, _DOT, _SIGN, _SPACE = 1, 2, 4, 8
+_CLASSES = np.zeros(256, dtype=np.uint8)
+_CLASSES[ord('0'):ord('9') + 1] = _DIGIT
+_CLASSES[ord('.')] = _DOT
+_CLASSES[[ord('-'), ord('+')]] = _SIGN
+_CLASSES[[ord(' '), ord('\t'), ord('\r')]] = _SPACE
+_UPPER = np.arange(256, dtype=np.uint8)
+_UPPER[ord('a'):ord('z') + 1] -= 32
+_POWERS = 10.0 ** np.arange(-32, 33)  # 10 ** place, place clipped to -32..32
+
+
+def read_blocks(path: str, block_bytes: int = PREVIEW_BLOCK_BYTES) -> Iterator[bytes]:
+    # the file in blocks of whole lines, every block ends with '\n'
+    with open(path, 'rb') as file:
+        tail = b''
+        while True:
+            data = file.read(block_bytes)
+            if not data:
+                break
+            data = tail + data
+            cut = data.rfind(b'\n') + 1
+            tail = data[cut:]
+            if cut:
+                yield data[:cut]
+        if tail:
+            yield tail + b'\n'
+
+
+def parse_gcode_block(data: bytes) -> np.ndarray:
+    # words G, X, Y, I, J, R of every line of a block (ending with '\n') as a (lines x 6) float array,
+    # nan where the line has no such word. The whole block is parsed at once, the way the firmware reads
+    # a line: the first occurrence of a letter and the number right after it (atof: no digits - 0).
+    # Case, spaces and comments (; to the end of line, (...)) are ignored
+    buf = np.frombuffer(data, dtype=np.uint8)
+    classes = _CLASSES[buf]
+    spaces = classes == _SPACE
+    if spaces.any():
+        buf = buf[~spaces]
+        classes = classes[~spaces]
+    newlines = np.flatnonzero(buf == 10)
+    words = np.full((len(newlines), len(WORD_LETTERS)), np.nan)
+    if len(newlines) == 0:
+        return words
+
+    number = classes != 0
+    if (buf == 59).any() or (buf == 40).any():
+        # comments: ; up to the end of line and (...), both reset at the end of line
+        line_start = np.concatenate(([0], newlines[:-1] + 1))
+        line = np.repeat(np.arange(len(newlines)), np.diff(np.concatenate(([0], newlines + 1))))
+        line = np.concatenate((line, np.full(len(buf) - len(line), len(newlines) - 1)))
+
+        def _count_in_line(flags):
+            # how many flags are set in the line up to and including every byte
+            total = np.cumsum(flags, dtype=np.int32)
+            return total - (total - flags)[line_start][line]
+
+        closing = buf == 41
+        depth = _count_in_line(buf == 40) - _count_in_line(closing)
+        comment = (_count_in_line(buf == 59) > 0) | (depth > 0) | closing
+        number &= ~comment
+    else:
+        comment = None
+
+    sign = classes == _SIGN
+    # a number starts after a non-number byte or at a sign: atof stops at it, "X10-5" is X10
+    run_start = number.copy()
+    run_start[1:] &= ~number[:-1]
+    run_start |= sign & number
+    starts = np.flatnonzero(run_start)
+    if len(starts) == 0:
+        return words
+    run = np.cumsum(run_start, dtype=np.int32) - 1
+    run_end = number.copy()
+    run_end[:-1] &= ~number[1:] | run_start[1:]
+    ends = np.flatnonzero(run_end) + 1
+
+    # decimal point of every number (its end if there is none): digits before it count up, after it - down
+    point = ends.copy()
+    dots = np.flatnonzero((classes == _DOT) & number)
+    if len(dots):
+        dot_runs = run[dots]
+        first = np.concatenate(([True], dot_runs[1:] != dot_runs[:-1]))
+        point[dot_runs[first]] = dots[first]
+    digits = np.flatnonzero((classes == _DIGIT) & number)
+    digit_runs = run[digits]
+    place = point[digit_runs] - digits
+    place -= place > 0
+    weights = (buf[digits] - 48) * _POWERS[np.clip(place, -32, 32) + 32]
+    values = np.bincount(digit_runs, weights=weights, minlength=len(starts))
+    values[buf[starts] == 45] *= -1
+
+    # the letter right before the number, outside comments
+    letter_at = starts - 1
+    letters = np.where(letter_at >= 0, _UPPER[buf[np.maximum(letter_at, 0)]], 0)
+    if comment is not None:
+        letters[comment[np.maximum(letter_at, 0)]] = 0
+    run_lines = np.searchsorted(newlines, starts)
+    for column, letter in enumerate(WORD_LETTERS):
+        selected = np.flatnonzero(letters == letter)
+        if len(selected) == 0:
+            continue
+        selected_lines = run_lines[selected]
+        # the first occurrence in a line wins, as with strchr
+        first = np.concatenate(([True], selected_lines[1:] != selected_lines[:-1]))
+        words[selected_lines[first], column] = values[selected[first]]
+    return words
+
+
+def _axis_positions(values: np.ndarray, absolute: np.ndarray, start: float) -> np.ndarray:
+    # coordinate after every move: absolute words set it, relative ones add to it, a missing word keeps it
+    has = ~np.isnan(values)
+    reset = has & absolute
+    travelled = np.cumsum(np.where(has & ~absolute, values, 0.0))
+    last = np.maximum.accumulate(np.where(reset, np.arange(len(values)), -1))
+    base = np.where(last >= 0, values[np.maximum(last, 0)], start)
+    return base + travelled - np.where(last >= 0, travelled[np.maximum(last, 0)], 0.0)
+
+
+def gcode_block_segments(words: np.ndarray, x: float, y: float, absolute: bool, tolerance: float = PREVIEW_BASE_CELL) -> tuple[np.ndarray, tuple[float, float, bool]]:
+    # drawn segments (x1, y1, x2, y2) of the G01-G03 moves of a parsed block, starting at (x, y) in G90 (absolute)
+    # or G91 mode, and the position and mode the block ends with. G00 moves without drawing; arcs are
+    # tessellated within `tolerance`, R arcs with the geometry of draw_gcode_arc, impossible ones are skipped
+    g = words[:, 0]
+    g = np.where(np.isnan(g), -1, g).astype(np.int64)
+    mode = (g == 90) | (g == 91)
+    last = np.maximum.accumulate(np.where(mode, np.arange(len(g)), -1))
+    line_absolute = np.where(last >= 0, g[np.maximum(last, 0)] == 90, absolute)
+    if mode.any():
+        absolute = bool(line_absolute[-1])
+    motion = (g >= 0) & (g <= 3)
+    if not motion.any():
+        return np.empty((0, 4)), (x, y, absolute)
+
+    moves = words[motion]
+    g = g[motion]
+    move_absolute = line_absolute[motion]
+    x2 = _axis_positions(moves[:, 1], move_absolute, x)
+    y2 = _axis_positions(moves[:, 2], move_absolute, y)
+    x1 = np.concatenate(([x], x2[:-1]))
+    y1 = np.concatenate(([y], y2[:-1]))
+
+    line = g == 1
+    pieces = [np.column_stack((x1[line], y1[line], x2[line], y2[line]))]
+    arc = (g == 2) | (g == 3)
+    if arc.any():
+        ccw = g == 3
+        by_r = arc & ~np.isnan(moves[:, 5])
+        by_ij = arc & ~by_r
+        cx, cy, a1, sweep = get_arc_centers(x1[by_r], y1[by_r], x2[by_r], y2[by_r], moves[by_r, 5], ccw[by_r])
+        # I/J: center relative to the start, the same end angle means a full circle
+        i = np.nan_to_num(moves[by_ij, 3])
+        j = np.nan_to_num(moves[by_ij, 4])
+        ij_cx = x1[by_ij] + i
+        ij_cy = y1[by_ij] + j
+        ij_a1 = np.arctan2(-j, -i)
+        ij_sweep = np.where(ccw[by_ij], np.arctan2(y2[by_ij] - ij_cy, x2[by_ij] - ij_cx) - ij_a1,
+            ij_a1 - np.arctan2(y2[by_ij] - ij_cy, x2[by_ij] - ij_cx)) % (2 * math.pi)
+        ij_sweep[ij_sweep == 0] = 2 * math.pi
+        ij_sweep[(i == 0) & (j == 0)] = np.nan
+
+        order = np.concatenate((np.flatnonzero(by_r), np.flatnonzero(by_ij)))
+        cx, cy, a1, sweep = (np.concatenate(pair) for pair in ((cx, ij_cx), (cy, ij_cy), (a1, ij_a1), (sweep, ij_sweep)))
+        valid = ~np.isnan(sweep)
+        order = order[valid]
+        points, counts = tessellate_arcs(x1[order], y1[order], x2[order], y2[order], cx[valid], cy[valid], a1[valid], sweep[valid], ccw[order], tolerance)
+        if len(points):
+            # consecutive points of one arc, not the last point of an arc and the first of the next one
+            keep = np.ones(len(points) - 1, dtype=bool)
+            keep[(np.cumsum(counts) - 1)[:-1]] = False
+            pieces.append(np.column_stack((points[:-1][keep], points[1:][keep])))
+    return np.concatenate(pieces), (float(x2[-1]), float(y2[-1]), absolute)
+
+
+def _pack(snapped: np.ndarray) -> np.ndarray:
+    # distinct segments of a snapped (n x 4) array as sorted uint64 keys, endpoints in a canonical order
+    x1, y1, x2, y2 = (snapped[:, k] + _PACK_BIAS for k in range(4))
+    swap = (x1 > x2) | ((x1 == x2) & (y1 > y2))
+    x1, x2 = np.where(swap, x2, x1), np.where(swap, x1, x2)
+    y1, y2 = np.where(swap, y2, y1), np.where(swap, y1, y2)
+    keys = (x1.astype(np.uint64) << np.uint64(48)) | (y1.astype(np.uint64) << np.uint64(32)) \
+        | (x2.astype(np.uint64) << np.uint64(16)) | y2.astype(np.uint64)
+    return _distinct(keys)
+
+
+def _distinct(keys: np.ndarray) -> np.ndarray:
+    # np.unique without its overhead: sort and drop repeats
+    keys = np.sort(keys)
+    return keys[np.concatenate(([True], keys[1:] != keys[:-1]))] if len(keys) else keys
+
+
+def _unpack(keys: np.ndarray) -> np.ndarray:
+    mask = np.uint64(0xFFFF)
+    return np.column_stack([((keys >> np.uint64(shift)) & mask).astype(np.int64) - _PACK_BIAS for shift in (48, 32, 16, 0)])
+
+
+def rasterize_segments(mask: np.ndarray, segments: np.ndarray) -> None:
+    # sets the pixels of integer segments (x1, y1, x2, y2) in a C-contiguous mask (rows - y): one sample per
+    # pixel step along the longer axis, all segments of a batch in a few NumPy passes instead of a call per line
+    h, w = mask.shape
+    x1, y1, x2, y2 = (segments[:, k] for k in range(4))
+    low_x, high_x = np.minimum(x1, x2), np.maximum(x1, x2)
+    low_y, high_y = np.minimum(y1, y2), np.maximum(y1, y2)
+    visible = (high_x >= 0) & (low_x < w) & (high_y >= 0) & (low_y < h)
+    if not visible.all():
+        x1, y1, x2, y2 = x1[visible], y1[visible], x2[visible], y2[visible]
+    # samples need a bounds check only if some segment leaves the mask
+    clipped = bool(((low_x < 0) | (high_x >= w) | (low_y < 0) | (high_y >= h))[visible].any())
+    dx = x2 - x1
+    dy = y2 - y1
+    steps = np.maximum(np.abs(dx), np.abs(dy))
+    counts = steps + 1
+    step_x = (dx / np.maximum(steps, 1)).astype(np.float32)
+    step_y = (dy / np.maximum(steps, 1)).astype(np.float32)
+    # + 0.5 and floor: the nearest pixel, ties up
+    start_x = (x1 + 0.5).astype(np.float32)
+    start_y = (y1 + 0.5).astype(np.float32)
+    ends = np.cumsum(counts)
+    flat = mask.reshape(-1)
+    first = 0
+    while first < len(counts):
+        last = max(first + 1, int(np.searchsorted(ends, ends[first] - counts[first] + RASTER_BATCH_SAMPLES, side='right')))
+        batch = counts[first:last]
+        offsets = np.repeat((ends[first:last] - batch - (ends[first] - counts[first])).astype(np.float32), batch)
+        t = np.arange(len(offsets), dtype=np.float32) - offsets
+        xs = np.repeat(start_x[first:last], batch) + np.repeat(step_x[first:last], batch) * t
+        ys = np.repeat(start_y[first:last], batch) + np.repeat(step_y[first:last], batch) * t
+        if clipped:
+            xs = np.floor(xs)
+            ys = np.floor(ys)
+            inside = (xs >= 0) & (xs < w) & (ys >= 0) & (ys < h)
+            xs = xs[inside]
+            ys = ys[inside]
+        flat[ys.astype(np.int64) * w + xs.astype(np.int64)] = True
+        first = last
+
+
+class ToolpathLOD:
+    # segments decimated per zoom level: level k snaps endpoints to a grid of base_cell * 2**k canvas pixels
+    # and keeps every distinct snapped segment once, so overdrawn hatching and detail smaller than a cell
+    # collapse. A render takes the coarsest level whose cell is still no larger than an output pixel
+    def __init__(self, base_cell: float = PREVIEW_BASE_CELL, levels: int = PREVIEW_LEVELS):
+        self.base_cell = base_cell
+        self.cells = [base_cell * 2 ** k for k in range(levels)]
+        self.blocks = [[] for _ in range(levels)]  # per level: packed segments of every added block
+        self.segments = 0  # segments added, before decimation
+
+    def add(self, segments: np.ndarray) -> None:
+        # segments (x1, y1, x2, y2) in canvas coordinates: G-code X10 is the pixel column 10, centered at 10.5
+        if len(segments) == 0:
+            return
+        self.segments += len(segments)
+        snapped = np.floor((np.asarray(segments, dtype=float) + 0.5) / self.base_cell)
+        snapped = np.clip(snapped, -_PACK_BIAS, _PACK_BIAS - 1).astype(np.int64)
+        for blocks in self.blocks:
+            keys = _pack(snapped)
+            blocks.append(keys)
+            snapped = _unpack(keys) >> 1
+
+    def finish(self) -> None:
+        # merges the blocks of every level, dropping segments repeated across blocks
+        for blocks in self.blocks:
+            if len(blocks) > 1:
+                blocks[:] = [_distinct(np.concatenate(blocks))]
+
+    def count(self, level: int) -> int:
+        return sum(len(keys) for keys in self.blocks[level])
+
+    def level_for(self, scale: float) -> int:
+        # scale - output pixels per canvas pixel
+        level = 0
+        for k, cell in enumerate(self.cells):
+            if cell * scale <= 1:
+                level = k
+        return level
+
+    def draw(self, mask: np.ndarray, scale: float, level: int = None, first: int = 0) -> int:
+        # draws the blocks of a level from `first` on mask, returns the block count: a progressive render
+        # passes it back after the next add(). finish() merges the blocks, everything is drawn by then
+        level = self.level_for(scale) if level is None else level
+        blocks = self.blocks[level]
+        cell = self.cells[level]
+        for keys in blocks[first:]:
+            pixels = np.floor((_unpack(keys) + 0.5) * (cell * scale)).astype(np.int64)
+            rasterize_segments(mask, pixels)
+        return len(blocks)
+
+    def render(self, scale: float, width: int, height: int, level: int = None) -> np.ndarray:
+        mask = np.zeros((height, width), dtype=bool)
+        self.draw(mask, scale, level)
+        return mask
+
+
+class ProgramPreview:
+    # streamed preview of a G-code file starting at (x, y): steps() handles one block at a time, so a caller
+    # (the GUI timer) can draw after every step; memory is bounded by the decimated levels, not the file size
+    def __init__(self, path: str, x: float = 0, y: float = 0, absolute: bool = True,
+            base_cell: float = PREVIEW_BASE_CELL, levels: int = PREVIEW_LEVELS, block_bytes: int = PREVIEW_BLOCK_BYTES):
+        self.path = path
+        self.size = os.path.getsize(path)
+        self.block_bytes = block_bytes
+        self.lod = ToolpathLOD(base_cell, levels)
+        self.x = x
+        self.y = y
+        self.absolute = absolute
+        self.lines = 0
+        self.bytes = 0
+        self.seconds = 0.0
+        self.done = False
+
+    def steps(self) -> Iterator[int]:
+        # yields the bytes read so far after every block
+        for data in read_blocks(self.path, self.block_bytes):
+            start = time.perf_counter()
+            words = parse_gcode_block(data)
+            segments, (self.x, self.y, self.absolute) = gcode_block_segments(words, self.x, self.y, self.absolute, self.lod.base_cell)
+            self.lod.add(segments)
+            self.lines += len(words)
+            self.bytes = min(self.size, self.bytes + len(data))
+            self.seconds += time.perf_counter() - start
+            yield self.bytes
+        start = time.perf_counter()
+        self.lod.finish()
+        self.seconds += time.perf_counter() - start
+        self.done = True
+
+    def load(self) -> 'ProgramPreview':
+        for _ in self.steps():
+            pass
+        return self
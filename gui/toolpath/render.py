@@ -0,0 +1,42 @@
+# G-code program -> preview image of the paint field, the same rendering as the file preview of the GUI
+# Run from the gui directory: python -m toolpath.render program.cnc --out program.png --scale 4
+import argparse
+import math
+import os
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+from .canvas import FIELD_SIZE
+from .preview import ProgramPreview
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog='python -m toolpath.render', description="G-code program -> preview image of the paint field")
+    parser.add_argument('program', help="Файл G-code")
+    parser.add_argument('--out', type=str, default=None, help="Изображение. По умолчанию - <файл>.png")
+    parser.add_argument('--scale', type=float, default=2.0, help="Пикселей изображения на пиксель поля. По умолчанию = 2")
+    parser.add_argument('--level', type=int, default=None, help="Уровень детализации. По умолчанию - по масштабу")
+    args = parser.parse_args()
+
+    try:
+        preview = ProgramPreview(args.program).load()
+    except OSError as e:
+        print(e, file=sys.stderr)
+        return 2
+    width, height = (math.ceil(size * args.scale) for size in FIELD_SIZE)
+    start = time.perf_counter()
+    mask = preview.lod.render(args.scale, width, height, args.level)
+    seconds = time.perf_counter() - start
+    out = args.out or os.path.splitext(args.program)[0] + '.png'
+    Image.fromarray(np.where(mask, 0, 255).astype(np.uint8)).save(out)
+    level = preview.lod.level_for(args.scale) if args.level is None else args.level
+    print(f"{args.program}: {preview.lines} строк, {preview.lod.segments} отрезков, уровень {level}: {preview.lod.count(level)}; "
+        f"разбор {preview.seconds:.2f} с, отрисовка {seconds:.2f} с -> {out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
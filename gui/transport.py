@@ -0,0 +1,155 @@
+from PyQt5.QtCore import QThread, pyqtSignal
+import queue
+import threading
+
+from response import Prd3Session, PacketMetrics
+from journal import FileSha256, SendJournal
+from gcode_preflight import PreflightFile
+
+
+class TransportJob:
+    def __init__(self, job_id: int, kind: str, port: str, baudrate: int, payload, compact: bool = False, resume: bool = False):
+        self.job_id = job_id
+        self.kind = kind  # gcode, file, hex
+        self.port = port
+        self.baudrate = baudrate
+        self.payload = payload  # list of G-codes, file path or hex string
+        self.compact = compact  # lossless G-code compaction before packing
+        self.resume = resume  # file jobs: continue an interrupted send of the same file from the journal
+        self.cancel = threading.Event()
+
+
+# serial transport thread: owns the Prd3Session and runs queued send jobs one by one,
+# the GUI thread only enqueues work and reacts to signals
+class TransportWorker(QThread):
+    job_started = pyqtSignal(int)
+    job_progress = pyqtSignal(int, 'qlonglong', 'qlonglong')  # job_id, acked bytes, total bytes (0 = unknown)
+    job_finished = pyqtSignal(int, bool, bool)  # job_id, success, cancelled
+    job_compacted = pyqtSignal(int, 'qlonglong', 'qlonglong')  # job_id, raw bytes, compact bytes
+    packet_event = pyqtSignal(int, object)  # job_id, response.PacketEvent
+    job_metrics = pyqtSignal(int, object)  # job_id, PacketMetrics.Summary() of the job
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.jobs = queue.Queue()
+        self.pending: dict[int, TransportJob] = {}
+        self.lock = threading.Lock()
+        self.next_id = 1
+        self.session: Prd3Session = None
+        # every acked packet of a file job is journaled, so the send survives a link drop or a GUI restart
+        self.journal = SendJournal()
+
+    def enqueue(self, kind: str, port: str, baudrate: int, payload, compact: bool = False, resume: bool = False) -> int:
+        with self.lock:
+            job = TransportJob(self.next_id, kind, port, baudrate, payload, compact, resume)
+            self.next_id += 1
+            self.pending[job.job_id] = job
+        self.jobs.put(job)
+        return job.job_id
+
+    def enqueue_gcode(self, port: str, baudrate: int, g_codes: list[str], compact: bool = False) -> int:
+        return self.enqueue('gcode', port, baudrate, list(g_codes), compact)
+
+    def enqueue_file(self, port: str, baudrate: int, path: str, compact: bool = False, resume: bool = False) -> int:
+        return self.enqueue('file', port, baudrate, path, compact, resume)
+
+    def enqueue_hex(self, port: str, baudrate: int, hex_string: str) -> int:
+        return self.enqueue('hex', port, baudrate, hex_string)
+
+    def cancel(self, job_id: int = None):
+        # job_id=None cancels everything queued or running
+        with self.lock:
+            jobs = list(self.pending.values()) if job_id is None else [self.pending.get(job_id)]
+        for job in jobs:
+            if job is not None:
+                job.cancel.set()
+
+    def is_busy(self) -> bool:
+        with self.lock:
+            return len(self.pending) > 0
+
+    def stop(self):
+        self.cancel()
+        self.jobs.put(None)
+        self.wait()
+
+    def get_session(self, port: str, baudrate: int) -> Prd3Session:
+        # one long-lived session per port/baudrate, recreated only when they change
+        if self.session is None or self.session.port != port or self.session.baudrate != baudrate:
+            if self.session is not None:
+                self.session.Close()
+            self.session = Prd3Session(port, baudrate)
+        return self.session
+
+    def run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                break
+            ok = False
+            if not job.cancel.is_set():
+                self.job_started.emit(job.job_id)
+                ok = self.execute(job)
+            with self.lock:
+                del self.pending[job.job_id]
+            self.job_finished.emit(job.job_id, ok, job.cancel.is_set())
+        if self.session is not None:
+            self.session.Close()
+        self.journal.Close()
+
+    def execute(self, job: TransportJob) -> bool:
+        def progress(sent, total):
+            self.job_progress.emit(job.job_id, sent, total)
+
+        def packet(event):
+            self.packet_event.emit(job.job_id, event)
+
+        session = self.get_session(job.port, job.baudrate)
+        if job.kind == 'hex':
+            return session.SendHex(job.payload)
+        if job.kind not in ('gcode', 'file'):
+            return False
+        # per-job metrics, the event stream itself is forwarded to the GUI thread
+        metrics = PacketMetrics()
+        session.AddListener(metrics)
+        session.AddListener(packet)
+        try:
+            if job.kind == 'gcode':
+                ok = session.SendGcode(job.payload, progress=progress, cancel=job.cancel, compact=job.compact)
+            else:
+                ok = session.SendGcodeFile(job.payload, progress=progress, cancel=job.cancel, compact=job.compact,
+                    journal=self.journal, resume=job.resume)
+        finally:
+            session.RemoveListener(metrics)
+            session.RemoveListener(packet)
+        self.job_metrics.emit(job.job_id, metrics.Summary())
+        if session.lastCompact is not None:
+            self.job_compacted.emit(job.job_id, session.lastCompact.rawBytes, session.lastCompact.compactBytes)
+        return ok
+
+
+# check of a file before it is queued for sending: preflight and the sha256 of an interrupted send
+# both stream the whole file, so they run in their own thread and the GUI only gets the result
+class FileCheckWorker(QThread):
+    checked = pyqtSignal(object, object)  # gcode_preflight.Preflight, SendJournal.Resumable() state or None
+    failed = pyqtSignal(str)  # the file could not be read
+
+    def __init__(self, path: str, x: int, y: int, compact: bool, journal: SendJournal, target: str, parent=None):
+        super().__init__(parent)
+        self.path = path
+        self.x = x
+        self.y = y
+        self.compact = compact
+        self.journal = journal
+        self.target = target  # journal.JournalTarget of the machine the file goes to
+
+    def run(self):
+        try:
+            check = PreflightFile(self.path, x=self.x, y=self.y, compact=self.compact)
+            # an interrupted send of this very file (same sha256) to this machine can continue, if it was
+            # compacted the same way; TransportWorker sends files with the default chunk size
+            state = self.journal.Resumable(FileSha256(self.path), self.target, self.compact) if check.Ok() else None
+        except OSError as e:
+            self.failed.emit(str(e))
+            return
+        self.checked.emit(check, state)
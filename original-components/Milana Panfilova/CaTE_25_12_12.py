@@ -1,12 +1,18 @@
+import os
+import sys
 import serial
 import serial.tools.list_ports
 import bitstring
-import crcmod.predefined
-#from time import sleep
+from time import sleep
 import argparse
 from datetime import datetime
 import csv
 
+# Общий табличный CRC8 (полином 0x31) из gui/crc8.py - тот же, что использует response.py
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'gui'))
+from crc8 import Crc8
+from framing import FrameDecoder
+
 ########################################################################################
 #	Control and Testing Equipment for CNC (interaction tester)
 ########################################################################################
@@ -35,13 +41,17 @@ class C_COM_P_MASTER:
 		self.DATA_r	 = 0	# метаданные со стороны worker ноды
 		self.CRC_r	 = 0	# CRC со стороны worker ноды
 
-		self.synq_m	 = [ bitstring.BitArray(uint=self.SYNC1, length=8), bitstring.BitArray(uint=self.SYNC2, length=8) ]
+		self.decoder	 = FrameDecoder()	# инкрементальный разбор ответных кадров
+		self.SQN_r_old	 = None	# SQN предыдущего ответа
+		self.SQN_r_new	 = None	# SQN последнего ответа
 		self.log_m	 = [ ['id', 'SQN', 'metadata'] ]
 		self.cnt	 = 1
 
+		# Без COM-порта можно подключиться к модели ноды: python gui/simulator.py --pty --cate
+		self.ser = None
 		try:
-			self.ser = serial.Serial(
-									#port	 = self.port, # Нужно раскоментировать. У меня на компьютере нет COM-порта
+			self.ser = serial.serial_for_url(
+									self.port,
 									baudrate = self.baudrate,
 									bytesize = self.bytesize,
 									parity	 = 'N',	# по условию
@@ -71,7 +81,8 @@ class C_COM_P_MASTER:
 		crc_v = bitstring.BitArray( uint=self.crc_func(packet_write_wo_crc[2:]), length=8 ).tobytes() #; print(packet_write_wo_crc[2:])
 		packet_write = b''.join( [ packet_write_wo_crc, crc_v ] ) #print(f'packet_w_crc = {packet_write}')
 
-		#self.ser.write(packet_write) # Нужно раскоментировать. У меня на компьютере нет COM-порта
+		if self.ser is not None and self.ser.is_open:
+			self.ser.write(packet_write)
 		print(f"Отправлен пакет при SQN =	{self.SQN_w}: {bitstring.BitArray(packet_write).hex}")
 
 		self.SQN_w = (self.SQN_w + 1) % 255 # по условию
@@ -81,76 +92,44 @@ class C_COM_P_MASTER:
 
 # ожидаем ответ и записываем данные в csv файл
 	def get_packet(self):
-		if self.ser.is_open:
+		if self.ser is not None and self.ser.is_open:
 			try:
-				while self.ser.in_waiting > 0: # если есть данные в буфере # Читаем до тех пор, пока не встретим синхрослово
-					unified_packet_read_synq_1 = bitstring.BitArray(bytes=self.ser.read(1))
-					if unified_packet_read_synq_1 != self.synq_m[0]: # проверка 1 синхрослова
-						continue
-					unified_packet_read_synq_2 = bitstring.BitArray(bytes=self.ser.read(1))
-					if unified_packet_read_synq_2 != self.synq_m[1]: # проверка 2 синхрослова
-						continue
-					unified_packet_read_len = bitstring.BitArray(bytes=self.ser.read(1)) # чтение LEN
-					if not unified_packet_read_len: # проверка LEN на пустоту
+				# Забираем из порта все, что уже пришло. Неполный кадр остается в декодере до следующего вызова
+				for frame in self.decoder.Feed(self.ser.read(self.ser.in_waiting)):
+					if not frame.crcOk: # проверка CRC
+						print(f"Error: CRC не верный в пакете при SQN = {frame.sqn}")
 						continue
-					self.LEN_r = unified_packet_read_len.hex # перевод LEN в hex для удобства
-					if self.LEN_r < 4 or self.LEN_r > 253:
-						print("Error: LEN должен быть в диапазоне 4...253")
-						return None
-					else: # если мы прошли стартовые проверки, то проводим еще больше проверок, которые уже более осязаемы
-						unified_packet_read = bitstring.BitArray(bytes=self.ser.read(self.LEN_r)) # читаем основной пласт данных, включающий ADDR, ACK, DATA, CRC
-						if not unified_packet_read: # Возможно нужна проверка на пустоту с 'or len(unified_packet_read) // self.bytesize < self.LEN_r '
+
+					self.SQN_r_new = frame.sqn
+					if self.SQN_r_old is not None and self.SQN_r_new != ( self.SQN_r_old + 1 ) % 255: # по условию
+						print(f"Error: SQN не верный: SQN_r_old = {self.SQN_r_old} а SQN_r_new = {self.SQN_r_new}")
+					self.SQN_r_old = self.SQN_r_new
+
+					self.ADDR_r	 = frame.addr
+					self.ACK_r	 = frame.ack
+					self.DATA_r	 = frame.data
+
+					match ( self.ACK_r ): # проверка ACK
+						case 0:
+							print(f'ACK = {self.ACK_r}: команда принята и декодирована')
+						case 1:
+							print(f'ACK = {self.ACK_r}: не верный адрес устройства')
 							continue
-						if not hasattr(self.get_packet.__func__, 'SQN_r_old'):	# Проверка, что есть атрибут с заданным именем
-							self.METH_PR_TRANSACTION.__func__.SQN_r_old = unified_packet_read[:self.bytesize].hex
-						else:
-							self.SQN_r_new = unified_packet_read[:self.bytesize].hex
-							if self.SQN_r_new != ( self.METH_PR_TRANSACTION.__func__.SQN_r_old + 1 ) % 255: # по условию
-								print(f"Error: SQN не верный: SQN_r_old = {self.METH_PR_TRANSACTION.__func__.SQN_r_old} \
-								а SQN_r_new = {self.SQN_r_new}")
-								return None
-							self.METH_PR_TRANSACTION.__func__.SQN_r_old = self.SQN_r_new # Возможно присвоение лучше сделать в самом конце
-
-						fields =	[
-									('ADDR_r',	self.bytesize),
-									('ACK_r',	self.bytesize),
-									('DATA_r',	self.bytesize*(self.LEN_r-3)), # Надо проверить
-									('CRC_r',	self.bytesize),
-									]
-
-						offset = 0
-						for name, size in fields:
-							segment = unified_packet_read[offset : offset + size]
-							setattr(self, name, segment)
-							offset += size
-
-						crc_v = self.crc_func( unified_packet_read_len + unified_packet_read[:-self.bytesize] )
-						if crc_v != self.CRC_r: # проверка CRC
-							print(f"Error: CRC не верный: CRC_r = {self.CRC_r} а crc_v = {crc_v}")
-							return None
-
-						match ( ACK ): # проверка ACK
-							case bitstring.BitArray(uint=0, length=8):
-								print(f'ACK = {ACK}: команда принята и декодирована')
-							case bitstring.BitArray(uint=1, length=8):
-								print(f'ACK = {ACK}: не верный адрес устройства')
-								return None
-							case bitstring.BitArray(uint=2, length=8):
-								print(f'ACK = {ACK}: ошибка CRC')
-								self.crc_error = True
-								return None
-							case bitstring.BitArray(uint=3, length=8):
-								print(f'ACK = {ACK}: недопустимый параметр команды')
-								return None
-							case _:
-								return None
-
-						#				   [ 'id',			'SQN',				 'metadata']
-						self.log_m.append( [ f'{self.cnt}', f'{self.SQN_r_new}', f'{self.DATA_r}'] )
-						self.cnt += 1
-
-					packet_read = b''.join( [ unified_packet_read_synq_1, unified_packet_read_synq_2, unified_packet_read ] ) #print(f'packet_read = {packet_read}')
-					print(f"Получен пакет при SQN = {self.SQN_r_new}:	{packet_read}")
+						case 2:
+							print(f'ACK = {self.ACK_r}: ошибка CRC')
+							self.crc_error = True
+							continue
+						case 3:
+							print(f'ACK = {self.ACK_r}: недопустимый параметр команды')
+							continue
+						case _:
+							continue
+
+					#				   [ 'id',			'SQN',				 'metadata']
+					self.log_m.append( [ f'{self.cnt}', f'{self.SQN_r_new}', f'{self.DATA_r.hex()}'] )
+					self.cnt += 1
+
+					print(f"Получен пакет при SQN = {self.SQN_r_new}:	{self.DATA_r.hex()}")
 
 			except serial.SerialException as se:
 				print("Error:", str(se))
@@ -267,8 +246,12 @@ if __name__ == "__main__":
 	if args.whatcomport:
 		f_show_com_ports()
 	else:
-		# CRC8: полином x^8 + x^5 + x^4 + 1 (0x31)
-		crc = crcmod.predefined.mkPredefinedCrcFun(f"crc-{args.controlsum}")
+		# CRC8: полином x^8 + x^5 + x^4 + 1 (0x31). Предопределенный crcmod "crc-8" использует полином 0x07,
+		# поэтому берем общую табличную реализацию, совпадающую с прошивкой и response.py
+		if args.controlsum != 8:
+			print(f"Error: протокол PRD-3 использует только CRC8, получено {args.controlsum}")
+			sys.exit(1)
+		crc = Crc8
 
 		# объект класса C_COM_P_MASTER
 		obj_com_p = C_COM_P_MASTER(
@@ -287,6 +270,7 @@ if __name__ == "__main__":
 		# Микротесты
 		obj_com_p.send_packet(LEN, CMD, PARAM)	# Запись 1
 		obj_com_p.send_packet(LEN, CMD, PARAM)	# Запись 2
+		sleep(0.1)								# Ждем ответы ноды
 		obj_com_p.get_packet()					# Чтение
 		obj_com_p.write_csv()					# Логирование
 